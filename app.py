@@ -1,10 +1,34 @@
+import codecs
+import csv
+import io
+import json
+import os
+import uuid
+
 from dotenv import load_dotenv
 from flask import Flask, jsonify, make_response, Response, request
 # from flask_cors import CORS
 
 from meal_max.models import kitchen_model
 from meal_max.models.battle_model import BattleModel
-from meal_max.utils.sql_utils import check_database_connection, check_table_exists
+from meal_max.models.meal_importer import detect_format, import_meals
+from meal_max.utils.cache_utils import LRUCache
+from meal_max.utils.random_utils import (
+    get_hedging_stats,
+    get_http_stats,
+    get_quota_stats,
+    get_random_pool_stats,
+    get_random_source_stats,
+    get_reservoir_stats
+)
+from meal_max.utils.sql_utils import (
+    apply_migrations,
+    check_database_connection,
+    check_table_exists,
+    DB_VACUUM_ON_START,
+    get_pool_stats,
+    incremental_vacuum
+)
 
 
 # Load environment variables from .env file
@@ -16,9 +40,45 @@ app = Flask(__name__)
 # uncomment this
 # CORS(app)
 
+# Bring the schema up to date before serving any request
+if os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true":
+    apply_migrations()
+if DB_VACUUM_ON_START:
+    incremental_vacuum()
+
 # Initialize the BattleModel
 battle_model = BattleModel()
 
+# Encoded /api/leaderboard bodies keyed by (data version, sort, limit, after); the version
+# includes the database id, so a recreated database starts afresh. A write moves
+# readers to a new version and older entries age out of the LRU. Size 0 disables the cache
+leaderboard_cache = LRUCache(int(os.getenv("LEADERBOARD_CACHE_SIZE", "256")))
+
+# Buffered battle outcomes only exist in this process, so tags covering them also carry a per-process id
+ETAG_EPOCH = uuid.uuid4().hex[:12]
+
+
+def etag_for(version: tuple[str, int, int]) -> str:
+    """
+    Returns the entity tag of every read endpoint's response at the given data version.
+
+    The tag is derived from the version stored in the database, so every worker, and
+    the same worker after a restart, gives the same tag for the same data.
+    """
+    database_id, database_version, buffered = version
+    etag = f"{database_id}-{database_version}"
+    if buffered:
+        etag += f"-{ETAG_EPOCH}-{buffered}"
+    return etag
+
+def not_modified(etag: str) -> Response:
+    """
+    Returns an empty 304 response carrying the given tag.
+    """
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
 ####################################################
 #
 # Healthchecks
@@ -58,6 +118,32 @@ def db_check() -> Response:
     except Exception as e:
         return make_response(jsonify({'error': str(e)}), 404)
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics() -> Response:
+    """
+    Route to expose internal performance counters for monitoring.
+
+    Returns:
+        JSON response with the counters of each instrumented component.
+    """
+    app.logger.info('Collecting metrics')
+    return make_response(jsonify({
+        'db_pool': get_pool_stats(),
+        'stats_buffer': kitchen_model.get_stats_buffer_stats(),
+        'meal_cache': kitchen_model.get_meal_cache_stats(),
+        'negative_meal_cache': kitchen_model.get_negative_meal_cache_stats(),
+        'leaderboard_cache': leaderboard_cache.get_stats(),
+        'leaderboard_snapshots': kitchen_model.get_leaderboard_snapshot_stats(),
+        'read_coalescing': kitchen_model.get_read_coalescing_stats(),
+        'random_source': get_random_source_stats(),
+        'random_hedging': get_hedging_stats(),
+        'random_quota': get_quota_stats(),
+        'random_reservoir': get_reservoir_stats(),
+        'random_pool': get_random_pool_stats(),
+        'random_org_http': get_http_stats(),
+        'battle_prefetch': battle_model.get_prefetch_stats()
+    }), 200)
+
 
 ##########################################################
 #
@@ -115,10 +201,98 @@ def add_meal() -> Response:
         app.logger.error("Failed to add combatant: %s", str(e))
         return make_response(jsonify({'error': str(e)}), 500)
 
+@app.route('/api/create-meals', methods=['POST'])
+def add_meals() -> Response:
+    """
+    Route to add many meals to the database in one request.
+
+    Expected JSON Input:
+        A JSON array of objects with the same fields as /api/create-meal
+        (meal, cuisine, price, difficulty).
+
+    Query Parameters:
+        - upsert (str): 'true' to overwrite existing meals with the same name instead of
+          rejecting them. Default is 'false'.
+
+    Returns:
+        JSON response with the number of meals created and updated, and an error entry
+        (index, meal, error) for every rejected row.
+    Raises:
+        400 error if the body is not a JSON array, or if every row was rejected.
+        500 error if there is an issue writing the meals to the database.
+    """
+    app.logger.info('Creating meals in bulk')
+    try:
+        data = request.get_json()
+        if not isinstance(data, list):
+            return make_response(jsonify({'error': 'Invalid input, expected a JSON array of meals'}), 400)
+
+        upsert = request.args.get('upsert', 'false').lower() == 'true'
+        report = kitchen_model.create_meals(data, upsert=upsert)
+
+        app.logger.info("Bulk load: %d created, %d updated, %d rejected",
+                        report['created'], report['updated'], len(report['errors']))
+        if report['errors'] and not report['created'] and not report['updated']:
+            return make_response(jsonify({'status': 'error', **report}), 400)
+        return make_response(jsonify({'status': 'success', **report}), 201)
+    except Exception as e:
+        app.logger.error("Failed to add meals: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 500)
+
+@app.route('/api/import-meals', methods=['POST'])
+def import_meals_file() -> Response:
+    """
+    Route to bulk import meals from an uploaded NDJSON or CSV file.
+
+    The upload is parsed as a stream and written in fixed-size transactions.
+
+    Form Data:
+        - file: The NDJSON or CSV file (CSV needs a meal,cuisine,price,difficulty header).
+        - format (str): 'ndjson' or 'csv'. Defaults to the file extension.
+        - upsert (str): 'true' to overwrite existing meals instead of rejecting them.
+        - resume_from (int): The number of leading rows to skip, e.g. the 'rows' of an
+          earlier import that was interrupted.
+
+    Returns:
+        JSON response with the import report: rows consumed, meals created and updated,
+        rejected rows and throughput.
+    Raises:
+        400 error if no file is uploaded or a parameter is invalid.
+        500 error if there is an issue writing the meals to the database.
+    """
+    app.logger.info('Importing meals from upload')
+    try:
+        upload = request.files.get('file')
+        if upload is None:
+            return make_response(jsonify({'error': 'A file upload named "file" is required'}), 400)
+
+        import_format = request.form.get('format') or detect_format(upload.filename or '')
+        upsert = request.form.get('upsert', 'false').lower() == 'true'
+        try:
+            resume_from = int(request.form.get('resume_from', 0))
+            if resume_from < 0:
+                raise ValueError("resume_from must not be negative")
+        except ValueError:
+            return make_response(jsonify({'error': 'resume_from must be a non-negative integer'}), 400)
+
+        # A codecs reader decodes lazily and, unlike TextIOWrapper, accepts a SpooledTemporaryFile on 3.9
+        stream = codecs.getreader('utf-8')(upload.stream)
+        report = import_meals(stream, import_format, upsert=upsert, skip_rows=resume_from)
+
+        app.logger.info("Import: %d rows, %d created, %d updated, %d rejected",
+                        report['rows'], report['created'], report['updated'], len(report['errors']))
+        return make_response(jsonify({'status': 'success', **report}), 201)
+    except ValueError as e:
+        app.logger.error("Invalid import request: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 400)
+    except Exception as e:
+        app.logger.error("Failed to import meals: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 500)
+
 @app.route('/api/clear-meals', methods=['DELETE'])
 def clear_catalog() -> Response:
     """
-    Route to clear all meals (recreates the table).
+    Route to clear all meals (the schema is kept).
 
     Returns:
         JSON response indicating success of the operation or error message.
@@ -151,6 +325,50 @@ def delete_meal(meal_id: int) -> Response:
         app.logger.error(f"Error deleting meal: {e}")
         return make_response(jsonify({'error': str(e)}), 500)
 
+@app.route('/api/meals/export', methods=['GET'])
+def export_meals() -> Response:
+    """
+    Route to stream the whole meal catalog, starting to send rows as soon as they are read.
+
+    Query Parameters:
+        - format (str): 'ndjson' (one JSON object per line) or 'csv'. Default is 'ndjson'.
+        - include_deleted (str): 'true' to include soft-deleted meals. Default is 'false'.
+
+    Returns:
+        A streaming NDJSON or CSV response of every meal.
+    Raises:
+        400 error if the format is not supported.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    include_deleted = request.args.get('include_deleted', 'false').lower() == 'true'
+    app.logger.info("Exporting meals as %s (include_deleted=%s)", export_format, include_deleted)
+
+    batches = kitchen_model.iter_meal_batches(include_deleted=include_deleted)
+
+    if export_format == 'ndjson':
+        def generate():
+            for batch in batches:
+                yield "".join(json.dumps(meal) + "\n" for meal in batch)
+        mimetype = 'application/x-ndjson'
+    elif export_format == 'csv':
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=kitchen_model.MEAL_EXPORT_COLUMNS)
+            writer.writeheader()
+            yield buffer.getvalue()
+            for batch in batches:
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(batch)
+                yield buffer.getvalue()
+        mimetype = 'text/csv'
+    else:
+        return make_response(jsonify({'error': 'Format must be ndjson or csv'}), 400)
+
+    response = Response(generate(), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=meals.{export_format}'
+    return response
+
 @app.route('/api/get-meal-by-id/<int:meal_id>', methods=['GET'])
 def get_meal_by_id(meal_id: int) -> Response:
     """
@@ -160,13 +378,22 @@ def get_meal_by_id(meal_id: int) -> Response:
         - meal_id (int): The ID of the meal.
 
     Returns:
-        JSON response with the meal details or error message.
+        JSON response with the meal details and an ETag, or error message.
+        304 without a body if the If-None-Match header holds the current ETag.
     """
     try:
         app.logger.info(f"Retrieving meal by ID: {meal_id}")
 
-        meal = kitchen_model.get_meal_by_id(meal_id)
-        return make_response(jsonify({'status': 'success', 'meal': meal}), 200)
+        version = kitchen_model.get_data_version()
+        etag = etag_for(version)
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+
+        # Pass the version so a meal cached before another process's write is not served under it
+        meal = kitchen_model.get_meal_by_id(meal_id, version=version)
+        response = make_response(jsonify({'status': 'success', 'meal': meal}), 200)
+        response.set_etag(etag)
+        return response
     except Exception as e:
         app.logger.error(f"Error retrieving meal by ID: {e}")
         return make_response(jsonify({'error': str(e)}), 500)
@@ -180,7 +407,8 @@ def get_meal_by_name(meal_name: str) -> Response:
         - meal_name (str): The name of the meal.
 
     Returns:
-        JSON response with the meal details or error message.
+        JSON response with the meal details and an ETag, or error message.
+        304 without a body if the If-None-Match header holds the current ETag.
     """
     try:
         app.logger.info(f"Retrieving meal by name: {meal_name}")
@@ -188,8 +416,15 @@ def get_meal_by_name(meal_name: str) -> Response:
         if not meal_name:
             return make_response(jsonify({'error': 'Meal name is required'}), 400)
 
-        meal = kitchen_model.get_meal_by_name(meal_name)
-        return make_response(jsonify({'status': 'success', 'meal': meal}), 200)
+        version = kitchen_model.get_data_version()
+        etag = etag_for(version)
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+
+        meal = kitchen_model.get_meal_by_name(meal_name, version=version)
+        response = make_response(jsonify({'status': 'success', 'meal': meal}), 200)
+        response.set_etag(etag)
+        return response
     except Exception as e:
         app.logger.error(f"Error retrieving meal by name: {e}")
         return make_response(jsonify({'error': str(e)}), 500)
@@ -302,28 +537,76 @@ def prep_combatant() -> Response:
 @app.route('/api/leaderboard', methods=['GET'])
 def get_leaderboard() -> Response:
     """
-    Route to get the leaderboard of meals sorted by wins, battles, or win percentage.
+    Route to get the leaderboard of meals sorted by wins or win percentage.
 
     Query Parameters:
-        - sort (str): The field to sort by ('wins', 'battles', or 'win_pct'). Default is 'wins'.
+        - sort (str): The field to sort by ('wins' or 'win_pct'). Default is 'wins'.
+        - limit (int): The maximum number of meals to return. Default is all of them.
+        - after (str): The next_cursor of the previous page, to fetch the page after it.
+
+    Responses are cached as encoded bytes until the next write to the meals table, by any
+    process (see kitchen_model.get_data_version). With
+    LEADERBOARD_MAX_STALENESS_MS set, the leaderboard may be a slightly outdated snapshot;
+    its ETag then names the version it was read at.
 
     Returns:
-        JSON response with a sorted leaderboard of meals.
+        JSON response with a sorted leaderboard of meals and, when the page is full,
+        the cursor of the next page, with an ETag.
+        304 without a body if the If-None-Match header holds the current ETag.
     Raises:
+        400 error if the sort field, the limit or the cursor is invalid.
         500 error if there is an issue generating the leaderboard.
     """
     try:
         sort_by = request.args.get('sort', 'wins')  # Default sort by wins
-        app.logger.info("Generating leaderboard sorted by %s", sort_by)
-
-        leaderboard_data = kitchen_model.get_leaderboard(sort_by)
-
-        return make_response(jsonify({'status': 'success', 'leaderboard': leaderboard_data}), 200)
+        after = request.args.get('after')
+        limit = request.args.get('limit')
+        app.logger.info("Generating leaderboard sorted by %s (limit=%s, after=%s)", sort_by, limit, after)
+
+        if limit is not None:
+            try:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError("Limit must be positive")
+            except ValueError:
+                return make_response(jsonify({'error': 'Limit must be a positive integer'}), 400)
+
+        # Read the version first: a write landing during the query then files the entry under a stale version
+        version = kitchen_model.get_data_version()
+        etag = etag_for(version)
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+
+        cache_key = (version, sort_by, limit, after)
+        body = leaderboard_cache.get(cache_key)
+        if body is not None:
+            response = Response(body, status=200, mimetype='application/json')
+            response.set_etag(etag)
+            return response
+
+        snapshot_version, leaderboard_data = kitchen_model.get_leaderboard_snapshot(sort_by, limit=limit, after=after)
+        if snapshot_version != version:
+            # Served a stale snapshot, which the client may already hold
+            etag = etag_for(snapshot_version)
+            if request.if_none_match.contains(etag):
+                return not_modified(etag)
+            cache_key = (snapshot_version, sort_by, limit, after)
+
+        next_cursor = None
+        if limit is not None and len(leaderboard_data) == limit:
+            next_cursor = kitchen_model.encode_leaderboard_cursor(leaderboard_data[-1], sort_by)
+
+        response = make_response(jsonify({'status': 'success', 'leaderboard': leaderboard_data, 'next_cursor': next_cursor}), 200)
+        leaderboard_cache.set(cache_key, response.get_data())
+        response.set_etag(etag)
+        return response
+    except ValueError as e:
+        app.logger.error("Invalid leaderboard request: %s", str(e))
+        return make_response(jsonify({'error': str(e)}), 400)
     except Exception as e:
         app.logger.error(f"Error generating leaderboard: {e}")
         return make_response(jsonify({'error': str(e)}), 500)
 
 
-
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -1,7 +1,11 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 import logging
-from typing import List
+import os
+import threading
+import time
+from typing import List, Optional
 
-from meal_max.meal_max.models.kitchen_model import Meal, update_meal_stats
+from meal_max.meal_max.models.kitchen_model import Meal, record_battle_result
 from meal_max.meal_max.utils.logger import configure_logger
 from meal_max.meal_max.utils.random_utils import get_random
 
@@ -10,20 +14,37 @@ logger = logging.getLogger(__name__)
 configure_logger(logger)
 
 
+# start fetching the battle's random number as soon as the second combatant is prepped
+BATTLE_PREFETCH_RANDOM = os.getenv("BATTLE_PREFETCH_RANDOM", "false").lower() == "true"
+
+# Prefetches only wait on I/O, so a couple of workers serve every BattleModel
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="battle-prefetch")
+
+
 class BattleModel:
     """
     A class to manage battles between meals. 
         
     Attributes:
         combatants (List[Meal]): The list of meals.
+        prefetch_random (bool): Whether the random number is fetched in the background once
+            two combatants are prepped, instead of inside battle().
         
     """
 
-    def __init__(self):
+    def __init__(self, prefetch_random: bool = BATTLE_PREFETCH_RANDOM):
         """
             Initializes the BattleModel with an empty list of meals.
         """
         self.combatants: List[Meal] = []
+        self.prefetch_random = prefetch_random
+
+        self._prefetch: Optional[Future] = None
+        self._prefetch_lock = threading.Lock()
+        self._prefetch_stats = {
+            'prefetches': 0, 'hidden': 0, 'waited': 0, 'unprefetched': 0,
+            'failed': 0, 'discarded': 0, 'wait_ms': 0.0, 'hidden_ms': 0.0
+        }
 
     def battle(self) -> str:
         """
@@ -61,8 +82,8 @@ class BattleModel:
         # Log the delta and normalized delta
         logger.info("Delta between scores: %.3f", delta)
 
-        # Get random number from random.org
-        random_number = get_random()
+        # Get random number from random.org, usually fetched while the combatants were prepped
+        random_number = self._take_random_number()
 
         # Log the random number
         logger.info("Random number from random.org: %.3f", random_number)
@@ -78,9 +99,8 @@ class BattleModel:
         # Log the winner
         logger.info("The winner is: %s", winner.meal)
 
-        # Update stats for both combatants
-        update_meal_stats(winner.id, 'win')
-        update_meal_stats(loser.id, 'loss')
+        # Update stats for both combatants in one transaction
+        record_battle_result(winner.id, loser.id)
 
         # Remove the losing combatant from combatants
         self.combatants.remove(loser)
@@ -93,6 +113,7 @@ class BattleModel:
         """
         logger.info("Clearing the combatants list.")
         self.combatants.clear()
+        self._discard_prefetch()
 
     def get_battle_score(self, combatant: Meal) -> float:
         """
@@ -146,4 +167,76 @@ class BattleModel:
         self.combatants.append(combatant_data)
 
         # Log the current state of combatants
-        logger.info("Current combatants list: %s", [combatant.meal for combatant in self.combatants])
\ No newline at end of file
+        logger.info("Current combatants list: %s", [combatant.meal for combatant in self.combatants])
+
+        if self.prefetch_random and len(self.combatants) == 2:
+            self._start_prefetch()
+
+    ##################################################
+    # Random number prefetch
+    ##################################################
+
+    def _start_prefetch(self) -> None:
+        with self._prefetch_lock:
+            if self._prefetch is not None:
+                return
+            self._prefetch = _prefetch_executor.submit(self._fetch_random)
+            self._prefetch_stats['prefetches'] += 1
+        logger.debug("Prefetching the random number for the next battle")
+
+    def _fetch_random(self) -> tuple[float, float]:
+        started = time.monotonic()
+        random_number = get_random()
+        return random_number, (time.monotonic() - started) * 1000
+
+    def _take_random_number(self) -> float:
+        with self._prefetch_lock:
+            prefetch, self._prefetch = self._prefetch, None
+
+        if prefetch is not None:
+            ready = prefetch.done()
+            started = time.monotonic()
+            try:
+                random_number, fetch_ms = prefetch.result()
+            except Exception as e:
+                logger.warning("Prefetched random number failed, fetching it again: %s", e)
+                with self._prefetch_lock:
+                    self._prefetch_stats['failed'] += 1
+            else:
+                wait_ms = 0.0 if ready else (time.monotonic() - started) * 1000
+                with self._prefetch_lock:
+                    self._prefetch_stats['hidden' if ready else 'waited'] += 1
+                    self._prefetch_stats['wait_ms'] += wait_ms
+                    self._prefetch_stats['hidden_ms'] += max(fetch_ms - wait_ms, 0.0)
+                return random_number
+
+        with self._prefetch_lock:
+            self._prefetch_stats['unprefetched'] += 1
+        return get_random()
+
+    def _discard_prefetch(self) -> None:
+        with self._prefetch_lock:
+            prefetch, self._prefetch = self._prefetch, None
+            if prefetch is not None:
+                self._prefetch_stats['discarded'] += 1
+        if prefetch is not None:
+            prefetch.cancel()
+
+    def get_prefetch_stats(self) -> dict:
+        """
+        Returns how often battle() found its random number already fetched.
+
+        'hidden' battles found it ready, 'waited' ones blocked on a prefetch still running
+        (for 'wait_ms' in total), and 'unprefetched' ones fetched it themselves, either because
+        nothing was prefetched or because the prefetch 'failed'. 'discarded' prefetches were
+        dropped by clear_combatants. 'hidden_ms' is the fetch time kept off battle().
+        """
+        with self._prefetch_lock:
+            stats = dict(self._prefetch_stats)
+            stats['pending'] = self._prefetch is not None
+        served = stats['hidden'] + stats['waited']
+        stats['hidden_ratio'] = round(stats['hidden'] / served, 3) if served else None
+        stats['wait_ms'] = round(stats['wait_ms'], 1)
+        stats['hidden_ms'] = round(stats['hidden_ms'], 1)
+        stats['enabled'] = self.prefetch_random
+        return stats
\ No newline at end of file
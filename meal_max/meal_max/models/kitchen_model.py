@@ -1,9 +1,17 @@
+import atexit
+import base64
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass
+from itertools import islice
+import json
 import logging
 import os
 import sqlite3
-from typing import Any
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional
 
+from meal_max.meal_max.utils.cache_utils import LRUCache, SingleFlight
 from meal_max.meal_max.utils.sql_utils import get_db_connection
 from meal_max.meal_max.utils.logger import configure_logger
 
@@ -12,6 +20,31 @@ logger = logging.getLogger(__name__)
 configure_logger(logger)
 
 
+# write-behind mode for battle statistics
+STATS_WRITE_BEHIND = os.getenv("STATS_WRITE_BEHIND", "false").lower() == "true"
+STATS_FLUSH_INTERVAL_MS = int(os.getenv("STATS_FLUSH_INTERVAL_MS", "200"))
+STATS_FLUSH_MAX_EVENTS = int(os.getenv("STATS_FLUSH_MAX_EVENTS", "500"))
+
+# rows written per transaction by create_meals
+MEAL_BATCH_SIZE = int(os.getenv("MEAL_BATCH_SIZE", "500"))
+
+# rows fetched per round trip when streaming the catalog
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+MEAL_EXPORT_COLUMNS = ('id', 'meal', 'cuisine', 'price', 'difficulty', 'battles', 'wins', 'deleted')
+
+# stale-while-revalidate for the leaderboard: how old a snapshot may be when served; 0 disables it
+LEADERBOARD_MAX_STALENESS_MS = int(os.getenv("LEADERBOARD_MAX_STALENESS_MS", "0"))
+
+# read-through cache of live meals for get_meal_by_id/get_meal_by_name; size 0 disables it
+MEAL_CACHE_SIZE = int(os.getenv("MEAL_CACHE_SIZE", "1024"))
+MEAL_CACHE_TTL = float(os.getenv("MEAL_CACHE_TTL", "60"))
+
+# names that get_meal_by_name did not find, answered without a query until created; size 0 disables it
+NEGATIVE_MEAL_CACHE_SIZE = int(os.getenv("NEGATIVE_MEAL_CACHE_SIZE", "4096"))
+NEGATIVE_MEAL_CACHE_TTL = float(os.getenv("NEGATIVE_MEAL_CACHE_TTL", "30"))
+
+
 @dataclass
 class Meal:
     id: int
@@ -27,6 +60,170 @@ class Meal:
             raise ValueError("Difficulty must be 'LOW', 'MED', or 'HIGH'.")
 
 
+###############
+# Data version
+###############
+
+# Bumped after every write this process commits or buffers. Only read coalescing uses it:
+# a caller must not join a read that started before its own write.
+_write_generation = 0
+# Battle outcomes this process has buffered (see BattleStatsBuffer), part of get_data_version
+_buffered_outcomes = 0
+_write_generation_lock = threading.Lock()
+
+
+def _bump_write_generation(buffered: bool = False) -> None:
+    global _write_generation, _buffered_outcomes
+    with _write_generation_lock:
+        _write_generation += 1
+        if buffered:
+            _buffered_outcomes += 1
+
+def get_data_version() -> tuple[str, int, int]:
+    """
+    Returns a version that changes after every write to the meals table.
+
+    The first part is the random id the database was given when its data version was
+    created, so a recreated database never repeats an earlier version. The second is a
+    counter in the data_version table, bumped by triggers on every change to the meals
+    table, so writes made by other processes and tools, such as the importer or a second
+    worker, are seen as well. The third counts the battle outcomes this process has
+    buffered, which are visible to its reads before they are written; it stays 0 unless
+    write-behind is on. A result computed after reading the version stays current for
+    as long as the version is unchanged.
+
+    Returns:
+        tuple[str, int, int]: The database id, the database version and the buffered outcome count.
+
+    Raises:
+        sqlite3.Error: If the version cannot be read.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT database_id, version FROM data_version WHERE id = 1")
+        database_id, database_version = cursor.fetchone()
+    return database_id, database_version, _buffered_outcomes
+
+
+###############
+# Read coalescing
+###############
+
+# Identical concurrent reads share one query. Keys carry the write generation read by the
+# caller, so nobody joins a read that started before a write they have already made.
+_read_flights = SingleFlight()
+
+
+def get_read_coalescing_stats() -> dict:
+    """
+    Returns how many read calls ran a query and how many were collapsed into another call's query.
+    """
+    return _read_flights.get_stats()
+
+
+###############
+# Meal cache
+###############
+
+# entries are keyed by ('id', meal_id) and ('name', meal_name) and hold (data version, meal):
+# writes by other processes do not invalidate them, so callers holding a version skip older ones
+_meal_cache = LRUCache(MEAL_CACHE_SIZE, MEAL_CACHE_TTL)
+# keyed by meal name and holding the data version; only names with no row at all, deleted
+# meals still go to the database
+_negative_meal_cache = LRUCache(NEGATIVE_MEAL_CACHE_SIZE, NEGATIVE_MEAL_CACHE_TTL)
+# bumped by every invalidation, so a read that raced a write does not cache what it read
+_meal_cache_generation = 0
+_meal_cache_lock = threading.Lock()
+
+
+def _cached_meal(key: tuple, version: Optional[tuple]) -> Optional[Meal]:
+    entry = _meal_cache.get(key)
+    if entry is None or (version is not None and entry[0] != version):
+        return None
+    return entry[1]
+
+def _remember_meal(meal: Meal, generation: int, version: Optional[tuple]) -> None:
+    with _meal_cache_lock:
+        if generation != _meal_cache_generation:
+            return
+        _meal_cache.set(('id', meal.id), (version, meal))
+        _meal_cache.set(('name', meal.meal), (version, meal))
+
+def _forget_meals(meal_id: Optional[int] = None) -> None:
+    global _meal_cache_generation
+    with _meal_cache_lock:
+        _meal_cache_generation += 1
+        if meal_id is None:
+            _meal_cache.clear()
+        else:
+            _meal_cache.discard_where(lambda entry: entry[1].id == meal_id)
+
+def _remember_missing_name(meal_name: str, generation: int, version: Optional[tuple]) -> None:
+    with _meal_cache_lock:
+        if generation != _meal_cache_generation:
+            return
+        _negative_meal_cache.set(meal_name, (version,))
+
+def _forget_missing_names(meal_names: Optional[Iterable[str]] = None) -> None:
+    global _meal_cache_generation
+    with _meal_cache_lock:
+        _meal_cache_generation += 1
+        if meal_names is None:
+            _negative_meal_cache.clear()
+        else:
+            for meal_name in meal_names:
+                _negative_meal_cache.discard(meal_name)
+
+def get_meal_cache_stats() -> dict:
+    """
+    Returns the hit, miss and eviction counters of the meal cache.
+    """
+    return _meal_cache.get_stats()
+
+def get_negative_meal_cache_stats() -> dict:
+    """
+    Returns the hit, miss and eviction counters of the cache of unknown meal names.
+    """
+    return _negative_meal_cache.get_stats()
+
+def clear_meal_caches() -> None:
+    """
+    Drops every cached meal lookup, including the cached unknown names.
+    """
+    _forget_meals()
+    _forget_missing_names()
+
+
+def _validate_price_and_difficulty(price: float, difficulty: str) -> None:
+    if not isinstance(price, (int, float)) or price <= 0:
+        raise ValueError(f"Invalid price: {price}. Price must be a positive number.")
+    if difficulty not in ['LOW', 'MED', 'HIGH']:
+        raise ValueError(f"Invalid difficulty level: {difficulty}. Must be 'LOW', 'MED', or 'HIGH'.")
+
+def validate_meal_fields(meal: str, cuisine: str, price: float, difficulty: str) -> None:
+    """
+    Applies the rules a meal must satisfy before it is written, as create_meal and
+    the /api/create-meal route do.
+
+    Args:
+        meal (str): The name of the meal.
+        cuisine (str): The cuisine that the meal belongs to.
+        price (float): The price of the meal.
+        difficulty (str): The difficulty of the meal.
+
+    Raises:
+        ValueError: If a field is missing or invalid.
+    """
+    if not isinstance(meal, str) or not meal:
+        raise ValueError(f"Invalid meal name: {meal}. Must be a non-empty string.")
+    if not isinstance(cuisine, str) or not cuisine:
+        raise ValueError(f"Invalid cuisine: {cuisine}. Must be a non-empty string.")
+    if isinstance(price, bool):
+        raise ValueError(f"Invalid price: {price}. Price must be a positive number.")
+    _validate_price_and_difficulty(price, difficulty)
+    if round(price, 2) != price:
+        raise ValueError(f"Invalid price: {price}. Price must have at most two decimal places.")
+
 def create_meal(meal: str, cuisine: str, price: float, difficulty: str) -> None:
     """
     Creates a new meal in the meal table.
@@ -43,10 +240,7 @@ def create_meal(meal: str, cuisine: str, price: float, difficulty: str) -> None:
         sqlite3.Error: For any other database errors.
     
     """
-    if not isinstance(price, (int, float)) or price <= 0:
-        raise ValueError(f"Invalid price: {price}. Price must be a positive number.")
-    if difficulty not in ['LOW', 'MED', 'HIGH']:
-        raise ValueError(f"Invalid difficulty level: {difficulty}. Must be 'LOW', 'MED', or 'HIGH'.")
+    _validate_price_and_difficulty(price, difficulty)
 
     try:
         with get_db_connection() as conn:
@@ -56,6 +250,8 @@ def create_meal(meal: str, cuisine: str, price: float, difficulty: str) -> None:
                 VALUES (?, ?, ?, ?)
             """, (meal, cuisine, price, difficulty))
             conn.commit()
+            _bump_write_generation()
+            _forget_missing_names([meal])
 
             logger.info("Meal successfully added to the database: %s", meal)
 
@@ -67,20 +263,156 @@ def create_meal(meal: str, cuisine: str, price: float, difficulty: str) -> None:
         logger.error("Database error: %s", str(e))
         raise e
 
+def create_meals(meals: Iterable[dict[str, Any]], upsert: bool = False,
+                 chunk_size: int = MEAL_BATCH_SIZE,
+                 before_commit: Optional[Callable[[sqlite3.Cursor], None]] = None) -> dict[str, Any]:
+    """
+    Creates many meals at once, writing each chunk with executemany in its own transaction.
+
+    Invalid rows and duplicate names are reported rather than aborting the load.
+
+    Args:
+        meals (Iterable[dict[str, Any]]): Meals with 'meal', 'cuisine', 'price' and 'difficulty' keys.
+        upsert (bool): If True, a meal whose name already exists has its cuisine, price and
+            difficulty overwritten instead of being reported as a duplicate. Deleted meals stay deleted.
+        chunk_size (int): The number of rows written per transaction.
+        before_commit (Callable[[sqlite3.Cursor], None]): If set, called with the cursor of
+            every chunk's transaction just before it commits, to write alongside the meals.
+            Chunks that write no meal commit nothing and do not call it.
+
+    Returns:
+        dict[str, Any]: Counts of 'created' and 'updated' meals, and 'errors', a list of
+            {'index', 'meal', 'error'} for every rejected row (index is the row's position in meals).
+
+    Raises:
+        ValueError: If chunk_size is not positive.
+        sqlite3.Error: For database errors; chunks committed before the error are kept.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"Invalid chunk size: {chunk_size}. Must be at least 1.")
+
+    report = {'created': 0, 'updated': 0, 'errors': []}
+    rows = enumerate(meals)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        _create_meals_chunk(chunk, upsert, report, before_commit)
+
+    logger.info("Bulk meal load: %d created, %d updated, %d rejected",
+                report['created'], report['updated'], len(report['errors']))
+    return report
+
+def _create_meals_chunk(chunk: list[tuple[int, Any]], upsert: bool, report: dict[str, Any],
+                        before_commit: Optional[Callable[[sqlite3.Cursor], None]] = None) -> None:
+    valid = {}
+    for index, data in chunk:
+        name = data.get('meal') if isinstance(data, dict) else None
+        try:
+            if not isinstance(data, dict):
+                raise ValueError("Each meal must be a JSON object")
+            validate_meal_fields(name, data.get('cuisine'), data.get('price'), data.get('difficulty'))
+            if name in valid and not upsert:
+                raise ValueError(f"Meal with name '{name}' already exists")
+        except ValueError as e:
+            report['errors'].append({'index': index, 'meal': name, 'error': str(e)})
+            continue
+        # With upsert the last occurrence of a name wins, as it would row by row
+        valid[name] = (index, (name, data['cuisine'], data['price'], data['difficulty']))
+
+    if not valid:
+        return
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ", ".join("?" * len(valid))
+            cursor.execute(f"SELECT meal FROM meals WHERE meal IN ({placeholders})", list(valid))
+            existing = {row[0] for row in cursor.fetchall()}
+
+            if upsert:
+                cursor.executemany("""
+                    INSERT INTO meals (meal, cuisine, price, difficulty)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(meal) DO UPDATE SET
+                        cuisine = excluded.cuisine, price = excluded.price, difficulty = excluded.difficulty
+                """, [values for _, values in valid.values()])
+                if before_commit is not None:
+                    before_commit(cursor)
+                conn.commit()
+                _bump_write_generation()
+                _forget_missing_names(valid)
+                if existing:
+                    # Overwritten meals may be cached under either key
+                    _forget_meals()
+                report['updated'] += len(existing)
+                report['created'] += len(valid) - len(existing)
+                return
+
+            for name in existing:
+                index, _ = valid.pop(name)
+                report['errors'].append({'index': index, 'meal': name, 'error': f"Meal with name '{name}' already exists"})
+            if not valid:
+                return
+
+            # DO NOTHING covers a concurrent insert of the same name between the SELECT and here
+            cursor.executemany("""
+                INSERT INTO meals (meal, cuisine, price, difficulty)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(meal) DO NOTHING
+            """, [values for _, values in valid.values()])
+            created = cursor.rowcount
+            if before_commit is not None:
+                before_commit(cursor)
+            conn.commit()
+            _bump_write_generation()
+            _forget_missing_names(valid)
+            report['created'] += created
+
+    except sqlite3.Error as e:
+        logger.error("Database error: %s", str(e))
+        raise e
+
+def _raise_meal_unavailable(cursor: sqlite3.Cursor, meal_id: int) -> None:
+    """
+    Explains why a conditional UPDATE on a meal matched no rows.
+
+    Only runs on the failure path, so the happy path never pays for a read.
+
+    Args:
+        cursor (sqlite3.Cursor): The cursor that ran the UPDATE.
+        meal_id (int): The ID the UPDATE targeted.
+
+    Raises:
+        ValueError: Always; the meal was either deleted or never existed.
+    """
+    cursor.execute("SELECT deleted FROM meals WHERE id = ?", (meal_id,))
+    row = cursor.fetchone()
+    if row is None:
+        logger.info("Meal with ID %s not found", meal_id)
+        raise ValueError(f"Meal with ID {meal_id} not found")
+    logger.info("Meal with ID %s has been deleted", meal_id)
+    raise ValueError(f"Meal with ID {meal_id} has been deleted")
+
 def clear_meals() -> None:
     """
-    Recreates the meals table, effectively deleting all meals.
+    Deletes every meal and resets the meal ids, keeping the schema and its indexes.
 
     Raises:
         sqlite3.Error: If any database error occurs.
     """
+    # Hold flushes off so buffered outcomes of the cleared meals never reach the reused ids
+    paused = _stats_buffer.paused() if _stats_buffer is not None else nullcontext()
     try:
-        with open(os.getenv("SQL_CREATE_TABLE_PATH", "/app/sql/create_meal_table.sql"), "r") as fh:
-            create_table_script = fh.read()
-        with get_db_connection() as conn:
+        with paused, get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.executescript(create_table_script)
+            cursor.execute("DELETE FROM meals")
+            cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'meals'")
             conn.commit()
+            _bump_write_generation()
+            _forget_meals()
+            if _stats_buffer is not None:
+                _stats_buffer.discard()
 
             logger.info("Meals cleared successfully.")
 
@@ -103,18 +435,12 @@ def delete_meal(meal_id: int) -> None:
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT deleted FROM meals WHERE id = ?", (meal_id,))
-            try:
-                deleted = cursor.fetchone()[0]
-                if deleted:
-                    logger.info("Meal with ID %s has already been deleted", meal_id)
-                    raise ValueError(f"Meal with ID {meal_id} has been deleted")
-            except TypeError:
-                logger.info("Meal with ID %s not found", meal_id)
-                raise ValueError(f"Meal with ID {meal_id} not found")
-
-            cursor.execute("UPDATE meals SET deleted = TRUE WHERE id = ?", (meal_id,))
+            cursor.execute("UPDATE meals SET deleted = TRUE WHERE id = ? AND deleted = FALSE", (meal_id,))
+            if cursor.rowcount == 0:
+                _raise_meal_unavailable(cursor, meal_id)
             conn.commit()
+            _bump_write_generation()
+            _forget_meals(meal_id)
 
             logger.info("Meal with ID %s marked as deleted.", meal_id)
 
@@ -122,37 +448,121 @@ def delete_meal(meal_id: int) -> None:
         logger.error("Database error: %s", str(e))
         raise e
 
-def get_leaderboard(sort_by: str="wins") -> dict[str, Any]:
+# sort key expression of each leaderboard mode; id DESC breaks ties so keyset pages are stable
+LEADERBOARD_SORT_KEYS = {
+    'wins': 'wins',
+    'win_pct': '(wins * 1.0 / battles)',
+}
+
+
+def _build_leaderboard_query(sort_by: str, limit: Optional[int] = None, paged: bool = False) -> str:
     """
-    Returns a leaderboard dictionary of all the meals that are not deleted and have already combatted
-    after they are sorted from largest to smallest in terms of win_pct.
-    
+    Builds the leaderboard query for the given sort mode.
+
+    The WHERE clause must stay textually identical to the one on the partial
+    leaderboard indexes in sql/migrations, or SQLite will not use them.
+
     Args:
-        sort_by (str): If str == "wins", sort the songs by win_pct or wins in descending order.
-    Returns: 
-        dict[str, Any]: A leaderboard dictionary of all meals sorted by win_pct or wins in descending order.
+        sort_by (str): Either "wins" or "win_pct".
+        limit (int): If set, add a LIMIT placeholder.
+        paged (bool): If set, add the keyset condition that resumes after a cursor,
+            taking (sort key, sort key, id) placeholders.
+
+    Returns:
+        str: The SQL query.
+
     Raises:
         ValueError: If the input sort_by is invalid.
-        sqlite3.Error: For any other database errors.
     """
+    if sort_by not in LEADERBOARD_SORT_KEYS:
+        logger.error("Invalid sort_by parameter: %s", sort_by)
+        raise ValueError("Invalid sort_by parameter: %s" % sort_by)
+    key = LEADERBOARD_SORT_KEYS[sort_by]
+
     query = """
         SELECT id, meal, cuisine, price, difficulty, battles, wins, (wins * 1.0 / battles) AS win_pct
         FROM meals WHERE deleted = false AND battles > 0
     """
 
-    if sort_by == "win_pct":
-        query += " ORDER BY win_pct DESC"
-    elif sort_by == "wins":
-        query += " ORDER BY wins DESC"
-    else:
+    if paged:
+        # The leading range term lets SQLite seek into the index instead of skipping rows
+        query += f" AND {key} <= ? AND ({key} < ? OR id < ?)"
+
+    query += f" ORDER BY {sort_by} DESC, id DESC"
+
+    if limit is not None:
+        query += " LIMIT ?"
+
+    return query
+
+def encode_leaderboard_cursor(entry: dict[str, Any], sort_by: str) -> str:
+    """
+    Builds the opaque cursor that resumes the leaderboard after the given entry.
+
+    Args:
+        entry (dict[str, Any]): The last leaderboard entry of a page.
+        sort_by (str): The sort mode the page was produced with.
+
+    Returns:
+        str: A URL-safe cursor string.
+    """
+    # The raw ratio, not the rounded percentage, is what the query compares against
+    key = entry['wins'] / entry['battles'] if sort_by == 'win_pct' else entry['wins']
+    payload = json.dumps([sort_by, key, entry['id']], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+def _decode_leaderboard_cursor(cursor: str, sort_by: str) -> tuple[Any, int]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort_by, key, meal_id = json.loads(payload)
+    except (ValueError, TypeError):
+        logger.error("Invalid leaderboard cursor: %s", cursor)
+        raise ValueError("Invalid cursor: %s" % cursor)
+    if cursor_sort_by != sort_by or not isinstance(key, (int, float)) or not isinstance(meal_id, int):
+        logger.error("Leaderboard cursor does not match sort %s: %s", sort_by, cursor)
+        raise ValueError("Invalid cursor: %s" % cursor)
+    return key, meal_id
+
+def get_leaderboard(sort_by: str="wins", limit: Optional[int] = None, after: Optional[str] = None) -> list[dict[str, Any]]:
+    """
+    Returns the leaderboard of all the meals that are not deleted and have already combatted,
+    sorted from largest to smallest by wins or win_pct.
+
+    Pages are keyset-paginated: the cursor carries the sort key and id of the last entry
+    served, so every page is an index seek and costs the same regardless of its depth.
+
+    Args:
+        sort_by (str): Either "wins" or "win_pct"; ties are broken by descending id.
+        limit (int): The maximum number of entries to return. Defaults to all of them.
+        after (str): A cursor from encode_leaderboard_cursor; only entries after it are returned.
+
+    Returns:
+        list[dict[str, Any]]: The leaderboard entries in rank order. Concurrent identical
+            calls share one query and receive the same list, so it must not be modified.
+
+    Raises:
+        ValueError: If the input sort_by, limit or cursor is invalid.
+        sqlite3.Error: For any other database errors.
+    """
+    if limit is not None and (not isinstance(limit, int) or limit < 1):
+        logger.error("Invalid limit parameter: %s", limit)
+        raise ValueError("Invalid limit parameter: %s" % limit)
+
+    if sort_by not in LEADERBOARD_SORT_KEYS:
         logger.error("Invalid sort_by parameter: %s", sort_by)
         raise ValueError("Invalid sort_by parameter: %s" % sort_by)
+    cursor = _decode_leaderboard_cursor(after, sort_by) if after is not None else None
+
+    return _read_flights.do(('leaderboard', _write_generation, sort_by, limit, after),
+                            _query_leaderboard, sort_by, limit, cursor)
 
+def _query_leaderboard(sort_by: str, limit: Optional[int],
+                       cursor: Optional[tuple[Any, int]]) -> list[dict[str, Any]]:
     try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query)
-            rows = cursor.fetchall()
+        if _stats_buffer is None:
+            rows = _select_leaderboard(sort_by, limit, cursor)
+        else:
+            rows = _select_leaderboard_with_pending(sort_by, limit, cursor)
 
         leaderboard = []
         for row in rows:
@@ -175,12 +585,305 @@ def get_leaderboard(sort_by: str="wins") -> dict[str, Any]:
         logger.error("Database error: %s", str(e))
         raise e
 
-def get_meal_by_id(meal_id: int) -> Meal:
+def _select_leaderboard(sort_by: str, limit: Optional[int], cursor: Optional[tuple[Any, int]]) -> list[tuple]:
+    query = _build_leaderboard_query(sort_by, limit, paged=cursor is not None)
+    params = []
+    if cursor is not None:
+        key, meal_id = cursor
+        params += [key, key, meal_id]
+    if limit is not None:
+        params.append(limit)
+
+    with get_db_connection() as conn:
+        db_cursor = conn.cursor()
+        db_cursor.execute(query, params)
+        return db_cursor.fetchall()
+
+def _select_leaderboard_with_pending(sort_by: str, limit: Optional[int],
+                                     cursor: Optional[tuple[Any, int]]) -> list[tuple]:
+    """
+    Reads the leaderboard rows as they will be once the write-behind buffer is flushed.
+
+    The buffered deltas are merged in memory, so a read never writes. A flush that
+    commits while the rows are read would be counted twice, so the read is retried
+    when the buffer's flush generation moved; after a few tries, flushes are held
+    off for the length of one read instead.
+
+    Args:
+        sort_by (str): Either "wins" or "win_pct".
+        limit (int): The maximum number of rows to return, or None for all of them.
+        cursor (tuple[Any, int]): The sort key and id to resume after, or None.
+
+    Returns:
+        list[tuple]: The leaderboard rows in rank order, as the leaderboard query returns them.
+    """
+    for _ in range(3):
+        generation, deltas = _stats_buffer.get_pending_deltas()
+        if generation % 2 == 0:
+            rows = _merge_pending_deltas(sort_by, limit, cursor, deltas)
+            if _stats_buffer.get_flush_generation() == generation:
+                return rows
+        # Wait for the flush in progress rather than race it again
+        with _stats_buffer.paused():
+            pass
+
+    with _stats_buffer.paused():
+        _, deltas = _stats_buffer.get_pending_deltas()
+        return _merge_pending_deltas(sort_by, limit, cursor, deltas)
+
+def _merge_pending_deltas(sort_by: str, limit: Optional[int], cursor: Optional[tuple[Any, int]],
+                          deltas: dict[int, tuple[int, int]]) -> list[tuple]:
+    if not deltas:
+        return _select_leaderboard(sort_by, limit, cursor)
+
+    # Every buffered meal may leave the page once merged, so read that many more rows to refill it
+    read_limit = limit + len(deltas) if limit is not None else None
+    rows = [row for row in _select_leaderboard(sort_by, read_limit, cursor) if row[0] not in deltas]
+
+    meal_ids = list(deltas)
+    with get_db_connection() as conn:
+        db_cursor = conn.cursor()
+        for start in range(0, len(meal_ids), 500):
+            chunk = meal_ids[start:start + 500]
+            db_cursor.execute(
+                f"""
+                SELECT id, meal, cuisine, price, difficulty, battles, wins
+                FROM meals WHERE deleted = false AND id IN ({', '.join('?' * len(chunk))})
+                """,
+                chunk
+            )
+            for row in db_cursor.fetchall():
+                battles, wins = row[5] + deltas[row[0]][0], row[6] + deltas[row[0]][1]
+                rows.append(tuple(row[:5]) + (battles, wins, wins * 1.0 / battles))
+
+    def rank(row: tuple) -> tuple[Any, int]:
+        return (row[6] if sort_by == 'wins' else row[7], row[0])
+
+    rows = [row for row in rows if cursor is None or rank(row) < tuple(cursor)]
+    rows.sort(key=rank, reverse=True)
+    return rows[:limit]
+
+
+class LeaderboardSnapshots:
+    """
+    Stale-while-revalidate snapshots of get_leaderboard results.
+
+    A snapshot taken at the current data version is served as is. An outdated one is
+    still served while it is at most max_staleness_ms old, and a single background
+    thread rebuilds it; readers never wait for that rebuild. Older snapshots are
+    rebuilt by the reader before it returns.
+
+    Attributes:
+        max_staleness_ms (int): How long after it was computed a snapshot may still be served.
+        maxsize (int): The number of (sort_by, limit, after) snapshots kept.
+    """
+
+    def __init__(self, max_staleness_ms: int = LEADERBOARD_MAX_STALENESS_MS, maxsize: int = 256):
+        self.max_staleness_ms = max_staleness_ms
+        self.maxsize = maxsize
+
+        # (sort_by, limit, after) -> (data version, monotonic time computed, entries)
+        self._snapshots = LRUCache(maxsize)
+        self._pending: set[tuple] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._stats = {'fresh': 0, 'stale': 0, 'rebuilt': 0, 'refreshes': 0, 'refresh_errors': 0}
+
+    def start(self) -> None:
+        """
+        Starts the background refresher if it is not running yet.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="leaderboard-refresher", daemon=True)
+            self._thread.start()
+
+    def get(self, sort_by: str = "wins", limit: Optional[int] = None,
+            after: Optional[str] = None) -> tuple[int, list[dict[str, Any]]]:
+        """
+        Returns the leaderboard, possibly from a snapshot up to max_staleness_ms old.
+
+        Args:
+            sort_by (str): Either "wins" or "win_pct".
+            limit (int): The maximum number of entries to return.
+            after (str): A cursor from encode_leaderboard_cursor.
+
+        Returns:
+            tuple[int, list[dict[str, Any]]]: The data version the entries were read at, and
+                the entries. The list is shared between readers and must not be modified.
+
+        Raises:
+            ValueError: If the input sort_by, limit or cursor is invalid.
+            sqlite3.Error: For any other database errors.
+        """
+        key = (sort_by, limit, after)
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            version, computed_at, entries = snapshot
+            if version == get_data_version():
+                self._count('fresh')
+                return version, entries
+            if (time.monotonic() - computed_at) * 1000 <= self.max_staleness_ms:
+                self._count('stale')
+                self._schedule(key)
+                return version, entries
+
+        self._count('rebuilt')
+        return self._rebuild(key)
+
+    def _rebuild(self, key: tuple) -> tuple[int, list[dict[str, Any]]]:
+        # Read the version first: a write landing during the query leaves the snapshot outdated
+        version = get_data_version()
+        entries = get_leaderboard(*key)
+        with self._lock:
+            current = self._snapshots.get(key)
+            # A slower rebuild must not replace a newer snapshot
+            if current is None or current[0] <= version:
+                self._snapshots.set(key, (version, time.monotonic(), entries))
+        return version, entries
+
+    def _schedule(self, key: tuple) -> None:
+        self.start()
+        with self._lock:
+            self._pending.add(key)
+        self._wakeup.set()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._lock:
+                pending, self._pending = self._pending, set()
+            for key in pending:
+                try:
+                    self._rebuild(key)
+                    self._count('refreshes')
+                except (ValueError, sqlite3.Error) as e:
+                    self._count('refresh_errors')
+                    logger.error("Failed to refresh leaderboard snapshot %s: %s", key, str(e))
+
+    def stop(self) -> None:
+        """
+        Stops the background refresher.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def get_stats(self) -> dict:
+        """
+        Returns how many reads were fresh, stale or rebuilt, with the refresher counters.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending_refreshes'] = len(self._pending)
+        stats['snapshots'] = self._snapshots.get_stats()['size']
+        stats['max_staleness_ms'] = self.max_staleness_ms
+        return stats
+
+
+_leaderboard_snapshots = LeaderboardSnapshots() if LEADERBOARD_MAX_STALENESS_MS > 0 else None
+if _leaderboard_snapshots is not None:
+    atexit.register(_leaderboard_snapshots.stop)
+
+
+def get_leaderboard_snapshot(sort_by: str = "wins", limit: Optional[int] = None,
+                             after: Optional[str] = None) -> tuple[int, list[dict[str, Any]]]:
+    """
+    Returns the leaderboard together with the data version it reflects.
+
+    With LEADERBOARD_MAX_STALENESS_MS set the result may come from a snapshot up to that
+    old (see LeaderboardSnapshots); otherwise the leaderboard is queried.
+
+    Args:
+        sort_by (str): Either "wins" or "win_pct".
+        limit (int): The maximum number of entries to return.
+        after (str): A cursor from encode_leaderboard_cursor.
+
+    Returns:
+        tuple[int, list[dict[str, Any]]]: The data version and the leaderboard entries.
+
+    Raises:
+        ValueError: If the input sort_by, limit or cursor is invalid.
+        sqlite3.Error: For any other database errors.
+    """
+    if _leaderboard_snapshots is not None:
+        return _leaderboard_snapshots.get(sort_by, limit, after)
+    version = get_data_version()
+    return version, get_leaderboard(sort_by, limit=limit, after=after)
+
+def get_leaderboard_snapshot_stats() -> dict:
+    """
+    Returns the stale-while-revalidate counters, or None when it is disabled.
+    """
+    return _leaderboard_snapshots.get_stats() if _leaderboard_snapshots is not None else None
+
+def iter_meal_batches(include_deleted: bool = False,
+                      batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[list[dict[str, Any]]]:
+    """
+    Streams the meal catalog in id order, one batch at a time.
+
+    Only one batch is held in memory, so the catalog can be exported whatever its size.
+    Batches are read by keyset (the ids after the last one served), each with its own
+    pooled connection that is returned before the batch is yielded, so a slow consumer
+    never keeps a connection, or a read lock, from battles and writes. The export is
+    therefore not a single snapshot: meals changed while it runs may appear either way.
+
+    Args:
+        include_deleted (bool): If True, soft-deleted meals are included.
+        batch_size (int): The number of rows fetched per batch.
+
+    Yields:
+        list[dict[str, Any]]: Up to batch_size meals keyed by MEAL_EXPORT_COLUMNS.
+
+    Raises:
+        sqlite3.Error: For any database errors.
+    """
+    query = f"SELECT {', '.join(MEAL_EXPORT_COLUMNS)} FROM meals WHERE id > ?"
+    if not include_deleted:
+        query += " AND deleted = FALSE"
+    query += " ORDER BY id LIMIT ?"
+
+    last_id, exported = 0, 0
+    while True:
+        try:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (last_id, batch_size))
+                rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error("Database error: %s", str(e))
+            raise e
+
+        if rows:
+            exported += len(rows)
+            last_id = rows[-1][0]
+            yield [
+                {**dict(zip(MEAL_EXPORT_COLUMNS, row)), 'deleted': bool(row[7])}
+                for row in rows
+            ]
+        if len(rows) < batch_size:
+            break
+
+    logger.info("Exported %d meals", exported)
+
+def get_meal_by_id(meal_id: int, version: Optional[tuple] = None) -> Meal:
     """
     Retrieves a meal by its meal ID.
     
     Args:
         meal_id (int): The ID of the meal to retrieve.
+        version (tuple): The data version the caller read beforehand (see get_data_version).
+            If set, meals cached at any other version are read again, so the result is at
+            least as recent as the version even after writes by other processes.
         
     Returns:
         Meal: The Meal object corresponding to the meal_id.
@@ -188,6 +891,14 @@ def get_meal_by_id(meal_id: int) -> Meal:
     Raises:
         ValueError: If the meal corresponding to the meal_id is not found or has already been deleted.
     """
+    meal = _cached_meal(('id', meal_id), version)
+    if meal is not None:
+        return meal
+    return _read_flights.do(('id', _write_generation, version, meal_id), _load_meal_by_id, meal_id, version)
+
+def _load_meal_by_id(meal_id: int, version: Optional[tuple] = None) -> Meal:
+    generation = _meal_cache_generation
+
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
@@ -198,7 +909,9 @@ def get_meal_by_id(meal_id: int) -> Meal:
                 if row[5]:
                     logger.info("Meal with ID %s has been deleted", meal_id)
                     raise ValueError(f"Meal with ID {meal_id} has been deleted")
-                return Meal(id=row[0], meal=row[1], cuisine=row[2], price=row[3], difficulty=row[4])
+                meal = Meal(id=row[0], meal=row[1], cuisine=row[2], price=row[3], difficulty=row[4])
+                _remember_meal(meal, generation, version)
+                return meal
             else:
                 logger.info("Meal with ID %s not found", meal_id)
                 raise ValueError(f"Meal with ID {meal_id} not found")
@@ -208,12 +921,13 @@ def get_meal_by_id(meal_id: int) -> Meal:
         raise e
 
 
-def get_meal_by_name(meal_name: str) -> Meal:
+def get_meal_by_name(meal_name: str, version: Optional[tuple] = None) -> Meal:
     """
     Retrieves a meal by its name.
     
     Args:
         meal_name (str): The name of the meal to retrieve.
+        version (tuple): The data version the caller read beforehand, as for get_meal_by_id.
 
     Raises:
         ValueError: If the meal corresponding to the meal_name is not found or has already been deleted.
@@ -222,6 +936,18 @@ def get_meal_by_name(meal_name: str) -> Meal:
     Returns:
         Meal: The Meal object corresponding to the meal_name.
     """
+    meal = _cached_meal(('name', meal_name), version)
+    if meal is not None:
+        return meal
+    missing = _negative_meal_cache.get(meal_name)
+    if missing is not None and (version is None or missing[0] == version):
+        logger.debug("Meal with name %s not found (cached)", meal_name)
+        raise ValueError(f"Meal with name {meal_name} not found")
+    return _read_flights.do(('name', _write_generation, version, meal_name), _load_meal_by_name, meal_name, version)
+
+def _load_meal_by_name(meal_name: str, version: Optional[tuple] = None) -> Meal:
+    generation = _meal_cache_generation
+
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
@@ -232,8 +958,11 @@ def get_meal_by_name(meal_name: str) -> Meal:
                 if row[5]:
                     logger.info("Meal with name %s has been deleted", meal_name)
                     raise ValueError(f"Meal with name {meal_name} has been deleted")
-                return Meal(id=row[0], meal=row[1], cuisine=row[2], price=row[3], difficulty=row[4])
+                meal = Meal(id=row[0], meal=row[1], cuisine=row[2], price=row[3], difficulty=row[4])
+                _remember_meal(meal, generation, version)
+                return meal
             else:
+                _remember_missing_name(meal_name, generation, version)
                 logger.info("Meal with name %s not found", meal_name)
                 raise ValueError(f"Meal with name {meal_name} not found")
 
@@ -276,7 +1005,260 @@ def update_meal_stats(meal_id: int, result: str) -> None:
                 raise ValueError(f"Invalid result: {result}. Expected 'win' or 'loss'.")
 
             conn.commit()
+            _bump_write_generation()
+
+    except sqlite3.Error as e:
+        logger.error("Database error: %s", str(e))
+        raise e
+
+def record_battle_result(winner_id: int, loser_id: int) -> None:
+    """
+    Records the outcome of a battle for both meals in a single transaction.
+
+    Each meal gets one more battle and the winner one more win. The UPDATEs only
+    match meals that are not deleted, so no row is read beforehand; if either
+    meal is missing the whole battle is rolled back.
+
+    In write-behind mode (STATS_WRITE_BEHIND) the outcome is buffered instead and
+    committed with other battles by the flusher; a meal deleted in the meantime is
+    skipped at flush time rather than raising here.
+
+    Args:
+        winner_id (int): The ID of the meal that won.
+        loser_id (int): The ID of the meal that lost.
+
+    Raises:
+        ValueError: If either meal is not found or has already been deleted.
+        sqlite3.Error: For any other database errors.
+    """
+    if _stats_buffer is not None:
+        _stats_buffer.record(winner_id, loser_id)
+        # get_leaderboard merges buffered deltas, so the new version is already true for it
+        _bump_write_generation(buffered=True)
+        return
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            for meal_id, wins in ((winner_id, 1), (loser_id, 0)):
+                cursor.execute(
+                    "UPDATE meals SET battles = battles + 1, wins = wins + ? WHERE id = ? AND deleted = FALSE",
+                    (wins, meal_id)
+                )
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    _raise_meal_unavailable(cursor, meal_id)
+            conn.commit()
+            _bump_write_generation()
+
+            logger.info("Battle recorded: winner %s, loser %s", winner_id, loser_id)
 
     except sqlite3.Error as e:
         logger.error("Database error: %s", str(e))
         raise e
+
+
+class BattleStatsBuffer:
+    """
+    An in-process write-behind buffer for battle statistics.
+
+    Outcomes are coalesced per meal into battles/wins deltas and written by a
+    background thread in a single transaction, either every flush interval or as
+    soon as the number of buffered battles reaches max_events.
+
+    Attributes:
+        flush_interval_ms (int): How often the background thread flushes.
+        max_events (int): The number of buffered battles that triggers an early flush.
+    """
+
+    def __init__(self, flush_interval_ms: int = STATS_FLUSH_INTERVAL_MS,
+                 max_events: int = STATS_FLUSH_MAX_EVENTS):
+        self.flush_interval_ms = flush_interval_ms
+        self.max_events = max_events
+
+        self._pending: dict[int, list[int]] = {}
+        # Taken by the flush in progress and still visible to readers until it commits
+        self._in_flight: dict[int, list[int]] = {}
+        # Odd while a flush is writing, bumped again once it committed or failed
+        self._generation = 0
+        self._events = 0
+        self._lock = threading.Lock()
+        # Held for the whole write so flushes never overlap
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._stats = {'events': 0, 'flushes': 0, 'rows_written': 0, 'rows_skipped': 0, 'errors': 0}
+
+    def start(self) -> None:
+        """
+        Starts the background flusher if it is not running yet.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="battle-stats-flusher", daemon=True)
+            self._thread.start()
+
+    def record(self, winner_id: int, loser_id: int) -> None:
+        """
+        Buffers the outcome of one battle.
+
+        Args:
+            winner_id (int): The ID of the meal that won.
+            loser_id (int): The ID of the meal that lost.
+        """
+        self.start()
+        with self._lock:
+            for meal_id, wins in ((winner_id, 1), (loser_id, 0)):
+                delta = self._pending.setdefault(meal_id, [0, 0])
+                delta[0] += 1
+                delta[1] += wins
+            self._events += 1
+            self._stats['events'] += 1
+            full = self._events >= self.max_events
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """
+        Writes every buffered delta in one transaction.
+
+        Returns:
+            int: The number of meals whose statistics were updated.
+
+        Raises:
+            sqlite3.Error: If the write fails; the deltas are kept for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._events = 0
+                if not pending:
+                    return 0
+                self._in_flight = pending
+                self._generation += 1
+
+            rows = [(battles, wins, meal_id) for meal_id, (battles, wins) in pending.items()]
+            try:
+                with get_db_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.executemany(
+                        "UPDATE meals SET battles = battles + ?, wins = wins + ? WHERE id = ? AND deleted = FALSE",
+                        rows
+                    )
+                    written = cursor.rowcount
+                    conn.commit()
+            except sqlite3.Error:
+                self._restore(pending)
+                with self._lock:
+                    self._stats['errors'] += 1
+                raise
+
+            skipped = len(rows) - written
+            if skipped:
+                logger.warning("Skipped buffered stats for %d deleted or missing meals", skipped)
+            with self._lock:
+                self._in_flight = {}
+                self._generation += 1
+                self._stats['flushes'] += 1
+                self._stats['rows_written'] += written
+                self._stats['rows_skipped'] += skipped
+            logger.info("Flushed buffered battle stats for %d meals", written)
+            return written
+
+    def _restore(self, pending: dict[int, list[int]]) -> None:
+        with self._lock:
+            self._in_flight = {}
+            self._generation += 1
+            for meal_id, (battles, wins) in pending.items():
+                delta = self._pending.setdefault(meal_id, [0, 0])
+                delta[0] += battles
+                delta[1] += wins
+
+    def discard(self) -> int:
+        """
+        Throws away every buffered delta without writing it; call it under paused().
+
+        Returns:
+            int: The number of meals whose deltas were dropped.
+        """
+        with self._lock:
+            dropped = len(self._pending) + len(self._in_flight)
+            self._pending, self._in_flight = {}, {}
+            self._events = 0
+            # No flush is writing under paused(), so stay even; readers still see it move
+            self._generation += 2
+        if dropped:
+            logger.info("Discarded buffered battle stats for %d meals", dropped)
+        return dropped
+
+    def get_pending_deltas(self) -> tuple[int, dict[int, tuple[int, int]]]:
+        """
+        Returns the deltas not committed yet, including those of a flush in progress.
+
+        Returns:
+            tuple[int, dict[int, tuple[int, int]]]: The flush generation, odd while a flush
+                is writing, and the (battles, wins) delta of every buffered meal.
+        """
+        with self._lock:
+            deltas = {meal_id: tuple(delta) for meal_id, delta in self._in_flight.items()}
+            for meal_id, (battles, wins) in self._pending.items():
+                in_flight = deltas.get(meal_id, (0, 0))
+                deltas[meal_id] = (in_flight[0] + battles, in_flight[1] + wins)
+            return self._generation, deltas
+
+    def get_flush_generation(self) -> int:
+        """
+        Returns the flush generation, which moves whenever a flush starts or ends.
+        """
+        with self._lock:
+            return self._generation
+
+    @contextmanager
+    def paused(self):
+        """
+        Holds off flushes, waiting for the one in progress to end first.
+        """
+        with self._flush_lock:
+            yield
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval_ms / 1000)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error("Failed to flush buffered battle stats: %s", str(e))
+
+    def stop(self) -> None:
+        """
+        Stops the background flusher and writes whatever is still buffered.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def get_stats(self) -> dict:
+        """
+        Returns the buffer counters along with the number of meals waiting to be written.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending_meals'] = len(self._pending)
+        return stats
+
+
+_stats_buffer = BattleStatsBuffer() if STATS_WRITE_BEHIND else None
+if _stats_buffer is not None:
+    atexit.register(_stats_buffer.stop)
+
+
+def get_stats_buffer_stats() -> dict:
+    """
+    Returns the write-behind buffer counters, or None when write-behind is disabled.
+    """
+    return _stats_buffer.get_stats() if _stats_buffer is not None else None
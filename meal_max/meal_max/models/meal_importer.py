@@ -0,0 +1,238 @@
+import argparse
+import csv
+from itertools import islice
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from typing import Any, Iterator, Optional, TextIO
+
+from meal_max.meal_max.models.kitchen_model import create_meals
+from meal_max.meal_max.utils.logger import configure_logger
+from meal_max.meal_max.utils.sql_utils import get_db_connection
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+# rows written per transaction, and per progress checkpoint
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+
+
+class InvalidRecord:
+    """
+    A line of the input that could not be parsed into a meal.
+
+    Attributes:
+        error (str): Why the line was rejected.
+    """
+
+    def __init__(self, error: str):
+        self.error = error
+
+
+def detect_format(filename: str) -> str:
+    """
+    Guesses the input format from a file name.
+
+    Args:
+        filename (str): The name of the file being imported.
+
+    Returns:
+        str: 'csv' for .csv files, 'ndjson' otherwise.
+    """
+    return 'csv' if filename.lower().endswith('.csv') else 'ndjson'
+
+def iter_meal_records(fh: TextIO, fmt: str) -> Iterator[Any]:
+    """
+    Parses meals from a text stream one line at a time.
+
+    Args:
+        fh (TextIO): The NDJSON or CSV input. CSV input needs a header row.
+        fmt (str): Either 'ndjson' or 'csv'.
+
+    Yields:
+        dict[str, Any] | InvalidRecord: One item per meal in the input, in order.
+
+    Raises:
+        ValueError: If the format is not supported.
+    """
+    if fmt == 'ndjson':
+        for line in fh:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield InvalidRecord(f"Invalid JSON: {e}")
+    elif fmt == 'csv':
+        for row in csv.DictReader(fh):
+            # CSV has no numbers, so convert the price the way the JSON routes receive it
+            try:
+                row['price'] = float(row['price'])
+            except (KeyError, TypeError, ValueError):
+                pass
+            yield row
+    else:
+        raise ValueError(f"Invalid import format: {fmt}. Must be one of {IMPORT_FORMATS}.")
+
+def _read_progress(progress_key: str) -> Optional[dict[str, Any]]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT source, rows FROM import_progress WHERE progress_key = ?", (progress_key,))
+        row = cursor.fetchone()
+    return {'source': row[0], 'rows': row[1]} if row else None
+
+def _write_progress(cursor: sqlite3.Cursor, progress_key: str, source: Optional[str], rows: int) -> None:
+    cursor.execute("""
+        INSERT INTO import_progress (progress_key, source, rows) VALUES (?, ?, ?)
+        ON CONFLICT(progress_key) DO UPDATE SET source = excluded.source, rows = excluded.rows
+    """, (progress_key, source, rows))
+
+def clear_progress(progress_key: str) -> None:
+    """
+    Drops the checkpoint kept under progress_key, so the next import starts from the top.
+
+    Args:
+        progress_key (str): The name the import was checkpointed under.
+    """
+    with get_db_connection() as conn:
+        conn.cursor().execute("DELETE FROM import_progress WHERE progress_key = ?", (progress_key,))
+        conn.commit()
+
+def import_meals(fh: TextIO, fmt: str, chunk_size: int = IMPORT_CHUNK_SIZE, upsert: bool = False,
+                 progress_key: Optional[str] = None, source: Optional[str] = None,
+                 skip_rows: int = 0) -> dict[str, Any]:
+    """
+    Imports meals from an NDJSON or CSV stream in fixed-size transactions.
+
+    Rows are validated with the same rules as create_meal (see kitchen_model.create_meals).
+    The number of rows consumed is checkpointed in the import_progress table, in the same
+    transaction as each chunk, so an interrupted import picks up exactly after the last
+    committed chunk.
+
+    Args:
+        fh (TextIO): The input stream.
+        fmt (str): Either 'ndjson' or 'csv'.
+        chunk_size (int): The number of rows written per transaction.
+        upsert (bool): If True, existing meals are overwritten instead of rejected.
+        progress_key (str): The name to checkpoint progress under. If a checkpoint for the
+            same source is already kept under it, the rows it covers are skipped.
+        source (str): Identifies the input in the checkpoint, e.g. its path.
+        skip_rows (int): The number of leading rows to skip, for resuming without a checkpoint.
+
+    Returns:
+        dict[str, Any]: 'rows' consumed (including skipped ones), 'created', 'updated',
+            'errors' ({'index', 'meal', 'error'} with absolute row indexes), 'skipped',
+            'seconds' and 'rows_per_second'.
+
+    Raises:
+        ValueError: If the checkpoint belongs to another source or the format is invalid.
+        sqlite3.Error: For database errors; committed chunks are kept and checkpointed.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"Invalid chunk size: {chunk_size}. Must be at least 1.")
+
+    report = {'rows': 0, 'created': 0, 'updated': 0, 'errors': [], 'skipped': skip_rows}
+    if progress_key:
+        progress = _read_progress(progress_key)
+        if progress:
+            if progress['source'] != source:
+                raise ValueError(f"Progress {progress_key} belongs to {progress['source']}, not {source}")
+            report['skipped'] = max(skip_rows, progress['rows'])
+            logger.info("Resuming import of %s after row %d", source, report['skipped'])
+
+    records = iter_meal_records(fh, fmt)
+    # Skipped rows are still parsed; only the database work is saved
+    for _ in islice(records, report['skipped']):
+        pass
+    report['rows'] = report['skipped']
+
+    started = time.monotonic()
+    imported = 0
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        offset = report['rows']
+
+        meals, positions = [], []
+        for position, record in enumerate(chunk):
+            if isinstance(record, InvalidRecord):
+                report['errors'].append({'index': offset + position, 'meal': None, 'error': record.error})
+            else:
+                meals.append(record)
+                positions.append(offset + position)
+
+        rows = offset + len(chunk)
+        checkpointed = []
+
+        def checkpoint(cursor: sqlite3.Cursor) -> None:
+            _write_progress(cursor, progress_key, source, rows)
+            checkpointed.append(True)
+
+        result = create_meals(meals, upsert=upsert, chunk_size=max(len(meals), 1),
+                              before_commit=checkpoint if progress_key else None)
+        report['created'] += result['created']
+        report['updated'] += result['updated']
+        for error in result['errors']:
+            report['errors'].append({**error, 'index': positions[error['index']]})
+
+        if progress_key and not checkpointed:
+            # The chunk wrote no meal, so replaying it would change nothing
+            with get_db_connection() as conn:
+                _write_progress(conn.cursor(), progress_key, source, rows)
+                conn.commit()
+
+        report['rows'] = rows
+        imported += len(chunk)
+
+        elapsed = time.monotonic() - started
+        logger.info("Imported %d rows (%.0f rows/s)", report['rows'], imported / elapsed if elapsed else 0.0)
+
+    report['seconds'] = round(time.monotonic() - started, 3)
+    report['rows_per_second'] = round(imported / report['seconds'], 1) if report['seconds'] else None
+    logger.info("Import finished: %d rows, %d created, %d updated, %d rejected in %.3fs",
+                report['rows'], report['created'], report['updated'], len(report['errors']), report['seconds'])
+    return report
+
+def main(argv: list[str] = None) -> int:
+    """
+    Command line entry point: python -m meal_max.meal_max.models.meal_importer FILE
+    """
+    parser = argparse.ArgumentParser(description="Bulk import meals from an NDJSON or CSV file.")
+    parser.add_argument("path", help="the file to import")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="rows per transaction")
+    parser.add_argument("--upsert", action="store_true", help="overwrite meals that already exist")
+    parser.add_argument("--progress", help="checkpoint name, defaults to the absolute PATH")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    source = os.path.abspath(args.path)
+    progress_key = args.progress or source
+    if args.restart:
+        clear_progress(progress_key)
+
+    with open(args.path, "r", newline="", encoding="utf-8") as fh:
+        report = import_meals(fh, args.format or detect_format(args.path), chunk_size=args.chunk_size,
+                              upsert=args.upsert, progress_key=progress_key, source=source)
+
+    for error in report['errors']:
+        print(f"row {error['index']}: {error['error']}", file=sys.stderr)
+    print(f"{report['rows']} rows ({report['skipped']} skipped): {report['created']} created, "
+          f"{report['updated']} updated, {len(report['errors'])} rejected "
+          f"in {report['seconds']}s ({report['rows_per_second']} rows/s)")
+
+    # The import completed, so a rerun should start from the top
+    clear_progress(progress_key)
+    return 1 if report['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
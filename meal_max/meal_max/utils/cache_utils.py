@@ -0,0 +1,189 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded least-recently-used cache with an optional time to live.
+
+    A maxsize of 0 disables the cache: nothing is stored and every lookup misses.
+
+    Attributes:
+        maxsize (int): The maximum number of entries kept.
+        ttl (float): How long, in seconds, an entry stays valid. 0 means forever.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int, ttl: float = 0):
+        if maxsize < 0:
+            raise ValueError(f"Invalid cache size: {maxsize}. Must not be negative.")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the value cached under key and marks it as most recently used.
+
+        Args:
+            key (Hashable): The cache key.
+            default (Any): What to return on a miss.
+
+        Returns:
+            Any: The cached value, or default if it is absent or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key, self._MISSING)
+            if entry is self._MISSING:
+                self._stats['misses'] += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Caches value under key, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key (Hashable): The cache key.
+            value (Any): The value to cache.
+        """
+        if self.maxsize == 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def discard(self, key: Hashable) -> None:
+        """
+        Removes the entry cached under key, if any.
+        """
+        with self._lock:
+            if self._entries.pop(key, self._MISSING) is not self._MISSING:
+                self._stats['invalidations'] += 1
+
+    def discard_where(self, predicate: Callable[[Any], bool]) -> None:
+        """
+        Removes every entry whose value satisfies predicate.
+
+        Args:
+            predicate (Callable[[Any], bool]): Called with each cached value.
+        """
+        with self._lock:
+            stale = [key for key, (value, _) in self._entries.items() if predicate(value)]
+            for key in stale:
+                del self._entries[key]
+            self._stats['invalidations'] += len(stale)
+
+    def clear(self) -> None:
+        """
+        Removes every entry.
+        """
+        with self._lock:
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """
+        Returns the hit, miss, eviction, expiration and invalidation counters with the current size.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats['maxsize'] = self.maxsize
+        return stats
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it runs wait
+    for it and receive the same result, or the same exception. Nothing is kept once
+    the call returns, so this is not a cache.
+    """
+
+    def __init__(self):
+        self._flights: dict = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'executions': 0, 'collapsed': 0}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Runs fn(*args), unless a call with the same key is already running, and returns its result.
+
+        Args:
+            key (Hashable): Identifies calls that are interchangeable.
+            fn (Callable[..., Any]): The function to run.
+            *args (Any): Its arguments.
+
+        Returns:
+            Any: What fn returned, for this call or for the one it joined.
+
+        Raises:
+            Exception: Whatever fn raised, for this call or for the one it joined.
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats['executions'] += 1
+            else:
+                self._stats['collapsed'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn(*args)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def get_stats(self) -> dict:
+        """
+        Returns the number of calls, of executions and of calls collapsed into another one.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._flights)
+        return stats
@@ -0,0 +1,266 @@
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from meal_max.meal_max.utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+# port the stub listens on; set RANDOM_ORG_BASE_URL=http://127.0.0.1:<port> to use it
+RANDOM_ORG_STUB_PORT = int(os.getenv("RANDOM_ORG_STUB_PORT", "8090"))
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal', 'exponential')
+
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """
+    Parses a latency distribution into a function drawing delays in milliseconds.
+
+    Args:
+        spec (str): One of 'fixed:MS', 'uniform:LOW:HIGH', 'normal:MEAN:STDDEV',
+            'lognormal:MEDIAN:SIGMA' or 'exponential:MEAN', all in milliseconds except SIGMA.
+        rng (random.Random): Where the draws come from.
+
+    Returns:
+        Callable[[], float]: Returns one delay per call, never negative.
+
+    Raises:
+        ValueError: If the distribution is unknown or its parameters are invalid.
+    """
+    name, _, params = spec.partition(':')
+    try:
+        args = [float(param) for param in params.split(':')] if params else []
+    except ValueError:
+        raise ValueError(f"Invalid latency parameters: {spec}")
+
+    arity = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exponential': 1}
+    if name not in arity:
+        raise ValueError(f"Invalid latency distribution: {name}. Must be one of {LATENCY_DISTRIBUTIONS}.")
+    if len(args) != arity[name] or any(arg < 0 for arg in args):
+        raise ValueError(f"Invalid latency parameters: {spec}")
+
+    if name == 'fixed':
+        return lambda: args[0]
+    if name == 'uniform':
+        return lambda: rng.uniform(args[0], args[1])
+    if name == 'normal':
+        return lambda: max(rng.gauss(args[0], args[1]), 0.0)
+    if name == 'lognormal':
+        if args[0] == 0:
+            raise ValueError(f"Invalid latency parameters: {spec}")
+        return lambda: rng.lognormvariate(math.log(args[0]), args[1])
+    return lambda: rng.expovariate(1 / args[0]) if args[0] else 0.0
+
+
+class RandomOrgStub:
+    """
+    The behaviour of a random.org stand-in: what it answers, how slowly and how often it fails.
+
+    Every request first sleeps for a delay drawn from the latency distribution. Then, with
+    the given probabilities, it hangs without answering (to trip client read timeouts) or
+    answers with an error status; otherwise it answers like random.org. Decimal fractions
+    are charged against a bit quota the way random.org does, and a request made once the
+    quota is exhausted is refused with a 503.
+
+    Attributes:
+        latency (str): The latency distribution, see parse_latency.
+        error_rate (float): The share of requests answered with error_status.
+        error_status (int): The HTTP status of injected errors.
+        timeout_rate (float): The share of requests left hanging for hang_ms.
+        hang_ms (float): How long a hanging request waits before the connection is dropped.
+        quota (int): The bits left in the quota.
+    """
+
+    def __init__(self, latency: str = 'fixed:0', error_rate: float = 0.0, error_status: int = 503,
+                 timeout_rate: float = 0.0, hang_ms: float = 30000, quota: int = 1000000,
+                 seed: Optional[int] = None):
+        for name, rate in (('error', error_rate), ('timeout', timeout_rate)):
+            if not 0 <= rate <= 1:
+                raise ValueError(f"Invalid {name} rate: {rate}. Must be between 0 and 1.")
+
+        self._rng = random.Random(seed)
+        self._draw_latency = parse_latency(latency, self._rng)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.timeout_rate = timeout_rate
+        self.hang_ms = hang_ms
+        self.quota = quota
+
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'errors': 0, 'timeouts': 0, 'numbers': 0, 'latency_ms': 0.0}
+
+    def decide(self) -> tuple[float, str]:
+        """
+        Draws how the next request is handled.
+
+        Returns:
+            tuple[float, str]: The delay in milliseconds and 'ok', 'error' or 'timeout'.
+        """
+        with self._lock:
+            delay_ms = self._draw_latency()
+            roll = self._rng.random()
+            outcome = 'timeout' if roll < self.timeout_rate else \
+                'error' if roll < self.timeout_rate + self.error_rate else 'ok'
+            self._stats['requests'] += 1
+            self._stats['latency_ms'] += delay_ms
+            if outcome != 'ok':
+                self._stats[outcome + 's'] += 1
+        return delay_ms, outcome
+
+    def decimal_fractions(self, query: dict[str, list[str]]) -> tuple[int, str]:
+        """
+        Answers a decimal-fractions request, in plain text only.
+
+        Args:
+            query (dict[str, list[str]]): The parsed query string; num, dec, col and format are used.
+
+        Returns:
+            tuple[int, str]: The HTTP status and the response body.
+        """
+        try:
+            num = int(query.get('num', [''])[0])
+            dec = int(query.get('dec', [''])[0])
+            col = int(query.get('col', ['1'])[0])
+        except ValueError:
+            return 400, "Error: The num, dec and col parameters must be integers\n"
+        if query.get('format', [''])[0] != 'plain':
+            return 400, "Error: Only format=plain is supported by this stub\n"
+        if not (1 <= num <= 10000 and 1 <= dec <= 20 and 1 <= col <= 1000000000):
+            return 400, "Error: The num, dec or col parameter is out of range\n"
+
+        with self._lock:
+            if self.quota < 0:
+                return 503, "Error: You have used your quota of random bits for today\n"
+            self.quota -= num * math.ceil(dec * math.log2(10))
+            numbers = [self._rng.randrange(10 ** dec) for _ in range(num)]
+            self._stats['numbers'] += num
+
+        values = [f"0.{number:0{dec}d}" for number in numbers]
+        rows = ["\t".join(values[i:i + col]) for i in range(0, num, col)]
+        return 200, "\n".join(rows) + "\n"
+
+    def get_quota(self) -> tuple[int, str]:
+        """
+        Answers a quota request with the bits left.
+        """
+        with self._lock:
+            return 200, f"{self.quota}\n"
+
+    def get_stats(self) -> dict:
+        """
+        Returns the number of requests, of injected errors and timeouts, of numbers served
+        and the mean injected latency.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['quota'] = self.quota
+        stats['mean_latency_ms'] = round(stats.pop('latency_ms') / stats['requests'], 1) if stats['requests'] else None
+        return stats
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like random.org, so connection reuse behaves as in production
+    protocol_version = "HTTP/1.1"
+
+    stub: RandomOrgStub
+
+    def do_GET(self):
+        delay_ms, outcome = self.stub.decide()
+        time.sleep(delay_ms / 1000)
+
+        if outcome == 'timeout':
+            time.sleep(self.stub.hang_ms / 1000)
+            self.close_connection = True
+            return
+
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if outcome == 'error':
+            status, body = self.stub.error_status, "Error: Injected failure\n"
+        elif url.path.rstrip('/') == '/decimal-fractions':
+            status, body = self.stub.decimal_fractions(query)
+        elif url.path.rstrip('/') == '/quota':
+            status, body = self.stub.get_quota()
+        else:
+            status, body = 404, "Error: Not found\n"
+
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def create_server(stub: RandomOrgStub, host: str = "127.0.0.1", port: int = RANDOM_ORG_STUB_PORT) -> ThreadingHTTPServer:
+    """
+    Creates an HTTP server answering random.org requests on behalf of stub.
+
+    Args:
+        stub (RandomOrgStub): How requests are answered.
+        host (str): The address to bind.
+        port (int): The port to bind; 0 picks a free one.
+
+    Returns:
+        ThreadingHTTPServer: The server, not yet serving; call serve_forever on it.
+    """
+    handler = type('StubHandler', (_StubHandler,), {'stub': stub})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main(argv: list[str] = None) -> int:
+    """
+    Command line entry point: python -m meal_max.meal_max.utils.random_org_stub
+    """
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the random.org plain text API.")
+    parser.add_argument("--host", default="127.0.0.1", help="the address to bind")
+    parser.add_argument("--port", type=int, default=RANDOM_ORG_STUB_PORT, help="the port to bind")
+    parser.add_argument("--latency", default="fixed:0",
+                        help="latency distribution in ms, e.g. fixed:20, uniform:10:50, normal:40:10, "
+                             "lognormal:40:0.8 or exponential:40")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected errors")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of requests left hanging")
+    parser.add_argument("--hang-ms", type=float, default=30000, help="how long a hanging request waits")
+    parser.add_argument("--quota", type=int, default=1000000, help="bits in the quota")
+    parser.add_argument("--seed", type=int, help="seed for numbers, latencies and failures")
+    args = parser.parse_args(argv)
+
+    try:
+        stub = RandomOrgStub(latency=args.latency, error_rate=args.error_rate, error_status=args.error_status,
+                             timeout_rate=args.timeout_rate, hang_ms=args.hang_ms, quota=args.quota,
+                             seed=args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = create_server(stub, args.host, args.port)
+    logger.info("Serving random.org stub on http://%s:%d (latency %s, error rate %s, timeout rate %s)",
+                args.host, server.server_port, args.latency, args.error_rate, args.timeout_rate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info("random.org stub stopped: %s", stub.get_stats())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
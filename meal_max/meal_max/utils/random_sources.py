@@ -0,0 +1,878 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import fcntl
+import logging
+import math
+import mmap
+import os
+import random
+import secrets
+import struct
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+from meal_max.meal_max.utils.logger import configure_logger
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """
+    Returns the nearest-rank percentile of a non-empty list of values.
+
+    Args:
+        values (list[float]): The sample.
+        pct (float): The percentile, from 0 to 100.
+
+    Returns:
+        float: The smallest value that at least pct percent of the sample is less than or equal to.
+    """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+class RandomSource(ABC):
+    """
+    Something that produces random decimal numbers between 0 and 1 with two decimals,
+    the distribution random.org's decimal-fractions API returns.
+
+    Attributes:
+        name (str): The name the source is configured by.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def fetch(self, num: int) -> list[float]:
+        """
+        Produces num random numbers.
+
+        Args:
+            num (int): How many numbers to produce.
+
+        Raises:
+            ValueError: If the source returned invalid data.
+            RuntimeError: If the source is unavailable.
+
+        Returns:
+            list[float]: The random numbers.
+        """
+
+    def get_stats(self) -> dict:
+        """
+        Returns the source counters.
+        """
+        return {'source': self.name}
+
+
+class RandomOrgSource(RandomSource):
+    """
+    Numbers fetched from random.org.
+    """
+
+    name = "random_org"
+
+    def __init__(self, fetch: Callable[[int], list[float]]):
+        self._fetch = fetch
+
+    def fetch(self, num: int) -> list[float]:
+        return self._fetch(num)
+
+
+class SystemRandomSource(RandomSource):
+    """
+    Numbers drawn from the operating system's CSPRNG.
+    """
+
+    name = "system"
+
+    def fetch(self, num: int) -> list[float]:
+        return [secrets.randbelow(100) / 100 for _ in range(num)]
+
+
+class SeededRandomSource(RandomSource):
+    """
+    Numbers drawn from a seeded PRNG, so the same seed always yields the same sequence.
+
+    Attributes:
+        seed (int): The seed of the generator.
+    """
+
+    name = "seeded"
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def fetch(self, num: int) -> list[float]:
+        with self._lock:
+            return [self._random.randrange(100) / 100 for _ in range(num)]
+
+
+class ReplaySource(RandomSource):
+    """
+    Numbers read back from a file, in order, so runs that consume them are reproducible.
+
+    The file holds one number per line, the format random.org returns and
+    RecordingSource writes.
+
+    Attributes:
+        path (str): The file the numbers were read from.
+        loop (bool): If True, start over once every number was served instead of failing.
+    """
+
+    name = "replay"
+
+    def __init__(self, path: str, loop: bool = False):
+        self.path = path
+        self.loop = loop
+
+        self._numbers = []
+        with open(path, "r") as fh:
+            for line_number, line in enumerate(fh, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    self._numbers.append(float(line))
+                except ValueError:
+                    raise ValueError(f"Invalid random number on line {line_number} of {path}: {line.strip()}")
+        if not self._numbers:
+            raise ValueError(f"Replay file {path} holds no random numbers")
+        self._position = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, num: int) -> list[float]:
+        with self._lock:
+            if not self.loop and self._position + num > len(self._numbers):
+                raise RuntimeError(f"Replay file {self.path} exhausted after {self._position} numbers")
+            numbers = [self._numbers[(self._position + i) % len(self._numbers)] for i in range(num)]
+            self._position += num
+            return numbers
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {'source': self.name, 'position': self._position, 'length': len(self._numbers)}
+
+
+class RecordingSource(RandomSource):
+    """
+    Passes another source's numbers through while appending them to a file ReplaySource can read.
+
+    Attributes:
+        source (RandomSource): The source being recorded.
+        path (str): The file the numbers are appended to.
+    """
+
+    def __init__(self, source: RandomSource, path: str):
+        self.source = source
+        self.path = path
+        self.name = source.name
+
+        self._fh = open(path, "a")
+        self._lock = threading.Lock()
+        self._recorded = 0
+
+    def fetch(self, num: int) -> list[float]:
+        numbers = self.source.fetch(num)
+        with self._lock:
+            self._fh.write("".join(f"{number}\n" for number in numbers))
+            self._fh.flush()
+            self._recorded += len(numbers)
+        return numbers
+
+    def close(self) -> None:
+        """
+        Closes the recording file.
+        """
+        with self._lock:
+            self._fh.close()
+
+    def get_stats(self) -> dict:
+        stats = self.source.get_stats()
+        with self._lock:
+            stats['recorded'] = self._recorded
+        stats['record_path'] = self.path
+        return stats
+
+
+class CircuitBreakerSource(RandomSource):
+    """
+    Serves numbers from a primary source, switching to a fallback when the primary misbehaves.
+
+    The breaker opens after failure_threshold consecutive failures, or once the p95
+    latency of the last latency_window single-number primary calls exceeds
+    latency_budget_ms. Bulk calls, such as pool and reservoir refills, are only judged by
+    their failures: they take longer by nature, and a quota-paced source may answer them
+    instantly with fewer numbers. A call that fails is answered by the fallback, so
+    callers only see errors if both fail. While open, every call goes to the fallback,
+    except one probe of the primary every probe_interval_ms; a successful probe, within
+    the budget if it asked for a single number, closes the breaker again.
+
+    Attributes:
+        primary (RandomSource): The preferred source.
+        fallback (RandomSource): The source used while the breaker is open.
+        failure_threshold (int): Consecutive failures that open the breaker.
+        latency_budget_ms (float): The p95 latency above which the breaker opens; 0 disables it.
+        latency_window (int): The number of recent single-number primary calls the p95 is computed over.
+        probe_interval_ms (int): How often the primary is probed while the breaker is open.
+    """
+
+    name = "circuit_breaker"
+
+    def __init__(self, primary: RandomSource, fallback: RandomSource, failure_threshold: int = 3,
+                 latency_budget_ms: float = 1000, latency_window: int = 20, probe_interval_ms: int = 10000):
+        self.primary = primary
+        self.fallback = fallback
+        self.failure_threshold = failure_threshold
+        self.latency_budget_ms = latency_budget_ms
+        self.latency_window = latency_window
+        self.probe_interval_ms = probe_interval_ms
+
+        self._latencies: deque = deque(maxlen=latency_window)
+        self._consecutive_failures = 0
+        self._open = False
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._stats = {'primary_calls': 0, 'primary_failures': 0, 'fallback_calls': 0,
+                       'trips': 0, 'probes': 0, 'recoveries': 0}
+
+    def fetch(self, num: int) -> list[float]:
+        with self._lock:
+            probe = False
+            if self._open:
+                probe = not self._probing and \
+                    (time.monotonic() - self._opened_at) * 1000 >= self.probe_interval_ms
+                if probe:
+                    self._probing = True
+                    self._stats['probes'] += 1
+            use_primary = not self._open or probe
+
+        if use_primary:
+            started = time.monotonic()
+            try:
+                numbers = self.primary.fetch(num)
+            except (ValueError, RuntimeError) as e:
+                self._record_failure(probe, e)
+            else:
+                elapsed_ms = (time.monotonic() - started) * 1000
+                self._record_success(probe, elapsed_ms if num == 1 and numbers else None)
+                return numbers
+
+        with self._lock:
+            self._stats['fallback_calls'] += 1
+        return self.fallback.fetch(num)
+
+    def _record_failure(self, probe: bool, error: Exception) -> None:
+        with self._lock:
+            self._stats['primary_calls'] += 1
+            self._stats['primary_failures'] += 1
+            self._consecutive_failures += 1
+            if probe:
+                self._probing = False
+                self._opened_at = time.monotonic()
+                logger.warning("Probe of %s failed, keeping %s: %s", self.primary.name, self.fallback.name, error)
+            elif not self._open and self._consecutive_failures >= self.failure_threshold:
+                self._trip("%d consecutive failures, last: %s" % (self._consecutive_failures, error))
+
+    def _record_success(self, probe: bool, elapsed_ms: Optional[float]) -> None:
+        # elapsed_ms is None for calls whose latency is not judged
+        with self._lock:
+            self._stats['primary_calls'] += 1
+            self._consecutive_failures = 0
+            if probe:
+                self._probing = False
+                if self.latency_budget_ms and elapsed_ms is not None and elapsed_ms > self.latency_budget_ms:
+                    self._opened_at = time.monotonic()
+                    logger.warning("Probe of %s took %.0f ms, over the %.0f ms budget",
+                                   self.primary.name, elapsed_ms, self.latency_budget_ms)
+                    return
+                self._open = False
+                self._latencies.clear()
+                self._stats['recoveries'] += 1
+                logger.info("Random source %s recovered; closing the circuit breaker", self.primary.name)
+                return
+            if elapsed_ms is None:
+                return
+            self._latencies.append(elapsed_ms)
+            p95 = self._p95()
+            if not self._open and self.latency_budget_ms and p95 is not None and p95 > self.latency_budget_ms:
+                self._trip("p95 latency %.0f ms over the %.0f ms budget" % (p95, self.latency_budget_ms))
+
+    def _p95(self) -> Optional[float]:
+        # Only judge latency over a full window, so one slow call cannot trip the breaker
+        if len(self._latencies) < self.latency_window:
+            return None
+        return percentile(self._latencies, 95)
+
+    def _trip(self, reason: str) -> None:
+        self._open = True
+        self._opened_at = time.monotonic()
+        self._stats['trips'] += 1
+        logger.error("Opening the circuit breaker, switching from %s to %s: %s",
+                     self.primary.name, self.fallback.name, reason)
+
+    def get_stats(self) -> dict:
+        """
+        Returns the breaker state, the recent primary p95 latency and the call, trip and probe counters.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = 'open' if self._open else 'closed'
+            stats['consecutive_failures'] = self._consecutive_failures
+            p95 = self._p95()
+        stats['p95_ms'] = round(p95, 1) if p95 is not None else None
+        stats['source'] = self.primary.name
+        stats['fallback'] = self.fallback.name
+        return stats
+
+
+class HedgedSource(RandomSource):
+    """
+    Sends a second, hedge request when the first one is slower than usual and uses
+    whichever answers first.
+
+    Only requests of at most max_hedged_num numbers are hedged: bulk refills are not
+    latency sensitive, and hedging them would double their quota cost. Latencies are
+    tracked per request size, and the hedge delay is the given percentile of the recent
+    latencies for that size, never less than min_delay_ms; until min_samples latencies
+    are known, initial_delay_ms is used. The losing request is cancelled if it has not
+    started yet; one already in flight cannot be aborted, so it runs to completion in
+    the background and its numbers are discarded.
+
+    Attributes:
+        source (RandomSource): The source whose requests are hedged.
+        latency_percentile (float): The latency percentile after which a hedge is sent.
+        min_delay_ms (float): The shortest hedge delay.
+        initial_delay_ms (float): The hedge delay until enough latencies are known.
+        window (int): The number of recent latencies the percentile is computed over.
+        min_samples (int): The number of latencies needed before the percentile is used.
+        max_hedged_num (int): The largest request that is hedged.
+        on_hedge (Callable[[int], None]): Called with the size of every hedge sent, so a
+            quota-limited caller can charge the duplicate (see QuotaAwareSource.charge).
+    """
+
+    name = "hedged"
+
+    def __init__(self, source: RandomSource, latency_percentile: float = 95, min_delay_ms: float = 50,
+                 initial_delay_ms: float = 500, window: int = 100, min_samples: int = 10,
+                 max_hedged_num: int = 1, max_workers: int = 8,
+                 on_hedge: Optional[Callable[[int], None]] = None):
+        self.source = source
+        self.latency_percentile = latency_percentile
+        self.min_delay_ms = min_delay_ms
+        self.initial_delay_ms = initial_delay_ms
+        self.window = window
+        self.min_samples = min_samples
+        self.max_hedged_num = max_hedged_num
+        self.on_hedge = on_hedge
+        self.name = source.name
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="random-hedge")
+        self._latencies: dict[int, deque] = {}
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'unhedged': 0, 'hedges_fired': 0, 'hedge_wins': 0, 'losers_cancelled': 0}
+
+    def _window(self, num: int) -> deque:
+        # Callers hold self._lock
+        if num not in self._latencies:
+            self._latencies[num] = deque(maxlen=self.window)
+        return self._latencies[num]
+
+    def get_delay_ms(self, num: int = 1) -> float:
+        """
+        Returns how long a request for num numbers may take before a hedge is sent.
+        """
+        with self._lock:
+            latencies = self._window(num)
+            if len(latencies) < self.min_samples:
+                return max(self.initial_delay_ms, self.min_delay_ms)
+            return max(percentile(latencies, self.latency_percentile), self.min_delay_ms)
+
+    def fetch(self, num: int) -> list[float]:
+        if num > self.max_hedged_num:
+            with self._lock:
+                self._stats['unhedged'] += 1
+            return self.source.fetch(num)
+
+        delay_ms = self.get_delay_ms(num)
+        with self._lock:
+            self._stats['requests'] += 1
+
+        first = self._submit(num)
+        done, _ = wait([first], timeout=delay_ms / 1000)
+        if done:
+            return first.result()
+
+        hedge = self._submit(num)
+        with self._lock:
+            self._stats['hedges_fired'] += 1
+        if self.on_hedge is not None:
+            self.on_hedge(num)
+
+        pending = {first, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                self._settle(hedge_won=future is hedge, loser=first if future is hedge else hedge)
+                return future.result()
+        # Both requests failed
+        raise error
+
+    def _submit(self, num: int) -> Future:
+        started = time.monotonic()
+        future = self._executor.submit(self.source.fetch, num)
+        future.add_done_callback(lambda f: self._record_latency(f, num, started))
+        return future
+
+    def _record_latency(self, future: Future, num: int, started: float) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._lock:
+            self._window(num).append((time.monotonic() - started) * 1000)
+
+    def _settle(self, hedge_won: bool, loser: Future) -> None:
+        cancelled = loser.cancel()
+        with self._lock:
+            if hedge_won:
+                self._stats['hedge_wins'] += 1
+            if cancelled:
+                self._stats['losers_cancelled'] += 1
+
+    def get_stats(self) -> dict:
+        """
+        Returns how many requests were hedged or passed through, how often a hedge fired
+        and won, and the current hedge delay for single numbers.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['delay_ms'] = round(self.get_delay_ms(), 1)
+        stats['source'] = self.source.name
+        return stats
+
+
+def seconds_until_utc_midnight() -> float:
+    """
+    Returns the seconds left until the next UTC midnight, when random.org quotas roll over.
+    """
+    return 86400 - time.time() % 86400
+
+
+class QuotaAwareSource(RandomSource):
+    """
+    Keeps a quota-limited source inside its bit budget, spreading its spend over the day.
+
+    The remaining budget is read from fetch_quota every refresh_interval_s and, in between,
+    estimated by subtracting bits_per_number for every number served and for every number
+    requested by a hedge (see charge). Only the part of the budget above reserve_bits is
+    spent. Bulk requests (more than one number) draw from a token bucket that starts with
+    max_share of the spendable budget and refills at the spendable budget divided by the
+    seconds left until the quota rolls over, so prefetches are paced over the day instead
+    of draining it in one go. A bulk request the bucket cannot fully cover returns short,
+    possibly empty, and never mixes in fallback numbers, so the caller can wait and refill
+    later. Single numbers are latency sensitive: they come from the source, and are charged
+    to the bucket, until only the reserve is left, then from the fallback. Until the quota
+    is first known the source is used unrestricted.
+
+    Attributes:
+        source (RandomSource): The quota-limited source.
+        fallback (RandomSource): Where single numbers come from when the budget is spent.
+        fetch_quota (Callable[[], int]): Returns the remaining quota in bits.
+        bits_per_number (int): The bits charged for one number.
+        reserve_bits (int): The budget kept back and never spent.
+        max_share (float): The share of the spendable budget that may be spent at once.
+        refresh_interval_s (float): How often the quota is read.
+        seconds_to_reset (Callable[[], float]): Returns the seconds until the quota rolls over.
+    """
+
+    def __init__(self, source: RandomSource, fallback: RandomSource, fetch_quota: Callable[[], int],
+                 bits_per_number: int = 7, reserve_bits: int = 50000, max_share: float = 0.1,
+                 refresh_interval_s: float = 600,
+                 seconds_to_reset: Callable[[], float] = seconds_until_utc_midnight):
+        self.source = source
+        self.fallback = fallback
+        self.fetch_quota = fetch_quota
+        self.bits_per_number = bits_per_number
+        self.reserve_bits = reserve_bits
+        self.max_share = max_share
+        self.refresh_interval_s = refresh_interval_s
+        self.seconds_to_reset = seconds_to_reset
+        self.name = source.name
+
+        self._remaining_bits = None
+        self._refreshed_at = None
+        self._refreshing = False
+        self._tokens = None
+        self._tokens_at = None
+        self._lock = threading.Lock()
+        self._stats = {'source_numbers': 0, 'fallback_numbers': 0, 'paced_numbers': 0, 'hedged_numbers': 0,
+                       'refreshes': 0, 'refresh_errors': 0}
+
+    def refresh(self) -> Optional[int]:
+        """
+        Reads the remaining quota, replacing the local estimate.
+
+        Returns:
+            int: The remaining quota in bits, or None if it could not be read.
+        """
+        try:
+            remaining = self.fetch_quota()
+        except (ValueError, RuntimeError) as e:
+            logger.error("Failed to read the quota of %s: %s", self.source.name, str(e))
+            with self._lock:
+                self._stats['refresh_errors'] += 1
+                self._refreshing = False
+                # Try again after another interval rather than on every call
+                self._refreshed_at = time.monotonic()
+            return None
+        with self._lock:
+            self._remaining_bits = remaining
+            self._refreshed_at = time.monotonic()
+            self._refreshing = False
+            self._stats['refreshes'] += 1
+            if self._tokens is None:
+                self._tokens = self._burst_bits()
+                self._tokens_at = self._refreshed_at
+        logger.info("Quota of %s: %d bits left", self.source.name, remaining)
+        return remaining
+
+    def _spendable_bits(self) -> int:
+        # Callers hold self._lock and know the quota
+        return max(self._remaining_bits - self.reserve_bits, 0)
+
+    def _burst_bits(self) -> float:
+        return self._spendable_bits() * self.max_share
+
+    def _refill_tokens(self) -> None:
+        # Callers hold self._lock and know the quota
+        now = time.monotonic()
+        rate = self._spendable_bits() / max(self.seconds_to_reset(), 1)
+        self._tokens = min(self._tokens + rate * (now - self._tokens_at), self._burst_bits())
+        self._tokens_at = now
+
+    def _spend(self, num: int) -> None:
+        # Callers hold self._lock
+        if self._remaining_bits is not None:
+            self._remaining_bits -= num * self.bits_per_number
+            self._tokens -= num * self.bits_per_number
+
+    def charge(self, num: int) -> None:
+        """
+        Charges num numbers requested outside fetch, such as hedged duplicates, against the budget.
+
+        Args:
+            num (int): How many numbers were requested.
+        """
+        with self._lock:
+            self._stats['hedged_numbers'] += num
+            self._spend(num)
+
+    def fetch(self, num: int) -> list[float]:
+        with self._lock:
+            due = not self._refreshing and (
+                self._refreshed_at is None or time.monotonic() - self._refreshed_at >= self.refresh_interval_s)
+            if due:
+                self._refreshing = True
+        if due:
+            self.refresh()
+
+        with self._lock:
+            if self._remaining_bits is None:
+                allowed = num
+            elif num == 1:
+                allowed = 1 if self._spendable_bits() >= self.bits_per_number else 0
+            else:
+                self._refill_tokens()
+                budget = min(self._tokens, self._spendable_bits())
+                allowed = min(num, max(int(budget) // self.bits_per_number, 0))
+            self._stats['source_numbers'] += allowed
+            self._spend(allowed)
+            if num == 1:
+                self._stats['fallback_numbers'] += 1 - allowed
+            else:
+                self._stats['paced_numbers'] += num - allowed
+
+        if num == 1 and not allowed:
+            logger.warning("Quota of %s nearly spent; serving from %s", self.source.name, self.fallback.name)
+            return self.fallback.fetch(1)
+        if allowed < num:
+            logger.info("Quota of %s paced a request for %d numbers down to %d", self.source.name, num, allowed)
+        return self.source.fetch(allowed) if allowed else []
+
+    def get_stats(self) -> dict:
+        """
+        Returns the estimated remaining and spendable budget, the bits that may be spent
+        right now, and the number and refresh counters.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            remaining = self._remaining_bits
+            refreshed_at = self._refreshed_at
+            if remaining is not None and self._tokens is not None:
+                self._refill_tokens()
+            tokens = self._tokens
+        stats['remaining_bits'] = remaining
+        stats['spendable_bits'] = max(remaining - self.reserve_bits, 0) if remaining is not None else None
+        stats['bucket_bits'] = int(tokens) if tokens is not None else None
+        stats['seconds_since_refresh'] = round(time.monotonic() - refreshed_at, 1) if refreshed_at is not None else None
+        stats['source'] = self.source.name
+        stats['fallback'] = self.fallback.name
+        return stats
+
+
+class EntropyReservoir(RandomSource):
+    """
+    A file-backed ring of prefetched numbers that outlives the process.
+
+    The file is memory-mapped: a header holding the capacity and two ever-increasing
+    cursors, the count of numbers written and the count consumed, followed by one byte
+    per slot holding a number in hundredths. Numbers are reserved by advancing the
+    consumed cursor and syncing the header before they are returned, so a number is
+    never served twice, even across a crash or by another process sharing the file
+    (access is serialized with flock). A crash can only lose reserved numbers, never
+    reuse them.
+
+    A background thread tops the file up from the upstream source once fewer than
+    low_water numbers are left. Only one process sharing the file tops it up at a time:
+    the others skip their top-up rather than fetch numbers that would not fit. When the
+    file cannot cover a request it is fetched from upstream directly.
+
+    Attributes:
+        source (RandomSource): Where numbers come from.
+        path (str): The reservoir file.
+        capacity (int): The number of slots; an existing file keeps its own capacity.
+        low_water (int): The number of available numbers that triggers a top-up.
+        retry_interval_ms (int): The pause after a failed top-up.
+    """
+
+    _MAGIC = b"MMRESV01"
+    _HEADER = struct.Struct("<8sQQQ")
+    _MAX_FETCH = 10000
+
+    def __init__(self, source: RandomSource, path: str, capacity: int = 10000, low_water: int = 0,
+                 retry_interval_ms: int = 1000):
+        if capacity < 1:
+            raise ValueError(f"Invalid reservoir capacity: {capacity}. Must be at least 1.")
+
+        self.source = source
+        self.path = path
+        self.name = source.name
+        self.retry_interval_ms = retry_interval_ms
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        # Held by whichever process is topping up, for the whole upstream fetch
+        self._top_up_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        with self._file_lock():
+            self.capacity = self._open_or_create(capacity)
+        self._map = mmap.mmap(self._fd, self._HEADER.size + self.capacity)
+        # by default top up once a quarter of the reservoir is left
+        self.low_water = min(low_water or self.capacity // 4, self.capacity - 1)
+
+        self._lock = threading.Lock()
+        self._top_up_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._stats = {'served_from_disk': 0, 'served_direct': 0, 'top_ups': 0, 'top_up_errors': 0,
+                       'top_ups_skipped': 0, 'topped_up': 0, 'last_top_up_ms': None}
+
+    def _open_or_create(self, capacity: int) -> int:
+        size = os.fstat(self._fd).st_size
+        if size >= self._HEADER.size:
+            magic, file_capacity, _, _ = self._HEADER.unpack(os.pread(self._fd, self._HEADER.size, 0))
+            if magic == self._MAGIC and size == self._HEADER.size + file_capacity:
+                if file_capacity != capacity:
+                    logger.warning("Keeping the existing capacity %d of reservoir %s", file_capacity, self.path)
+                return file_capacity
+            logger.warning("Reservoir %s is not a valid reservoir file; recreating it", self.path)
+
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, self._HEADER.size + capacity)
+        os.pwrite(self._fd, self._HEADER.pack(self._MAGIC, capacity, 0, 0), 0)
+        os.fsync(self._fd)
+        return capacity
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        # flock excludes other processes; threads of this one are excluded by self._lock
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _top_up_marker(self) -> Iterator[bool]:
+        # Yields whether this thread may top up; never waits for the one that is
+        if not self._top_up_lock.acquire(blocking=False):
+            yield False
+            return
+        try:
+            try:
+                fcntl.flock(self._top_up_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(self._top_up_fd, fcntl.LOCK_UN)
+        finally:
+            self._top_up_lock.release()
+
+    def _read_cursors(self) -> tuple[int, int]:
+        _, _, written, consumed = self._HEADER.unpack_from(self._map, 0)
+        return written, consumed
+
+    def _write_cursors(self, written: int, consumed: int) -> None:
+        self._HEADER.pack_into(self._map, 0, self._MAGIC, self.capacity, written, consumed)
+        # The header lives in the first page, so this syncs the cursors to disk
+        self._map.flush(0, min(mmap.PAGESIZE, len(self._map)))
+
+    def start(self) -> None:
+        """
+        Starts the background top-up thread if it is not running yet.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="entropy-reservoir", daemon=True)
+            self._thread.start()
+
+    def available(self) -> int:
+        """
+        Returns the number of numbers in the file that have not been served yet.
+        """
+        with self._lock, self._file_lock():
+            written, consumed = self._read_cursors()
+        return written - consumed
+
+    def fetch(self, num: int) -> list[float]:
+        self.start()
+        with self._lock, self._file_lock():
+            written, consumed = self._read_cursors()
+            if written - consumed >= num:
+                # Persist the reservation before handing the numbers out
+                self._write_cursors(written, consumed + num)
+                start = self._HEADER.size
+                slots = [self._map[start + (consumed + i) % self.capacity] for i in range(num)]
+                left = written - consumed - num
+            else:
+                slots, left = None, written - consumed
+
+        if left < self.low_water:
+            self._wakeup.set()
+        if slots is None:
+            with self._lock:
+                self._stats['served_direct'] += num
+            return self.source.fetch(num)
+        with self._lock:
+            self._stats['served_from_disk'] += num
+        return [slot / 100 for slot in slots]
+
+    def top_up(self) -> int:
+        """
+        Fills the reservoir from the upstream source, in requests of at most 10,000 numbers.
+
+        Does nothing if another thread or process sharing the file is already topping it up.
+
+        Returns:
+            int: The number of numbers added.
+
+        Raises:
+            ValueError: If the upstream source returned invalid data.
+            RuntimeError: If the upstream source is unavailable.
+        """
+        with self._top_up_marker() as leader:
+            if not leader:
+                with self._lock:
+                    self._stats['top_ups_skipped'] += 1
+                logger.debug("Entropy reservoir %s is being topped up elsewhere", self.path)
+                return 0
+            return self._fill()
+
+    def _fill(self) -> int:
+        added = 0
+        while True:
+            with self._lock, self._file_lock():
+                written, consumed = self._read_cursors()
+            missing = min(self.capacity - (written - consumed), self._MAX_FETCH)
+            if missing <= 0:
+                return added
+
+            started = time.monotonic()
+            try:
+                numbers = self.source.fetch(missing)
+            except (ValueError, RuntimeError):
+                with self._lock:
+                    self._stats['top_up_errors'] += 1
+                raise
+            elapsed_ms = (time.monotonic() - started) * 1000
+
+            with self._lock, self._file_lock():
+                # Only the marker holder writes and readers only free slots, so the numbers still fit
+                written, consumed = self._read_cursors()
+                start = self._HEADER.size
+                for i, number in enumerate(numbers):
+                    self._map[start + (written + i) % self.capacity] = min(max(round(number * 100), 0), 99)
+                # Slots first, then the cursor that makes them visible
+                self._map.flush()
+                self._write_cursors(written + len(numbers), consumed)
+                self._stats['top_ups'] += 1
+                self._stats['topped_up'] += len(numbers)
+                self._stats['last_top_up_ms'] = round(elapsed_ms, 1)
+            added += len(numbers)
+            logger.info("Topped up entropy reservoir %s with %d numbers", self.path, len(numbers))
+            if len(numbers) < missing:
+                # The source is pacing its spend; the next top-up continues later
+                return added
+
+    def _run(self) -> None:
+        self._wakeup.set()
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            if self.available() >= self.low_water:
+                continue
+            try:
+                self.top_up()
+            except (ValueError, RuntimeError) as e:
+                logger.error("Failed to top up entropy reservoir %s: %s", self.path, str(e))
+                self._stopped.wait(self.retry_interval_ms / 1000)
+                self._wakeup.set()
+
+    def stop(self) -> None:
+        """
+        Stops the top-up thread and closes the file.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self._map.close()
+            os.close(self._fd)
+            os.close(self._top_up_fd)
+
+    def get_stats(self) -> dict:
+        """
+        Returns the numbers available on disk with the serving and top-up counters.
+        """
+        available = self.available()
+        with self._lock:
+            stats = dict(self._stats)
+        stats['available'] = available
+        stats['capacity'] = self.capacity
+        stats['source'] = self.source.name
+        return stats
@@ -1,44 +1,223 @@
+import argparse
+import atexit
+from collections import deque
 import logging
+import math
+import os
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from meal_max.meal_max.utils.logger import configure_logger
+from meal_max.meal_max.utils.random_sources import (
+    CircuitBreakerSource,
+    EntropyReservoir,
+    HedgedSource,
+    QuotaAwareSource,
+    RandomOrgSource,
+    RandomSource,
+    RecordingSource,
+    ReplaySource,
+    SeededRandomSource,
+    SystemRandomSource
+)
 
 logger = logging.getLogger(__name__)
 configure_logger(logger)
 
 
-def get_random() -> float:
+# where random.org requests go; point it at a local stub (see random_org_stub) for offline load tests
+RANDOM_ORG_BASE_URL = os.getenv("RANDOM_ORG_BASE_URL", "https://www.random.org").rstrip("/")
+# the most numbers random.org returns from one decimal-fractions request
+RANDOM_ORG_MAX_NUM = 10000
+# bits random.org charges against the quota for one dec=2 number: ceil(2 * log2(10))
+RANDOM_ORG_BITS_PER_NUMBER = math.ceil(2 * math.log2(10))
+
+# timeouts in seconds for opening a connection to random.org and for reading its response
+RANDOM_ORG_CONNECT_TIMEOUT = float(os.getenv("RANDOM_ORG_CONNECT_TIMEOUT", "5"))
+RANDOM_ORG_READ_TIMEOUT = float(os.getenv("RANDOM_ORG_READ_TIMEOUT", "5"))
+# retries of connection errors and 5xx responses (never of read timeouts), waiting backoff * 2^(n-1) seconds before retry n
+RANDOM_ORG_RETRIES = int(os.getenv("RANDOM_ORG_RETRIES", "2"))
+RANDOM_ORG_RETRY_BACKOFF = float(os.getenv("RANDOM_ORG_RETRY_BACKOFF", "0.2"))
+# keep-alive connections kept open to random.org
+RANDOM_ORG_POOL_SIZE = int(os.getenv("RANDOM_ORG_POOL_SIZE", "4"))
+
+# where get_random's numbers come from: random_org, system (local CSPRNG), seeded (PRNG seeded
+# with RANDOM_SEED) or replay (the numbers in RANDOM_REPLAY_PATH, in order)
+RANDOM_SOURCE = os.getenv("RANDOM_SOURCE", "random_org")
+RANDOM_SEED = int(os.getenv("RANDOM_SEED", "0"))
+RANDOM_REPLAY_PATH = os.getenv("RANDOM_REPLAY_PATH", "")
+RANDOM_REPLAY_LOOP = os.getenv("RANDOM_REPLAY_LOOP", "false").lower() == "true"
+# if set, every number get_random is served from is appended to this file, for later replay
+RANDOM_RECORD_PATH = os.getenv("RANDOM_RECORD_PATH", "")
+# source the circuit breaker switches to when RANDOM_SOURCE misbehaves; none disables the breaker
+RANDOM_FALLBACK_SOURCE = os.getenv("RANDOM_FALLBACK_SOURCE", "none")
+RANDOM_BREAKER_FAILURES = int(os.getenv("RANDOM_BREAKER_FAILURES", "3"))
+# p95 budget of single-number calls, over the last RANDOM_LATENCY_WINDOW of them; bulk refills are not timed
+RANDOM_LATENCY_BUDGET_MS = float(os.getenv("RANDOM_LATENCY_BUDGET_MS", "1000"))
+RANDOM_LATENCY_WINDOW = int(os.getenv("RANDOM_LATENCY_WINDOW", "20"))
+RANDOM_PROBE_INTERVAL_MS = int(os.getenv("RANDOM_PROBE_INTERVAL_MS", "10000"))
+
+# hedging of single-number random.org requests: a second request is sent once the first is slower
+# than this percentile of recent latencies (never sooner than the minimum delay, and after the
+# initial delay until enough latencies are known); 0 disables hedging
+RANDOM_HEDGE_PERCENTILE = float(os.getenv("RANDOM_HEDGE_PERCENTILE", "0"))
+RANDOM_HEDGE_MIN_DELAY_MS = float(os.getenv("RANDOM_HEDGE_MIN_DELAY_MS", "50"))
+RANDOM_HEDGE_INITIAL_DELAY_MS = float(os.getenv("RANDOM_HEDGE_INITIAL_DELAY_MS", "500"))
+RANDOM_HEDGE_WINDOW = int(os.getenv("RANDOM_HEDGE_WINDOW", "100"))
+
+# random.org bit quota tracking: only the budget above the reserve is spent, bulk requests are
+# paced over the day after spending at most the given share of it at once, and single numbers
+# come from the quota fallback source once only the reserve is left
+RANDOM_QUOTA_TRACKING = os.getenv("RANDOM_QUOTA_TRACKING", "false").lower() == "true"
+RANDOM_QUOTA_RESERVE_BITS = int(os.getenv("RANDOM_QUOTA_RESERVE_BITS", "50000"))
+RANDOM_QUOTA_MAX_SHARE = float(os.getenv("RANDOM_QUOTA_MAX_SHARE", "0.1"))
+RANDOM_QUOTA_REFRESH_S = float(os.getenv("RANDOM_QUOTA_REFRESH_S", "600"))
+RANDOM_QUOTA_FALLBACK_SOURCE = os.getenv("RANDOM_QUOTA_FALLBACK_SOURCE", "system")
+
+# file of prefetched numbers kept across restarts (see EntropyReservoir); empty disables it.
+# Filling it costs RANDOM_ORG_BITS_PER_NUMBER bits per slot, so 10,000 slots is 7% of the daily quota
+RANDOM_RESERVOIR_PATH = os.getenv("RANDOM_RESERVOIR_PATH", "")
+RANDOM_RESERVOIR_SIZE = int(os.getenv("RANDOM_RESERVOIR_SIZE", "10000"))
+RANDOM_RESERVOIR_LOW_WATER = int(os.getenv("RANDOM_RESERVOIR_LOW_WATER", "0"))
+
+# prefetched pool of random numbers served by get_random; size 0 fetches one number per call
+RANDOM_POOL_SIZE = int(os.getenv("RANDOM_POOL_SIZE", "0"))
+# depth below which the background thread tops the pool back up
+RANDOM_POOL_LOW_WATER = int(os.getenv("RANDOM_POOL_LOW_WATER", "0"))
+# pause after a failed background refill before trying again
+RANDOM_POOL_RETRY_MS = int(os.getenv("RANDOM_POOL_RETRY_MS", "1000"))
+
+
+def create_session(retries: int = RANDOM_ORG_RETRIES, backoff: float = RANDOM_ORG_RETRY_BACKOFF,
+                   pool_size: int = RANDOM_ORG_POOL_SIZE) -> requests.Session:
     """
-    Fetches a random decimal number between 0 and 1 from random.org.
+    Creates an HTTP session that keeps connections to random.org alive and retries failed requests.
+
+    Connection errors and 500, 502, 503 and 504 responses are retried with exponential backoff.
+    Read errors, timeouts included, are not: a request random.org already received may have
+    been served, and retrying a slow one would keep get_random blocked for several read timeouts.
+
+    Args:
+        retries (int): The maximum number of retries per request.
+        backoff (float): The backoff factor in seconds.
+        pool_size (int): The number of connections kept open per host.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = Retry(
+        total=retries, connect=retries, read=0, status=retries,
+        backoff_factor=backoff,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET'])
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Shared by every thread; the adapter's connection pool is thread-safe
+_session = create_session()
+
+
+def get_http_stats() -> dict:
+    """
+    Returns how many HTTP requests were sent to random.org, counting retries, and how
+    many of them reused a kept-alive connection instead of opening a new one.
+    """
+    requests_sent = connections_opened = 0
+    for adapter in set(_session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests_sent += pool.num_requests
+                connections_opened += pool.num_connections
+    reused = max(requests_sent - connections_opened, 0)
+    return {
+        'requests': requests_sent,
+        'connections_opened': connections_opened,
+        'connections_reused': reused,
+        'reuse_rate': round(reused / requests_sent, 3) if requests_sent else None
+    }
+
+def fetch_quota() -> int:
+    """
+    Fetches the number of bits left in this IP's random.org quota.
 
     Raises:
-        ValueError: If the response from random.org is not a valid float.
+        ValueError: If the response from random.org is not an integer.
         RuntimeError: If the response from random.org times out or fails.
 
     Returns:
-        float: The random number fetched from random.org.
+        int: The remaining quota in bits; negative once it is exhausted.
     """
-    
-    url = "https://www.random.org/decimal-fractions/?num=1&dec=2&col=1&format=plain&rnd=new"
+    url = f"{RANDOM_ORG_BASE_URL}/quota/?format=plain"
+
+    try:
+        logger.info("Fetching random.org quota from %s", url)
+        response = _session.get(url, timeout=(RANDOM_ORG_CONNECT_TIMEOUT, RANDOM_ORG_READ_TIMEOUT))
+        response.raise_for_status()
+
+        try:
+            return int(response.text.strip())
+        except ValueError:
+            raise ValueError("Invalid quota response from random.org: %s" % response.text.strip())
+
+    except requests.exceptions.Timeout:
+        logger.error("Quota request to random.org timed out.")
+        raise RuntimeError("Quota request to random.org timed out.")
+
+    except requests.exceptions.RequestException as e:
+        logger.error("Quota request to random.org failed: %s", e)
+        raise RuntimeError("Quota request to random.org failed: %s" % e)
+
+def fetch_random_numbers(num: int) -> list[float]:
+    """
+    Fetches random decimal numbers between 0 and 1 from random.org in a single request.
+
+    Args:
+        num (int): How many numbers to fetch, from 1 to RANDOM_ORG_MAX_NUM.
+
+    Raises:
+        ValueError: If num is out of range or the response from random.org is not a list of floats.
+        RuntimeError: If the response from random.org times out or fails.
+
+    Returns:
+        list[float]: The random numbers fetched from random.org.
+    """
+    if not 1 <= num <= RANDOM_ORG_MAX_NUM:
+        raise ValueError(f"Invalid number of random numbers: {num}. Must be between 1 and {RANDOM_ORG_MAX_NUM}.")
+
+    url = f"{RANDOM_ORG_BASE_URL}/decimal-fractions/?num={num}&dec=2&col=1&format=plain&rnd=new"
 
     try:
         # Log the request to random.org
         logger.info("Fetching random number from %s", url)
 
-        response = requests.get(url, timeout=5)
+        response = _session.get(url, timeout=(RANDOM_ORG_CONNECT_TIMEOUT, RANDOM_ORG_READ_TIMEOUT))
 
         # Check if the request was successful
         response.raise_for_status()
 
-        random_number_str = response.text.strip()
+        random_number_strs = response.text.split()
 
         try:
-            random_number = float(random_number_str)
+            random_numbers = [float(random_number_str) for random_number_str in random_number_strs]
         except ValueError:
-            raise ValueError("Invalid response from random.org: %s" % random_number_str)
+            random_numbers = []
+        if len(random_numbers) != num:
+            raise ValueError("Invalid response from random.org: %s" % response.text.strip())
 
-        logger.info("Received random number: %.3f", random_number)
-        return random_number
+        return random_numbers
 
     except requests.exceptions.Timeout:
         logger.error("Request to random.org timed out.")
@@ -46,4 +225,366 @@ def get_random() -> float:
 
     except requests.exceptions.RequestException as e:
         logger.error("Request to random.org failed: %s", e)
-        raise RuntimeError("Request to random.org failed: %s" % e)
\ No newline at end of file
+        raise RuntimeError("Request to random.org failed: %s" % e)
+
+
+def create_random_source(name: str, seed: int = RANDOM_SEED) -> RandomSource:
+    """
+    Creates a random source by name. With RANDOM_HEDGE_PERCENTILE set, random.org
+    requests are hedged (see HedgedSource); with RANDOM_QUOTA_TRACKING set, they are
+    kept inside the random.org quota (see QuotaAwareSource).
+
+    Args:
+        name (str): One of 'random_org', 'system', 'seeded' or 'replay'.
+        seed (int): The seed of the 'seeded' source.
+
+    Returns:
+        RandomSource: The source.
+
+    Raises:
+        ValueError: If the name is unknown.
+    """
+    if name == 'random_org':
+        source = RandomOrgSource(fetch_random_numbers)
+        hedged = None
+        if RANDOM_HEDGE_PERCENTILE > 0:
+            source = hedged = HedgedSource(source, latency_percentile=RANDOM_HEDGE_PERCENTILE,
+                                           min_delay_ms=RANDOM_HEDGE_MIN_DELAY_MS,
+                                           initial_delay_ms=RANDOM_HEDGE_INITIAL_DELAY_MS,
+                                           window=RANDOM_HEDGE_WINDOW)
+        if RANDOM_QUOTA_TRACKING:
+            source = QuotaAwareSource(
+                source, create_random_source(RANDOM_QUOTA_FALLBACK_SOURCE, seed), fetch_quota,
+                bits_per_number=RANDOM_ORG_BITS_PER_NUMBER,
+                reserve_bits=RANDOM_QUOTA_RESERVE_BITS,
+                max_share=RANDOM_QUOTA_MAX_SHARE,
+                refresh_interval_s=RANDOM_QUOTA_REFRESH_S
+            )
+            if hedged is not None:
+                # Hedges are real requests, so their numbers count against the quota too
+                hedged.on_hedge = source.charge
+        return source
+    if name == 'system':
+        return SystemRandomSource()
+    if name == 'seeded':
+        return SeededRandomSource(seed)
+    if name == 'replay':
+        return ReplaySource(RANDOM_REPLAY_PATH, loop=RANDOM_REPLAY_LOOP)
+    raise ValueError(f"Invalid random source: {name}. Must be 'random_org', 'system', 'seeded' or 'replay'.")
+
+def build_random_source(name: str = RANDOM_SOURCE, fallback: str = RANDOM_FALLBACK_SOURCE,
+                        reservoir_path: str = RANDOM_RESERVOIR_PATH,
+                        record_path: str = RANDOM_RECORD_PATH) -> RandomSource:
+    """
+    Creates the configured random source, behind a circuit breaker if a fallback is set.
+
+    Args:
+        name (str): The primary source, see create_random_source.
+        fallback (str): The fallback source, or 'none' for no circuit breaker.
+        reservoir_path (str): If set, numbers are served from an on-disk reservoir at this
+            path, topped up from the source.
+        record_path (str): If set, the numbers served, whichever source they came from,
+            are appended to this file.
+
+    Returns:
+        RandomSource: The source get_random draws from.
+    """
+    source = create_random_source(name)
+    if fallback != 'none':
+        source = CircuitBreakerSource(
+            source, create_random_source(fallback),
+            failure_threshold=RANDOM_BREAKER_FAILURES,
+            latency_budget_ms=RANDOM_LATENCY_BUDGET_MS,
+            latency_window=RANDOM_LATENCY_WINDOW,
+            probe_interval_ms=RANDOM_PROBE_INTERVAL_MS
+        )
+    if reservoir_path:
+        source = EntropyReservoir(source, reservoir_path, capacity=RANDOM_RESERVOIR_SIZE,
+                                  low_water=RANDOM_RESERVOIR_LOW_WATER, retry_interval_ms=RANDOM_POOL_RETRY_MS)
+    if record_path:
+        source = RecordingSource(source, record_path)
+    return source
+
+
+class RandomNumberPool:
+    """
+    An in-memory pool of random numbers fetched from random.org in bulk.
+
+    Numbers are served from memory. When the pool drops below low_water a background
+    thread refills it to size with one request; a caller that finds the pool empty
+    refills it itself, so it waits for one round trip at most.
+
+    Attributes:
+        size (int): The number of numbers the pool is filled to.
+        low_water (int): The depth that triggers a background refill.
+        retry_interval_ms (int): The pause after a failed background refill.
+    """
+
+    def __init__(self, size: int, low_water: int = 0, retry_interval_ms: int = RANDOM_POOL_RETRY_MS,
+                 fetch: Callable[[int], list[float]] = fetch_random_numbers):
+        if not 1 <= size <= RANDOM_ORG_MAX_NUM:
+            raise ValueError(f"Invalid pool size: {size}. Must be between 1 and {RANDOM_ORG_MAX_NUM}.")
+
+        self.size = size
+        # by default refill once a quarter of the pool is left
+        self.low_water = min(low_water or size // 4, size - 1)
+        self.retry_interval_ms = retry_interval_ms
+        self._fetch = fetch
+
+        self._numbers: deque = deque()
+        self._lock = threading.Lock()
+        # Held for the whole request so the refiller and an empty-pool caller do not both fetch
+        self._refill_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._stats = {'served': 0, 'empty_waits': 0, 'refills': 0, 'refill_errors': 0, 'fetched': 0,
+                       'last_refill_ms': None, 'max_refill_ms': None, 'total_refill_ms': 0.0}
+
+    def start(self) -> None:
+        """
+        Starts the background refiller if it is not running yet.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="random-pool-refiller", daemon=True)
+            self._thread.start()
+
+    def get(self) -> float:
+        """
+        Takes one number from the pool, refilling it first if it is empty.
+
+        Raises:
+            ValueError: If random.org returned an invalid response while refilling.
+            RuntimeError: If random.org timed out or failed while refilling.
+
+        Returns:
+            float: A random number between 0 and 1.
+        """
+        self.start()
+        while True:
+            with self._lock:
+                if self._numbers:
+                    number = self._numbers.popleft()
+                    self._stats['served'] += 1
+                    low = len(self._numbers) < self.low_water
+                    break
+                self._stats['empty_waits'] += 1
+            logger.warning("Random number pool is empty; refilling before serving")
+            if not self.refill():
+                with self._lock:
+                    empty = not self._numbers
+                if empty:
+                    # The source paced the refill out; a single number is still served
+                    return self._fetch(1)[0]
+
+        if low:
+            self._wakeup.set()
+        return number
+
+    def refill(self) -> int:
+        """
+        Tops the pool up to size with a single request to random.org. A quota-limited
+        source may return fewer numbers than asked for; the pool is then topped up later.
+
+        Raises:
+            ValueError: If random.org returned an invalid response.
+            RuntimeError: If random.org timed out or failed.
+
+        Returns:
+            int: The number of numbers added.
+        """
+        with self._refill_lock:
+            with self._lock:
+                missing = self.size - len(self._numbers)
+            if missing <= 0:
+                return 0
+
+            started = time.monotonic()
+            try:
+                numbers = self._fetch(missing)
+            except (ValueError, RuntimeError):
+                with self._lock:
+                    self._stats['refill_errors'] += 1
+                raise
+            elapsed_ms = (time.monotonic() - started) * 1000
+
+            with self._lock:
+                self._numbers.extend(numbers)
+                self._stats['refills'] += 1
+                self._stats['fetched'] += len(numbers)
+                self._stats['last_refill_ms'] = round(elapsed_ms, 1)
+                self._stats['max_refill_ms'] = round(max(elapsed_ms, self._stats['max_refill_ms'] or 0), 1)
+                self._stats['total_refill_ms'] += elapsed_ms
+            logger.info("Refilled random number pool with %d numbers in %.1f ms", len(numbers), elapsed_ms)
+            return len(numbers)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.refill()
+            except (ValueError, RuntimeError) as e:
+                logger.error("Failed to refill random number pool: %s", str(e))
+                self._stopped.wait(self.retry_interval_ms / 1000)
+                # Try again, unless a caller has refilled the pool meanwhile
+                self._wakeup.set()
+
+    def stop(self) -> None:
+        """
+        Stops the background refiller.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def get_stats(self) -> dict:
+        """
+        Returns the pool depth with the serving and refill counters and refill latencies in milliseconds.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['depth'] = len(self._numbers)
+        total_refill_ms = stats.pop('total_refill_ms')
+        stats['avg_refill_ms'] = round(total_refill_ms / stats['refills'], 1) if stats['refills'] else None
+        stats['size'] = self.size
+        stats['low_water'] = self.low_water
+        return stats
+
+
+def _find_source(kind: type) -> Optional[RandomSource]:
+    # Walk the layers build_random_source stacked around the primary source
+    source = _random_source
+    while source is not None and not isinstance(source, kind):
+        source = source.primary if isinstance(source, CircuitBreakerSource) else getattr(source, 'source', None)
+    return source
+
+
+_random_source = build_random_source()
+if isinstance(_random_source, RecordingSource):
+    atexit.register(_random_source.close)
+_reservoir = _find_source(EntropyReservoir)
+if _reservoir is not None:
+    atexit.register(_reservoir.stop)
+    # Start topping up right away, so a fresh reservoir fills before the first battles
+    _reservoir.start()
+
+_random_pool = RandomNumberPool(RANDOM_POOL_SIZE, RANDOM_POOL_LOW_WATER, fetch=_random_source.fetch) \
+    if RANDOM_POOL_SIZE > 0 else None
+if _random_pool is not None:
+    atexit.register(_random_pool.stop)
+
+
+def get_random_source_stats() -> dict:
+    """
+    Returns the counters of the random source, including the circuit breaker state if there is one.
+    """
+    return _random_source.get_stats()
+
+def get_hedging_stats() -> Optional[dict]:
+    """
+    Returns the hedging counters of random.org requests, or None when hedging is disabled.
+    """
+    source = _find_source(HedgedSource)
+    return source.get_stats() if source is not None else None
+
+def get_quota_stats() -> Optional[dict]:
+    """
+    Returns the random.org quota budget and counters, or None when quota tracking is disabled.
+    """
+    source = _find_source(QuotaAwareSource)
+    return source.get_stats() if source is not None else None
+
+def get_reservoir_stats() -> Optional[dict]:
+    """
+    Returns the on-disk reservoir counters, or None when the reservoir is disabled.
+    """
+    return _reservoir.get_stats() if _reservoir is not None else None
+
+def get_random_pool_stats() -> Optional[dict]:
+    """
+    Returns the random number pool counters, or None when the pool is disabled.
+    """
+    return _random_pool.get_stats() if _random_pool is not None else None
+
+def get_random() -> float:
+    """
+    Fetches a random decimal number between 0 and 1 from random.org.
+
+    The number comes from RANDOM_SOURCE, random.org by default, which falls back to
+    RANDOM_FALLBACK_SOURCE while its circuit breaker is open (see CircuitBreakerSource).
+    With RANDOM_POOL_SIZE set the number comes from a pool prefetched in bulk
+    (see RandomNumberPool) instead of a request of its own.
+
+    Raises:
+        ValueError: If the response from random.org is not a valid float.
+        RuntimeError: If the response from random.org times out or fails.
+
+    Returns:
+        float: The random number fetched from random.org.
+    """
+    if _random_pool is not None:
+        random_number = _random_pool.get()
+    else:
+        random_number = _random_source.fetch(1)[0]
+
+    logger.info("Received random number: %.3f", random_number)
+    return random_number
+
+def record_random_numbers(path: str, count: int, source: Optional[RandomSource] = None) -> int:
+    """
+    Writes count random numbers to a file that RANDOM_SOURCE=replay can play back.
+
+    Recording stops early once the source returns fewer numbers than asked for, as a
+    random.org source paced by RANDOM_QUOTA_TRACKING does when its budget is spent.
+
+    Args:
+        path (str): The file to write; it is replaced if it exists.
+        count (int): How many numbers to record.
+        source (RandomSource): Where the numbers come from. Defaults to RANDOM_SOURCE.
+
+    Returns:
+        int: The number of numbers written, less than count if the source ran short.
+
+    Raises:
+        ValueError: If the source returned invalid data.
+        RuntimeError: If the source is unavailable.
+    """
+    source = source or create_random_source(RANDOM_SOURCE)
+    written = 0
+    with open(path, "w") as fh:
+        while written < count:
+            num = min(count - written, RANDOM_ORG_MAX_NUM)
+            numbers = source.fetch(num)
+            fh.write("".join(f"{number}\n" for number in numbers))
+            written += len(numbers)
+            if len(numbers) < num:
+                logger.warning("%s returned %d of %d numbers; stopping after %d of %d",
+                               source.name, len(numbers), num, written, count)
+                break
+    logger.info("Recorded %d random numbers from %s to %s", written, source.name, path)
+    return written
+
+def main(argv: list[str] = None) -> int:
+    """
+    Command line entry point: python -m meal_max.meal_max.utils.random_utils record PATH --count N
+    """
+    parser = argparse.ArgumentParser(description="Record random numbers for deterministic replay.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record = subparsers.add_parser("record", help="record numbers from RANDOM_SOURCE to a file")
+    record.add_argument("path", help="the file to write")
+    record.add_argument("--count", type=int, default=1000, help="how many numbers to record")
+    args = parser.parse_args(argv)
+
+    written = record_random_numbers(args.path, args.count)
+    print(f"Recorded {written} random numbers to {args.path}")
+    return 0 if written == args.count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
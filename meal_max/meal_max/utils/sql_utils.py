@@ -1,7 +1,13 @@
+import argparse
 from contextlib import contextmanager
 import logging
 import os
+import queue
+import re
 import sqlite3
+import sys
+import threading
+from typing import Optional
 
 from meal_max.meal_max.utils.logger import configure_logger
 
@@ -13,6 +19,48 @@ configure_logger(logger)
 # load the db path from the environment with a default value
 DB_PATH = os.getenv("DB_PATH", "/app/sql/meal_max.db")
 
+# connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+
+# named sets of per-connection pragmas, selected with DB_PRAGMA_PROFILE
+DB_PRAGMA_PROFILE = os.getenv("DB_PRAGMA_PROFILE", "default")
+
+PRAGMA_PROFILES = {
+    # SQLite's own defaults: rollback journal, synchronous=FULL
+    'default': {},
+    # WAL lets readers proceed while a battle commits; NORMAL only syncs at checkpoints
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,   # negative means KiB, so 64 MiB
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+    },
+    # WAL concurrency without giving up a sync on every commit
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -16384,
+    },
+}
+
+# pragmas that may be overridden individually, e.g. DB_PRAGMA_MMAP_SIZE=0
+TUNABLE_PRAGMAS = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store')
+
+# pragmas that only take effect before the first table is created; with INCREMENTAL
+# auto_vacuum, freed pages are only returned to the file system by incremental_vacuum
+CREATION_PRAGMAS = {
+    'page_size': os.getenv("DB_PAGE_SIZE", "4096"),
+    'auto_vacuum': os.getenv("DB_AUTO_VACUUM", "INCREMENTAL"),
+}
+
+# run incremental_vacuum at startup, after the migrations, to reclaim pages freed since the last run
+DB_VACUUM_ON_START = os.getenv("DB_VACUUM_ON_START", "false").lower() == "true"
+
+# directory of ordered NNNN_description.sql schema migrations
+SQL_MIGRATIONS_PATH = os.getenv("SQL_MIGRATIONS_PATH", "/app/sql/migrations")
+
 
 def check_database_connection():
     try:
@@ -37,6 +85,237 @@ def check_table_exists(tablename: str):
         logger.error(error_message)
         raise Exception(error_message) from e
 
+
+###################################################
+#
+# Pragma profile
+#
+###################################################
+
+
+def get_pragma_settings(profile: str = None) -> dict:
+    """
+    Resolves the pragmas to apply to each new connection.
+
+    Args:
+        profile (str): The name of a profile in PRAGMA_PROFILES. Defaults to DB_PRAGMA_PROFILE.
+
+    Returns:
+        dict: The profile's pragmas with any DB_PRAGMA_<NAME> environment overrides applied.
+
+    Raises:
+        ValueError: If the profile is unknown or an override value is malformed.
+    """
+    profile = profile or DB_PRAGMA_PROFILE
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(f"Invalid pragma profile: {profile}. Must be one of {sorted(PRAGMA_PROFILES)}.")
+
+    settings = dict(PRAGMA_PROFILES[profile])
+    for name in TUNABLE_PRAGMAS:
+        value = os.getenv(f"DB_PRAGMA_{name.upper()}")
+        if value:
+            settings[name] = value
+
+    for name, value in settings.items():
+        _check_pragma_value(name, value)
+    return settings
+
+def _check_pragma_value(name: str, value) -> None:
+    if not re.fullmatch(r"-?\w+", str(value)):
+        raise ValueError(f"Invalid value for pragma {name}: {value}")
+
+def apply_pragmas(conn: sqlite3.Connection, settings: dict = None) -> None:
+    """
+    Applies the pragma settings to a freshly opened connection.
+
+    Args:
+        conn (sqlite3.Connection): The connection to configure.
+        settings (dict): The pragmas to apply. Defaults to get_pragma_settings().
+    """
+    if settings is None:
+        settings = get_pragma_settings()
+    for name, value in settings.items():
+        # PRAGMA does not accept bound parameters; values are validated in get_pragma_settings
+        conn.execute(f"PRAGMA {name} = {value};").fetchall()
+    if settings:
+        logger.debug("Applied pragmas: %s", settings)
+
+
+###################################################
+#
+# Connection pool
+#
+###################################################
+
+
+class ConnectionPool:
+    """
+    A fixed-size pool of SQLite connections with checkout/checkin semantics.
+
+    Connections are opened lazily up to the pool size and handed out to one
+    caller at a time. Idle connections are validated before they are reused,
+    and broken ones are replaced transparently.
+
+    Attributes:
+        db_path (str): The path of the SQLite database file.
+        size (int): The maximum number of connections the pool will open.
+        timeout (float): How long, in seconds, to wait for a free connection.
+        pragmas (dict): The pragmas applied once to every connection the pool opens.
+    """
+
+    def __init__(self, db_path: str, size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT,
+                 pragmas: dict = None):
+        if size < 1:
+            raise ValueError(f"Invalid pool size: {size}. Must be at least 1.")
+
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = get_pragma_settings() if pragmas is None else pragmas
+
+        # LIFO so the most recently used (and cache-warm) connection is reused first
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._stats = {'hits': 0, 'waits': 0, 'opens': 0, 'discards': 0, 'timeouts': 0}
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        try:
+            apply_pragmas(conn, self.pragmas)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        self._count('opens')
+        logger.info("Opened new pooled database connection (%s).", self.db_path)
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._open -= 1
+            self._stats['discards'] += 1
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1;").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def checkout(self) -> sqlite3.Connection:
+        """
+        Takes a connection out of the pool, opening one if the pool is not full.
+
+        Returns:
+            sqlite3.Connection: A validated connection owned by the caller until checkin.
+
+        Raises:
+            sqlite3.OperationalError: If no connection becomes free within the timeout.
+            sqlite3.Error: If a new connection cannot be opened.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+                self._count('hits')
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._open < self.size
+                    if can_open:
+                        self._open += 1
+                if can_open:
+                    try:
+                        return self._connect()
+                    except sqlite3.Error:
+                        with self._lock:
+                            self._open -= 1
+                        raise
+
+                self._count('waits')
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    self._count('timeouts')
+                    raise sqlite3.OperationalError(
+                        f"Timed out after {self.timeout}s waiting for a database connection")
+
+            if self._is_healthy(conn):
+                return conn
+
+            logger.warning("Discarding unhealthy pooled database connection.")
+            self._discard(conn)
+
+    def checkin(self, conn: sqlite3.Connection) -> None:
+        """
+        Returns a connection to the pool, rolling back any transaction left open.
+
+        Args:
+            conn (sqlite3.Connection): A connection previously obtained from checkout.
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    def close_all(self) -> None:
+        """
+        Closes every idle connection. Checked out connections are closed on checkin
+        only if they fail validation, so this is meant for shutdown.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def get_stats(self) -> dict:
+        """
+        Returns the pool counters along with its current occupancy.
+
+        Returns:
+            dict: hits, waits, opens, discards and timeouts, plus size, open and idle counts.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open'] = self._open
+        stats['idle'] = self._idle.qsize()
+        stats['size'] = self.size
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Returns the process-wide connection pool, creating it on first use.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT)
+    return _pool
+
+def get_pool_stats() -> dict:
+    """
+    Returns the counters of the process-wide connection pool.
+    """
+    return get_pool().get_stats()
+
 ###################################################
 #
 # This one yields rather than returns.
@@ -45,14 +324,216 @@ def check_table_exists(tablename: str):
 ###################################################
 @contextmanager
 def get_db_connection():
+    pool = get_pool()
     conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = pool.checkout()
         yield conn
     except sqlite3.Error as e:
         logger.error("Database connection error: %s", str(e))
         raise e
     finally:
         if conn:
+            pool.checkin(conn)
+            logger.info("Database connection returned to pool.")
+
+
+###################################################
+#
+# Schema migrations
+#
+###################################################
+
+
+MIGRATION_FILENAME = re.compile(r"(\d+)_(\w+)\.sql")
+
+
+def load_migrations(migrations_path: str = None) -> list[tuple[int, str, str]]:
+    """
+    Reads the migration scripts in version order.
+
+    Args:
+        migrations_path (str): The directory holding NNNN_description.sql files.
+            Defaults to SQL_MIGRATIONS_PATH.
+
+    Returns:
+        list[tuple[int, str, str]]: (version, name, script) for every migration.
+
+    Raises:
+        ValueError: If two scripts share a version number.
+    """
+    migrations_path = migrations_path or SQL_MIGRATIONS_PATH
+    migrations = {}
+    for filename in sorted(os.listdir(migrations_path)):
+        match = MIGRATION_FILENAME.fullmatch(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {filename}")
+        with open(os.path.join(migrations_path, filename), "r") as fh:
+            migrations[version] = (version, match.group(2), fh.read())
+    return [migrations[version] for version in sorted(migrations)]
+
+def _split_statements(script: str) -> list[str]:
+    # executescript() commits before it runs, so statements are executed one by one
+    # to keep a whole batch of migrations inside a single transaction
+    statements, buffer = [], ""
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ""
+    leftover = "\n".join(line for line in buffer.splitlines() if not line.strip().startswith("--")).strip()
+    if leftover:
+        raise ValueError(f"Incomplete SQL statement in migration: {leftover}")
+    return statements
+
+def _ensure_schema_version_table(conn: sqlite3.Connection) -> None:
+    if conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0:
+        for name, value in CREATION_PRAGMAS.items():
+            _check_pragma_value(name, value)
+            conn.execute(f"PRAGMA {name} = {value};")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """
+    Returns the highest migration version applied to the database, or 0 if none.
+    """
+    _ensure_schema_version_table(conn)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def apply_migrations(conn: Optional[sqlite3.Connection] = None, migrations_path: str = None,
+                     target: int = None) -> list[int]:
+    """
+    Applies every pending migration, in order, in a single transaction.
+
+    The write lock is taken before the current version is read, so workers that
+    start together apply each migration exactly once.
+
+    Args:
+        conn (sqlite3.Connection): The connection to migrate. Defaults to a dedicated
+            connection to DB_PATH, opened before any pooled connection pragmas apply.
+        migrations_path (str): The directory of migration scripts. Defaults to SQL_MIGRATIONS_PATH.
+        target (int): The version to stop at. Defaults to the latest.
+
+    Returns:
+        list[int]: The versions that were applied.
+
+    Raises:
+        sqlite3.Error: If a migration fails; nothing from the batch is kept.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_PATH)
+    try:
+        migrations = load_migrations(migrations_path)
+        _ensure_schema_version_table(conn)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+            applied = []
+            for version, name, script in migrations:
+                if version <= current or (target is not None and version > target):
+                    continue
+                logger.info("Applying migration %04d_%s", version, name)
+                for statement in _split_statements(script):
+                    conn.execute(statement)
+                conn.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+                applied.append(version)
+            conn.commit()
+        except (sqlite3.Error, ValueError) as e:
+            conn.rollback()
+            logger.error("Migration failed, rolled back: %s", str(e))
+            raise
+
+        if applied:
+            logger.info("Database migrated to version %d", applied[-1])
+        else:
+            logger.info("Database schema is up to date at version %d", current)
+        return applied
+    finally:
+        if own_conn:
             conn.close()
-            logger.info("Database connection closed.")
+
+def incremental_vacuum(conn: Optional[sqlite3.Connection] = None, max_pages: int = 0) -> int:
+    """
+    Returns free pages to the file system in a database created with INCREMENTAL auto_vacuum.
+
+    Deleted rows leave their pages on the freelist; without this, such a database keeps
+    its largest size and pays for auto_vacuum's pointer maps for nothing. A database with
+    any other auto_vacuum mode is left alone.
+
+    Args:
+        conn (sqlite3.Connection): The connection to use; a transaction open on it is committed
+            first. Defaults to a dedicated connection to DB_PATH.
+        max_pages (int): The most pages to free in one run; 0 frees them all.
+
+    Returns:
+        int: The number of pages freed.
+
+    Raises:
+        sqlite3.Error: If the vacuum fails.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_PATH)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            logger.debug("auto_vacuum is not INCREMENTAL; skipping the incremental vacuum")
+            return 0
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # execute() stops after the first page the pragma frees; executescript runs it to completion
+        conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+        freed = free_before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        logger.info("Incremental vacuum freed %d of %d free pages", freed, free_before)
+        return freed
+    finally:
+        if own_conn:
+            conn.close()
+
+def main(argv: list[str] = None) -> int:
+    """
+    Command line entry point: python -m meal_max.meal_max.utils.sql_utils {migrate,status,vacuum}
+    """
+    parser = argparse.ArgumentParser(description="Manage the meal_max database schema.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="apply pending migrations, then reclaim free pages")
+    migrate_parser.add_argument("--target", type=int, help="stop at this version")
+    subparsers.add_parser("status", help="show applied and pending migrations")
+    vacuum_parser = subparsers.add_parser("vacuum", help="reclaim free pages (INCREMENTAL auto_vacuum only)")
+    vacuum_parser.add_argument("--max-pages", type=int, default=0, help="the most pages to free; 0 for all")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        applied = apply_migrations(target=args.target)
+        print(f"Applied {len(applied)} migration(s): {applied}")
+        incremental_vacuum()
+        return 0
+
+    if args.command == "vacuum":
+        freed = incremental_vacuum(max_pages=args.max_pages)
+        print(f"Freed {freed} page(s)")
+        return 0
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        current = get_schema_version(conn)
+    finally:
+        conn.close()
+    print(f"Current schema version: {current}")
+    for version, name, _ in load_migrations():
+        print(f"  {version:04d}_{name}: {'applied' if version <= current else 'pending'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
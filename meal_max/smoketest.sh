@@ -1,5 +1,9 @@
  #!/bin/bash
 
+# To run offline, start the random.org stub and point the app at it before starting it:
+#   python -m meal_max.meal_max.utils.random_org_stub --port 8090 --latency lognormal:40:0.8
+#   RANDOM_ORG_BASE_URL=http://127.0.0.1:8090
+
 # Define the base URL for the Flask API
 BASE_URL="http://localhost:5001/api"
 
@@ -0,0 +1,27 @@
+from contextlib import contextmanager
+from pathlib import Path
+import sqlite3
+
+import pytest
+
+from meal_max.utils.sql_utils import apply_migrations
+
+###############
+# Fixtures
+###############
+
+# real migrated database for tests that exercise SQL semantics
+@pytest.fixture
+def sqlite_db(mocker):
+    # shared with background threads, as pooled connections are
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    apply_migrations(conn, migrations_path=str(Path(__file__).parents[2] / "sql" / "migrations"))
+
+    @contextmanager
+    def real_get_db_connection():
+        yield conn
+
+    mocker.patch("meal_max.models.kitchen_model.get_db_connection", real_get_db_connection)
+    mocker.patch("meal_max.models.meal_importer.get_db_connection", real_get_db_connection)
+    yield conn
+    conn.close()
@@ -1,3 +1,5 @@
+import threading
+
 import pytest
 
 from meal_max.models.battle_model import BattleModel
@@ -140,8 +142,8 @@ def test_battle_two_combatants(battle_model, sample_meal1, sample_meal2, mocker)
     """Test that battle returns the correct winner and updates stats."""
 
     # Mock `get_random` to return a consistent value
-    mock_random = mocker.patch("meal_max.utils.random_utils.get_random", return_value=0.5)
-    mock_update_meal_stats = mocker.patch("meal_max.models.battle_model.update_meal_stats")
+    mock_random = mocker.patch("meal_max.models.battle_model.get_random", return_value=0.5)
+    mock_record_battle_result = mocker.patch("meal_max.models.battle_model.record_battle_result")
     # Prepare combatants
     battle_model.prep_combatant(sample_meal1)
     battle_model.prep_combatant(sample_meal2)
@@ -152,11 +154,79 @@ def test_battle_two_combatants(battle_model, sample_meal1, sample_meal2, mocker)
     # Assertions
     assert winner == sample_meal2.meal, "Expected second combatant to win based on mocked random value."
 
-    # Ensure `update_meal_stats` was called for both combatants with correct statuses
-    mock_update_meal_stats.assert_any_call(sample_meal1.id, "loss")
-    mock_update_meal_stats.assert_any_call(sample_meal2.id, "win")
-    assert mock_update_meal_stats.call_count == 2, "Expected two calls to update_meal_stats."
+    # Ensure both combatants' stats were recorded together with the correct outcome
+    mock_record_battle_result.assert_called_once_with(sample_meal2.id, sample_meal1.id)
 
     # Validate that the correct combatant remains in the list
     assert sample_meal1 not in battle_model.get_combatants(), "Losing combatant should be removed."
     assert sample_meal2 in battle_model.get_combatants(), "Winning combatant should remain."
+
+####################
+# Random Prefetch
+###################
+
+def test_battle_uses_prefetched_random(sample_meal1, sample_meal2, mocker):
+    """Test that prepping the second combatant fetches the random number battle() then uses."""
+    mock_random = mocker.patch("meal_max.models.battle_model.get_random", return_value=0.5)
+    mocker.patch("meal_max.models.battle_model.record_battle_result")
+    battle_model = BattleModel(prefetch_random=True)
+
+    battle_model.prep_combatant(sample_meal1)
+    assert mock_random.call_count == 0, "Expected no fetch before both combatants are prepped."
+    battle_model.prep_combatant(sample_meal2)
+    battle_model._prefetch.result(timeout=5)
+
+    winner = battle_model.battle()
+
+    assert winner == sample_meal2.meal, "Expected the prefetched number to decide the battle."
+    assert mock_random.call_count == 1, f"Expected a single fetch, got {mock_random.call_count}."
+    stats = battle_model.get_prefetch_stats()
+    assert stats['hidden'] == 1 and stats['hidden_ratio'] == 1.0, f"Expected the fetch to be hidden: {stats}"
+
+def test_battle_waits_for_running_prefetch(sample_meal1, sample_meal2, mocker):
+    """Test that battle() waits for a prefetch still in flight instead of fetching again."""
+    release = threading.Event()
+
+    def slow_random():
+        release.wait(5)
+        return 0.5
+
+    mock_random = mocker.patch("meal_max.models.battle_model.get_random", side_effect=slow_random)
+    mocker.patch("meal_max.models.battle_model.record_battle_result")
+    battle_model = BattleModel(prefetch_random=True)
+    battle_model.prep_combatant(sample_meal1)
+    battle_model.prep_combatant(sample_meal2)
+
+    threading.Timer(0.05, release.set).start()
+    battle_model.battle()
+
+    stats = battle_model.get_prefetch_stats()
+    assert mock_random.call_count == 1, f"Expected a single fetch, got {mock_random.call_count}."
+    assert stats['waited'] == 1 and stats['wait_ms'] > 0, f"Expected battle() to wait on the prefetch: {stats}"
+
+def test_battle_refetches_after_failed_prefetch(sample_meal1, sample_meal2, mocker):
+    """Test that a failed prefetch falls back to fetching inside battle()."""
+    mock_random = mocker.patch("meal_max.models.battle_model.get_random",
+                               side_effect=[RuntimeError("random.org is down"), 0.5])
+    mocker.patch("meal_max.models.battle_model.record_battle_result")
+    battle_model = BattleModel(prefetch_random=True)
+    battle_model.prep_combatant(sample_meal1)
+    battle_model.prep_combatant(sample_meal2)
+
+    assert battle_model.battle() == sample_meal2.meal, "Expected the battle to use the refetched number."
+
+    stats = battle_model.get_prefetch_stats()
+    assert mock_random.call_count == 2, f"Expected the number to be fetched again, got {mock_random.call_count} calls."
+    assert stats['failed'] == 1 and stats['unprefetched'] == 1, f"Unexpected stats: {stats}"
+
+def test_clear_combatants_discards_prefetch(sample_meal1, sample_meal2, mocker):
+    """Test that clearing the combatants drops the prefetched number."""
+    mocker.patch("meal_max.models.battle_model.get_random", return_value=0.5)
+    battle_model = BattleModel(prefetch_random=True)
+    battle_model.prep_combatant(sample_meal1)
+    battle_model.prep_combatant(sample_meal2)
+
+    battle_model.clear_combatants()
+
+    stats = battle_model.get_prefetch_stats()
+    assert stats['discarded'] == 1 and not stats['pending'], f"Expected the prefetch to be discarded: {stats}"
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+from meal_max.utils.cache_utils import LRUCache, SingleFlight
+
+###############
+# LRU cache
+###############
+
+def test_lru_cache_hit_and_miss():
+    """Test that cached values are returned and counted as hits, absent ones as misses."""
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1, "Expected the cached value."
+    assert cache.get("b", "default") == "default", "Expected the default on a miss."
+
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses']) == (1, 1), f"Unexpected stats: {stats}"
+
+def test_lru_cache_evicts_least_recently_used():
+    """Test that the least recently used entry is evicted when the cache is full."""
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None, "Expected the least recently used entry to be evicted."
+    assert cache.get("a") == 1 and cache.get("c") == 3, "Expected the recently used entries to be kept."
+    assert cache.get_stats()['evictions'] == 1, "Expected one eviction."
+
+def test_lru_cache_ttl(mocker):
+    """Test that entries expire once their time to live has passed."""
+    clock = mocker.patch("meal_max.utils.cache_utils.time.monotonic", return_value=100.0)
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+
+    clock.return_value = 109.0
+    assert cache.get("a") == 1, "Expected the entry to be valid before its ttl."
+    clock.return_value = 110.0
+    assert cache.get("a") is None, "Expected the entry to expire at its ttl."
+    assert cache.get_stats()['expirations'] == 1, "Expected one expiration."
+
+def test_lru_cache_discard_where():
+    """Test that entries can be invalidated by value."""
+    cache = LRUCache(maxsize=4)
+    cache.set(("id", 1), "Pizza")
+    cache.set(("name", "Pizza"), "Pizza")
+    cache.set(("id", 2), "Sushi")
+
+    cache.discard_where(lambda value: value == "Pizza")
+
+    assert cache.get_stats()['size'] == 1, "Expected both keys of the invalidated value to be gone."
+    assert cache.get(("id", 2)) == "Sushi", "Expected other entries to be kept."
+
+def test_lru_cache_disabled():
+    """Test that a cache of size zero stores nothing."""
+    cache = LRUCache(maxsize=0)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None, "Expected nothing to be cached."
+
+def test_lru_cache_invalid_size():
+    """Test that a negative size is rejected."""
+    with pytest.raises(ValueError, match="Invalid cache size: -1"):
+        LRUCache(maxsize=-1)
+
+###############
+# Single flight
+###############
+
+def run_concurrently(flights, key, fn, callers):
+    """Starts callers threads calling flights.do(key, fn) and returns their results and errors."""
+    outcomes = []
+
+    def call():
+        try:
+            outcomes.append(flights.do(key, fn))
+        except Exception as e:
+            outcomes.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+def test_single_flight_collapses_concurrent_calls():
+    """Test that calls arriving while one is running share its result."""
+    flights = SingleFlight()
+    release = threading.Event()
+    executions = []
+
+    def slow():
+        executions.append(1)
+        release.wait(5)
+        return "result"
+
+    threads, outcomes = run_concurrently(flights, "key", slow, 5)
+    while flights.get_stats()['calls'] < 5:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes == ["result"] * 5, f"Expected every caller to get the result, got {outcomes}."
+    assert len(executions) == 1, "Expected a single execution."
+    stats = flights.get_stats()
+    assert (stats['executions'], stats['collapsed'], stats['in_flight']) == (1, 4, 0), f"Unexpected stats: {stats}"
+
+def test_single_flight_shares_errors():
+    """Test that callers collapsed into a failing call receive its exception."""
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("boom")
+
+    threads, outcomes = run_concurrently(flights, "key", failing, 3)
+    while flights.get_stats()['calls'] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(outcomes) == 3 and all(isinstance(e, ValueError) for e in outcomes), f"Unexpected outcomes: {outcomes}"
+
+def test_single_flight_does_not_cache():
+    """Test that sequential calls each run the function."""
+    flights = SingleFlight()
+    calls = []
+
+    flights.do("key", calls.append, 1)
+    flights.do("key", calls.append, 2)
+
+    assert calls == [1, 2], "Expected both calls to run."
@@ -1,19 +1,33 @@
 from contextlib import contextmanager
+from pathlib import Path
 import re
 import sqlite3
-import pytest
+import threading
+import time
 
+import pytest
 
+from meal_max.models import kitchen_model
 from meal_max.models.kitchen_model import (
+    _build_leaderboard_query,
+    BattleStatsBuffer,
+    clear_meal_caches,
+    get_data_version,
+    LeaderboardSnapshots,
     Meal,
     create_meal,
+    create_meals,
     clear_meals,
     delete_meal,
+    encode_leaderboard_cursor,
     get_leaderboard,
     get_meal_by_id,
     get_meal_by_name,
+    iter_meal_batches,
+    record_battle_result,
     update_meal_stats
 )
+from meal_max.utils.sql_utils import apply_migrations
 
 ###############
 # Fixtures
@@ -23,6 +37,13 @@ def normalize_whitespace(sql_query: str) -> str:
     return re.sub(r'\s+', ' ', sql_query).strip()
 
 
+@pytest.fixture(autouse=True)
+def empty_meal_caches():
+    """Start every test without cached meal lookups from earlier tests."""
+    clear_meal_caches()
+    yield
+    clear_meal_caches()
+
 # mock db connection for tests
 @pytest.fixture
 def mock_cursor(mocker):
@@ -119,59 +140,110 @@ def test_create_meal_invalid_difficulty():
     with pytest.raises(ValueError, match="Invalid difficulty level: 5. Must be 'LOW', 'MED', or 'HIGH'."):
         create_meal(meal="Pizza", cuisine="Italian", price=10.0, difficulty=5)
 
-def test_clear_meals(mock_cursor, mocker):
+def test_create_meals(sqlite_db):
+    """Test bulk creation writes valid rows and reports invalid and duplicate ones by index."""
+    create_meal(meal="Pizza", cuisine="Italian", price=10.0, difficulty="MED")
+
+    report = create_meals([
+        {"meal": "Sushi", "cuisine": "Japanese", "price": 15.0, "difficulty": "HIGH"},
+        {"meal": "Pizza", "cuisine": "Italian", "price": 12.0, "difficulty": "MED"},
+        {"meal": "Taco", "cuisine": "Mexican", "price": -1, "difficulty": "LOW"},
+        {"meal": "Pho", "cuisine": "Vietnamese", "price": 9.0, "difficulty": "EASY"},
+        {"meal": "Burger", "cuisine": "American", "price": 8.0, "difficulty": "LOW"},
+        {"meal": "Burger", "cuisine": "American", "price": 9.0, "difficulty": "LOW"},
+    ], chunk_size=4)
+
+    assert report["created"] == 2 and report["updated"] == 0, f"Unexpected counts: {report}"
+    errors = {error["index"]: error["error"] for error in report["errors"]}
+    assert errors == {
+        1: "Meal with name 'Pizza' already exists",
+        2: "Invalid price: -1. Price must be a positive number.",
+        3: "Invalid difficulty level: EASY. Must be 'LOW', 'MED', or 'HIGH'.",
+        5: "Meal with name 'Burger' already exists",
+    }, f"Unexpected errors: {errors}"
+
+    names = [row[0] for row in sqlite_db.execute("SELECT meal FROM meals ORDER BY id")]
+    assert names == ["Pizza", "Sushi", "Burger"], f"Unexpected meals: {names}"
+
+def test_create_meals_rejects_boolean_price(sqlite_db):
+    """Test that a boolean price is rejected as not a number rather than for its decimal places."""
+    report = create_meals([{"meal": "Pizza", "cuisine": "Italian", "price": True, "difficulty": "MED"}])
+
+    assert report["created"] == 0, f"Unexpected counts: {report}"
+    assert report["errors"][0]["error"] == "Invalid price: True. Price must be a positive number.", \
+        f"Unexpected errors: {report['errors']}"
+
+def test_create_meals_upsert(sqlite_db):
+    """Test that upsert overwrites existing meals and counts them as updated."""
+    create_meal(meal="Pizza", cuisine="Italian", price=10.0, difficulty="MED")
+
+    report = create_meals([
+        {"meal": "Pizza", "cuisine": "Neapolitan", "price": 12.5, "difficulty": "HIGH"},
+        {"meal": "Sushi", "cuisine": "Japanese", "price": 15.0, "difficulty": "HIGH"},
+    ], upsert=True)
+
+    assert report == {"created": 1, "updated": 1, "errors": []}, f"Unexpected report: {report}"
+    row = sqlite_db.execute("SELECT cuisine, price, difficulty FROM meals WHERE meal = 'Pizza'").fetchone()
+    assert row == ("Neapolitan", 12.5, "HIGH"), f"Expected Pizza to be overwritten, got {row}"
+
+def test_create_meals_uses_executemany(mock_cursor):
+    """Test that each chunk is written with one executemany and one commit."""
+    mock_cursor.rowcount = 2
+
+    create_meals([
+        {"meal": "Sushi", "cuisine": "Japanese", "price": 15.0, "difficulty": "HIGH"},
+        {"meal": "Pizza", "cuisine": "Italian", "price": 10.0, "difficulty": "MED"},
+    ])
+
+    mock_cursor.executemany.assert_called_once()
+    assert mock_cursor.executemany.call_args[0][1] == [
+        ("Sushi", "Japanese", 15.0, "HIGH"),
+        ("Pizza", "Italian", 10.0, "MED"),
+    ], "Expected the valid rows to be passed to executemany in order."
+
+def test_clear_meals(mock_cursor):
     """Testing the clearing of all meals from the table"""
-    
-    # mocking the file reading
-    mocker.patch.dict('os.environ', {'SQL_CREATE_TABLE_PATH': 'sql/create_table.sql'})
-    mock_open = mocker.patch('builtins.open', mocker.mock_open(read_data="The body of the create statement"))
 
     # Call the clear_meals function
     clear_meals()
 
-    # Ensure the file was opened using the environment variable's path
-    mock_open.assert_called_once_with('sql/create_table.sql', 'r')
-
-    # Verify that the correct SQL script was executed
-    mock_cursor.executescript.assert_called_once()
+    # Verify that the rows were deleted and the id sequence reset, without dropping the table
+    expected_queries = [
+        "DELETE FROM meals",
+        "DELETE FROM sqlite_sequence WHERE name = 'meals'",
+    ]
+    actual_queries = [normalize_whitespace(call[0][0]) for call in mock_cursor.execute.call_args_list]
+    assert actual_queries == expected_queries, f"Expected {expected_queries}, got {actual_queries}"
+    mock_cursor.executescript.assert_not_called()
 
 
 def test_delete_meal(mock_cursor): 
     """Test soft deleting a meal from the database by meal ID."""
 
-    # Simulate that the meal exists (id = 1)
-    mock_cursor.fetchone.return_value = ([False])
+    # Simulate that the UPDATE matched the meal (id = 1)
+    mock_cursor.rowcount = 1
 
     # Call the delete_meal function
     delete_meal(1)
 
-    # Normalize the SQL for both queries (SELECT and UPDATE)
-    expected_select_sql = normalize_whitespace("SELECT deleted FROM meals WHERE id = ?")
-    expected_update_sql = normalize_whitespace("UPDATE meals SET deleted = TRUE WHERE id = ?")
+    # The conditional UPDATE is the only statement; there is no pre-read
+    expected_update_sql = normalize_whitespace("UPDATE meals SET deleted = TRUE WHERE id = ? AND deleted = FALSE")
+    assert mock_cursor.execute.call_count == 1, "Expected a single UPDATE without a preceding SELECT."
 
-    # Access both calls to `execute()` using `call_args_list`
-    actual_select_sql = normalize_whitespace(mock_cursor.execute.call_args_list[0][0][0])
-    actual_update_sql = normalize_whitespace(mock_cursor.execute.call_args_list[1][0][0])
-
-    # Ensure the correct SQL queries were executed
-    assert actual_select_sql == expected_select_sql, "The SELECT query did not match the expected structure."
+    actual_update_sql = normalize_whitespace(mock_cursor.execute.call_args[0][0])
     assert actual_update_sql == expected_update_sql, "The UPDATE query did not match the expected structure."
 
-    # Ensure the correct arguments were used in both SQL queries
-    expected_select_args = (1,)
+    # Ensure the correct arguments were used in the SQL query
     expected_update_args = (1,)
-
-    actual_select_args = mock_cursor.execute.call_args_list[0][0][1]
-    actual_update_args = mock_cursor.execute.call_args_list[1][0][1]
-
-    assert actual_select_args == expected_select_args, f"The SELECT query arguments did not match. Expected {expected_select_args}, got {actual_select_args}."
+    actual_update_args = mock_cursor.execute.call_args[0][1]
     assert actual_update_args == expected_update_args, f"The UPDATE query arguments did not match. Expected {expected_update_args}, got {actual_update_args}."
 
 
 def test_delete_meal_bad_id(mock_cursor):
     """Test error when trying to delete a non-existent meal."""
 
-    # Simulate that no meal exists with the given ID
+    # Simulate that the UPDATE matched nothing and no meal exists with the given ID
+    mock_cursor.rowcount = 0
     mock_cursor.fetchone.return_value = None
 
     # Expect a ValueError when attempting to delete a non-existent meal
@@ -182,7 +254,8 @@ def test_delete_meal_bad_id(mock_cursor):
 def test_delete_meal_already_deleted(mock_cursor):
     """Test error when trying to delete a meal that's already marked as deleted."""
 
-    # Simulate that the meal exists but is already marked as deleted
+    # Simulate that the UPDATE matched nothing because the meal is already marked as deleted
+    mock_cursor.rowcount = 0
     mock_cursor.fetchone.return_value = ([True])
 
     # Expect a ValueError when attempting to delete a meal that's already been deleted
@@ -288,6 +361,156 @@ def test_get_meal_by_name_deleted(mock_cursor):
     with pytest.raises(ValueError, match="Meal with name Pizza has been deleted"):
         get_meal_by_name("Pizza")
 
+def test_get_meal_by_id_cached(mock_cursor):
+    """Test that a meal looked up once is served from the cache under both its id and its name."""
+    mock_cursor.fetchone.return_value = (1, "Pizza", "Italian", 10.0, "MED", False)
+
+    first = get_meal_by_id(1)
+    assert get_meal_by_id(1) == first, "Expected the cached meal to be returned."
+    assert get_meal_by_name("Pizza") == first, "Expected the meal to be cached under its name too."
+
+    assert mock_cursor.execute.call_count == 1, "Expected a single query for three lookups."
+
+def test_get_meal_cache_invalidated_by_delete(mock_cursor):
+    """Test that deleting a meal drops it from the cache so the next lookup sees the deletion."""
+    mock_cursor.fetchone.return_value = (1, "Pizza", "Italian", 10.0, "MED", False)
+    get_meal_by_name("Pizza")
+
+    mock_cursor.rowcount = 1
+    delete_meal(1)
+
+    mock_cursor.fetchone.return_value = (1, "Pizza", "Italian", 10.0, "MED", True)
+    with pytest.raises(ValueError, match="Meal with name Pizza has been deleted"):
+        get_meal_by_name("Pizza")
+    with pytest.raises(ValueError, match="Meal with ID 1 has been deleted"):
+        get_meal_by_id(1)
+
+def test_get_meal_cache_invalidated_by_clear(mock_cursor):
+    """Test that clearing the meals empties the cache."""
+    mock_cursor.fetchone.return_value = (1, "Pizza", "Italian", 10.0, "MED", False)
+    get_meal_by_id(1)
+
+    clear_meals()
+
+    mock_cursor.fetchone.return_value = None
+    with pytest.raises(ValueError, match="Meal with ID 1 not found"):
+        get_meal_by_id(1)
+
+def test_get_meal_cache_invalidated_by_upsert(sqlite_db):
+    """Test that meals overwritten by an upsert are not served stale from the cache."""
+    create_meal(meal="Pizza", cuisine="Italian", price=10.0, difficulty="MED")
+    get_meal_by_name("Pizza")
+
+    create_meals([{"meal": "Pizza", "cuisine": "Neapolitan", "price": 12.0, "difficulty": "HIGH"}], upsert=True)
+
+    assert get_meal_by_name("Pizza").cuisine == "Neapolitan", "Expected the upserted values."
+
+def test_get_meal_cache_checks_data_version(sqlite_db):
+    """Test that a caller passing the data version does not get meals cached before another process wrote."""
+    create_meal(meal="Pizza", cuisine="Italian", price=10.0, difficulty="MED")
+    get_meal_by_id(1, version=get_data_version())
+    with pytest.raises(ValueError, match="not found"):
+        get_meal_by_name("Taco", version=get_data_version())
+
+    # Written behind kitchen_model's back, as another worker or tool would
+    sqlite_db.execute("UPDATE meals SET cuisine = 'Neapolitan' WHERE id = 1")
+    sqlite_db.execute("INSERT INTO meals (meal, cuisine, price, difficulty) VALUES ('Taco', 'Mexican', 3.0, 'LOW')")
+    sqlite_db.commit()
+
+    version = get_data_version()
+    assert get_meal_by_id(1, version=version).cuisine == "Neapolitan", "Expected the meal to be read again."
+    assert get_meal_by_name("Taco", version=version).cuisine == "Mexican", "Expected the unknown name to be looked up again."
+    assert get_meal_by_id(1, version=version) is get_meal_by_id(1, version=version), \
+        "Expected meals cached at the current version to be served from the cache."
+
+def test_get_meal_by_name_unknown_name_cached(mock_cursor):
+    """Test that a name that was not found is answered from the negative cache the next time."""
+    mock_cursor.fetchone.return_value = None
+
+    for _ in range(3):
+        with pytest.raises(ValueError, match="Meal with name Ghost not found"):
+            get_meal_by_name("Ghost")
+
+    assert mock_cursor.execute.call_count == 1, "Expected repeated misses to skip the database."
+
+def test_get_meal_by_name_deleted_not_negatively_cached(mock_cursor):
+    """Test that deleted meals are not mistaken for unknown names."""
+    mock_cursor.fetchone.return_value = (1, "Pizza", "Italian", 10.0, "MED", True)
+
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Meal with name Pizza has been deleted"):
+            get_meal_by_name("Pizza")
+
+    assert mock_cursor.execute.call_count == 2, "Expected deleted meals to be looked up every time."
+
+def test_negative_cache_invalidated_by_create_meal(sqlite_db):
+    """Test that a name cached as unknown is found once the meal is created."""
+    with pytest.raises(ValueError, match="not found"):
+        get_meal_by_name("Pizza")
+
+    create_meal(meal="Pizza", cuisine="Italian", price=10.0, difficulty="MED")
+
+    assert get_meal_by_name("Pizza").cuisine == "Italian", "Expected the new meal to be found."
+
+def test_negative_cache_invalidated_by_create_meals(sqlite_db):
+    """Test that names cached as unknown are found once they are bulk created."""
+    with pytest.raises(ValueError, match="not found"):
+        get_meal_by_name("Pizza")
+
+    create_meals([{"meal": "Pizza", "cuisine": "Italian", "price": 10.0, "difficulty": "MED"}])
+
+    assert get_meal_by_name("Pizza").cuisine == "Italian", "Expected the new meal to be found."
+
+def test_data_version_bumped_by_writes(sqlite_db):
+    """Test that every write path changes the data version and reads do not."""
+    versions = [get_data_version()]
+
+    create_meal(meal="Pizza", cuisine="Italian", price=10.0, difficulty="MED")
+    versions.append(get_data_version())
+    create_meals([{"meal": "Taco", "cuisine": "Mexican", "price": 3.0, "difficulty": "LOW"}])
+    versions.append(get_data_version())
+    record_battle_result(1, 2)
+    versions.append(get_data_version())
+    update_meal_stats(1, "win")
+    versions.append(get_data_version())
+    get_leaderboard()
+    get_meal_by_id(1)
+    assert get_data_version() == versions[-1], "Expected reads to leave the version alone."
+    delete_meal(2)
+    versions.append(get_data_version())
+    clear_meals()
+    versions.append(get_data_version())
+
+    assert versions == sorted(set(versions)), f"Expected every write to bump the version, got {versions}."
+
+def test_data_version_unchanged_by_failed_write(sqlite_db):
+    """Test that a write that is rolled back does not change the data version."""
+    version = get_data_version()
+
+    with pytest.raises(ValueError, match="not found"):
+        delete_meal(1)
+
+    assert get_data_version() == version, "Expected the version to be unchanged."
+
+def test_data_version_sees_other_writers(sqlite_db):
+    """Test that writes made outside kitchen_model, as by another process, change the data version."""
+    create_meal(meal="Pizza", cuisine="Italian", price=10.0, difficulty="MED")
+    version = get_data_version()
+
+    sqlite_db.execute("UPDATE meals SET battles = battles + 1, wins = wins + 1 WHERE meal = 'Pizza'")
+    sqlite_db.commit()
+
+    assert get_data_version() > version, "Expected the trigger-maintained version to change."
+
+def test_database_id_kept_across_writes(sqlite_db):
+    """Test that the database id is random per database and unchanged by writes."""
+    database_id = get_data_version()[0]
+
+    create_meal(meal="Pizza", cuisine="Italian", price=10.0, difficulty="MED")
+
+    assert re.fullmatch(r"[0-9a-f]{12}", database_id), f"Unexpected id: {database_id}"
+    assert get_data_version()[0] == database_id, "Expected the id to survive writes."
+
 def test_get_leaderboard(mock_cursor):
     """Test getting the leaderboard from the database."""
     
@@ -313,7 +536,7 @@ def test_get_leaderboard(mock_cursor):
     # Ensure the SQL query was executed correctly
     expected_query = normalize_whitespace("""
         SELECT id, meal, cuisine, price, difficulty, battles, wins, (wins * 1.0 / battles) AS win_pct
-        FROM meals WHERE deleted = false AND battles > 0 ORDER BY wins DESC
+        FROM meals WHERE deleted = false AND battles > 0 ORDER BY wins DESC, id DESC
     """)
     actual_query = normalize_whitespace(mock_cursor.execute.call_args[0][0])
 
@@ -334,7 +557,7 @@ def test_get_leaderboard_no_meals(mock_cursor):
     # Ensure the SQL query was executed correctly
     expected_query = normalize_whitespace("""
         SELECT id, meal, cuisine, price, difficulty, battles, wins, (wins * 1.0 / battles) AS win_pct
-        FROM meals WHERE deleted = false AND battles > 0 ORDER BY wins DESC
+        FROM meals WHERE deleted = false AND battles > 0 ORDER BY wins DESC, id DESC
     """)
     actual_query = normalize_whitespace(mock_cursor.execute.call_args[0][0])
 
@@ -366,7 +589,7 @@ def test_get_leaderboard_sort_by_win_pct(mock_cursor):
     # Ensure the SQL query was executed correctly
     expected_query = normalize_whitespace("""
         SELECT id, meal, cuisine, price, difficulty, battles, wins, (wins * 1.0 / battles) AS win_pct
-        FROM meals WHERE deleted = false AND battles > 0 ORDER BY win_pct DESC
+        FROM meals WHERE deleted = false AND battles > 0 ORDER BY win_pct DESC, id DESC
     """)
     actual_query = normalize_whitespace(mock_cursor.execute.call_args[0][0])
 
@@ -378,6 +601,131 @@ def test_get_leaderboard_invalid_sort_by(mock_cursor):
     with pytest.raises(ValueError, match="Invalid sort_by parameter: invalid_sort"):
         get_leaderboard(sort_by="invalid_sort")
 
+def test_get_leaderboard_limit(mock_cursor):
+    """Test that a limit is passed to the query as a bound parameter."""
+    get_leaderboard(limit=50)
+
+    expected_query = normalize_whitespace("""
+        SELECT id, meal, cuisine, price, difficulty, battles, wins, (wins * 1.0 / battles) AS win_pct
+        FROM meals WHERE deleted = false AND battles > 0 ORDER BY wins DESC, id DESC LIMIT ?
+    """)
+    assert normalize_whitespace(mock_cursor.execute.call_args[0][0]) == expected_query, "The SQL query did not match the expected structure."
+    assert mock_cursor.execute.call_args[0][1] == [50], "Expected the limit to be bound."
+
+def test_get_leaderboard_invalid_limit(mock_cursor):
+    """Test handling of a non-positive limit."""
+    with pytest.raises(ValueError, match="Invalid limit parameter: 0"):
+        get_leaderboard(limit=0)
+
+@pytest.mark.parametrize("sort_by", ["wins", "win_pct"])
+def test_get_leaderboard_pages(sqlite_db, sort_by):
+    """Test that following cursors walks the whole leaderboard once, in order, with ties broken by id."""
+    sqlite_db.executemany(
+        "INSERT INTO meals (meal, cuisine, price, difficulty, battles, wins) VALUES (?, ?, ?, ?, ?, ?)",
+        [(f"Meal {i}", "Italian", 10.0, "MED", 3 + i % 4, i % 3) for i in range(23)]
+    )
+    full = get_leaderboard(sort_by)
+
+    pages, after = [], None
+    while True:
+        page = get_leaderboard(sort_by, limit=5, after=after)
+        pages.extend(page)
+        if len(page) < 5:
+            break
+        after = encode_leaderboard_cursor(page[-1], sort_by)
+
+    assert pages == full, "Expected the pages to concatenate to the full leaderboard."
+    assert len(full) == 23, f"Expected every battled meal to be listed, got {len(full)}."
+
+def test_get_leaderboard_cursor_sort_mismatch(mock_cursor):
+    """Test that a cursor from one sort mode cannot be used with the other."""
+    entry = {"id": 1, "battles": 5, "wins": 3}
+    cursor = encode_leaderboard_cursor(entry, "wins")
+
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        get_leaderboard("win_pct", limit=5, after=cursor)
+
+def test_get_leaderboard_garbage_cursor(mock_cursor):
+    """Test that a malformed cursor is rejected."""
+    with pytest.raises(ValueError, match="Invalid cursor: not-a-cursor"):
+        get_leaderboard("wins", limit=5, after="not-a-cursor")
+
+@pytest.mark.parametrize("sort_by, index_name", [
+    ("wins", "idx_meals_leaderboard_wins"),
+    ("win_pct", "idx_meals_leaderboard_win_pct"),
+])
+def test_get_leaderboard_uses_index(sort_by, index_name):
+    """Test that both leaderboard sort modes are served by an index walk instead of a scan and sort."""
+    conn = sqlite3.connect(":memory:")
+    apply_migrations(conn, migrations_path=str(Path(__file__).parents[2] / "sql" / "migrations"))
+
+    plan = " ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + _build_leaderboard_query(sort_by)))
+    paged_plan = " ".join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN " + _build_leaderboard_query(sort_by, limit=50, paged=True), (1, 1, 1, 50)
+    ))
+    conn.close()
+
+    assert f"USING INDEX {index_name}" in plan, f"Expected the query to use {index_name}, got plan: {plan}"
+    assert "TEMP B-TREE" not in plan, f"Expected no separate sort step, got plan: {plan}"
+    assert f"SEARCH meals USING INDEX {index_name}" in paged_plan, f"Expected later pages to seek into the index, got plan: {paged_plan}"
+    assert "TEMP B-TREE" not in paged_plan, f"Expected no separate sort step, got plan: {paged_plan}"
+
+
+###############
+# Export
+###############
+
+def test_iter_meal_batches(sqlite_db):
+    """Test that the catalog is streamed in id order in batches of the requested size."""
+    create_meals([
+        {"meal": f"Meal {i}", "cuisine": "Italian", "price": 10.0, "difficulty": "MED"} for i in range(5)
+    ])
+    delete_meal(2)
+
+    batches = list(iter_meal_batches(batch_size=2))
+
+    assert [len(batch) for batch in batches] == [2, 2], f"Unexpected batch sizes: {[len(b) for b in batches]}"
+    assert [meal["id"] for batch in batches for meal in batch] == [1, 3, 4, 5], "Expected live meals in id order."
+    assert batches[0][0] == {
+        "id": 1, "meal": "Meal 0", "cuisine": "Italian", "price": 10.0, "difficulty": "MED",
+        "battles": 0, "wins": 0, "deleted": False
+    }, f"Unexpected row: {batches[0][0]}"
+
+def test_iter_meal_batches_include_deleted(sqlite_db):
+    """Test that soft-deleted meals are exported only when asked for."""
+    create_meal(meal="Pizza", cuisine="Italian", price=10.0, difficulty="MED")
+    delete_meal(1)
+
+    assert list(iter_meal_batches()) == [], "Expected deleted meals to be skipped by default."
+    meals = [meal for batch in iter_meal_batches(include_deleted=True) for meal in batch]
+    assert [meal["deleted"] for meal in meals] == [True], "Expected the deleted meal to be included."
+
+def test_iter_meal_batches_releases_connection_between_batches(mock_cursor, mocker):
+    """Test that every batch is read by keyset on its own connection, released before it is yielded."""
+    mock_cursor.fetchall.side_effect = [
+        [(1, "Pizza", "Italian", 10.0, "MED", 0, 0, 0), (4, "Taco", "Mexican", 3.0, "LOW", 0, 0, 0)],
+        [(7, "Sushi", "Japanese", 15.0, "HIGH", 0, 0, 0)]
+    ]
+    held = []
+    original = kitchen_model.get_db_connection
+
+    @contextmanager
+    def tracking_get_db_connection():
+        held.append(True)
+        with original() as conn:
+            yield conn
+        held.pop()
+
+    mocker.patch("meal_max.models.kitchen_model.get_db_connection", tracking_get_db_connection)
+
+    batches = []
+    for batch in iter_meal_batches(batch_size=2):
+        assert not held, "Expected no connection to be held while a batch is consumed."
+        batches.append(batch)
+
+    assert [meal["id"] for batch in batches for meal in batch] == [1, 4, 7], "Expected every meal once."
+    assert [call.args[1] for call in mock_cursor.execute.call_args_list] == [(0, 2), (4, 2)], \
+        "Expected each batch to resume after the last id served."
 
 ###############
 # Update stats
@@ -449,3 +797,243 @@ def test_update_meal_stats_deleted(mock_cursor):
     # Expect a ValueError when attempting to update a deleted song
     with pytest.raises(ValueError, match="Meal with ID 1 has been deleted"):
         update_meal_stats(1, "win")
+
+
+def test_record_battle_result(mock_cursor):
+    """Test recording a battle updates both meals with conditional UPDATEs and one commit."""
+    mock_cursor.rowcount = 1
+
+    record_battle_result(2, 1)
+
+    expected_query = normalize_whitespace(
+        "UPDATE meals SET battles = battles + 1, wins = wins + ? WHERE id = ? AND deleted = FALSE"
+    )
+    calls = mock_cursor.execute.call_args_list
+    assert len(calls) == 2, f"Expected two UPDATEs and no SELECT, got {len(calls)} statements."
+    assert all(normalize_whitespace(call[0][0]) == expected_query for call in calls), "The UPDATE query did not match the expected structure."
+    assert [call[0][1] for call in calls] == [(1, 2), (0, 1)], "Expected the winner to gain a win and the loser none."
+
+def test_record_battle_result_deleted(mock_cursor):
+    """Test that recording a battle for a deleted meal raises and writes nothing."""
+    mock_cursor.rowcount = 0
+    mock_cursor.fetchone.return_value = [True]
+
+    with pytest.raises(ValueError, match="Meal with ID 2 has been deleted"):
+        record_battle_result(2, 1)
+
+def test_record_battle_result_not_found(mock_cursor):
+    """Test that recording a battle for a missing meal raises a ValueError."""
+    mock_cursor.rowcount = 0
+    mock_cursor.fetchone.return_value = None
+
+    with pytest.raises(ValueError, match="Meal with ID 999 not found"):
+        record_battle_result(999, 1)
+
+
+###############
+# Write-behind stats
+###############
+
+def test_stats_buffer_coalesces_per_meal(mock_cursor):
+    """Test that buffered battles are summed per meal and written with one executemany."""
+    mock_cursor.rowcount = 3
+    buffer = BattleStatsBuffer(flush_interval_ms=60000, max_events=100)
+
+    buffer.record(1, 2)
+    buffer.record(1, 3)
+    buffer.record(2, 1)
+    written = buffer.flush()
+    buffer.stop()
+
+    assert written == 3, f"Expected three meals to be written, got {written}."
+    expected_query = normalize_whitespace(
+        "UPDATE meals SET battles = battles + ?, wins = wins + ? WHERE id = ? AND deleted = FALSE"
+    )
+    actual_query = normalize_whitespace(mock_cursor.executemany.call_args[0][0])
+    assert actual_query == expected_query, "The UPDATE query did not match the expected structure."
+
+    rows = sorted(mock_cursor.executemany.call_args[0][1], key=lambda row: row[2])
+    assert rows == [(3, 2, 1), (2, 1, 2), (1, 0, 3)], f"Unexpected coalesced deltas: {rows}"
+    mock_cursor.executemany.assert_called_once()
+
+def test_stats_buffer_keeps_deltas_on_failure(mock_cursor):
+    """Test that deltas survive a failed flush and are written by the next one."""
+    buffer = BattleStatsBuffer(flush_interval_ms=60000, max_events=100)
+    buffer.record(1, 2)
+
+    mock_cursor.executemany.side_effect = sqlite3.OperationalError("database is locked")
+    with pytest.raises(sqlite3.OperationalError):
+        buffer.flush()
+    assert buffer.get_stats()['pending_meals'] == 2, "Expected the failed deltas to be kept."
+
+    mock_cursor.executemany.side_effect = None
+    mock_cursor.rowcount = 2
+    buffer.stop()
+    assert buffer.get_stats()['pending_meals'] == 0, "Expected stop() to flush the kept deltas."
+
+def test_stats_buffer_flushes_at_max_events(mock_cursor):
+    """Test that reaching max_events wakes the flusher before the interval elapses."""
+    mock_cursor.rowcount = 2
+    buffer = BattleStatsBuffer(flush_interval_ms=60000, max_events=2)
+    flushed = threading.Event()
+    mock_cursor.executemany.side_effect = lambda *args: flushed.set()
+
+    buffer.record(1, 2)
+    buffer.record(2, 1)
+
+    assert flushed.wait(5), "Expected the flusher to run once max_events was reached."
+    buffer.stop()
+
+@pytest.fixture
+def buffered_db(sqlite_db, mocker):
+    """Fixture to buffer battles on top of three meals: Pizza 2/2, Taco 1/2 and an untried Sushi."""
+    for meal, cuisine in (("Pizza", "Italian"), ("Taco", "Mexican"), ("Sushi", "Japanese")):
+        create_meal(meal=meal, cuisine=cuisine, price=10.0, difficulty="MED")
+    sqlite_db.execute("UPDATE meals SET battles = 2, wins = 2 WHERE id = 1")
+    sqlite_db.execute("UPDATE meals SET battles = 2, wins = 1 WHERE id = 2")
+    sqlite_db.commit()
+
+    buffer = BattleStatsBuffer(flush_interval_ms=60000, max_events=100)
+    mocker.patch("meal_max.models.kitchen_model._stats_buffer", buffer)
+    yield buffer
+    buffer.stop()
+
+def test_leaderboard_merges_buffered_battles(buffered_db, sqlite_db):
+    """Test that the leaderboard ranks buffered battles without flushing them."""
+    record_battle_result(3, 1)
+
+    page = get_leaderboard("win_pct", limit=2)
+    assert [(entry['meal'], entry['battles'], entry['wins'], entry['win_pct']) for entry in page] == [
+        ("Sushi", 1, 1, 100.0), ("Pizza", 3, 2, 66.7)
+    ], f"Unexpected first page: {page}"
+    rest = get_leaderboard("win_pct", limit=2, after=encode_leaderboard_cursor(page[-1], "win_pct"))
+    assert [entry['meal'] for entry in rest] == ["Taco"], f"Unexpected second page: {rest}"
+    by_wins = get_leaderboard("wins")
+    assert [entry['meal'] for entry in by_wins] == ["Pizza", "Sushi", "Taco"], f"Unexpected order: {by_wins}"
+
+    assert buffered_db.get_stats()['flushes'] == 0, "Expected reads not to flush the buffer."
+    row = sqlite_db.execute("SELECT battles, wins FROM meals WHERE id = 1").fetchone()
+    assert row == (2, 2), f"Expected the battle to still be buffered, got {row}"
+
+def test_clear_meals_discards_buffered_battles(buffered_db, sqlite_db):
+    """Test that outcomes buffered before clear_meals are not credited to meals reusing the ids."""
+    for _ in range(5):
+        record_battle_result(1, 2)
+
+    clear_meals()
+    create_meal(meal="Curry", cuisine="Indian", price=10.0, difficulty="MED")
+    create_meal(meal="Ramen", cuisine="Japanese", price=10.0, difficulty="MED")
+
+    assert get_leaderboard("wins") == [], "Expected the new meals to have no battles."
+    buffered_db.flush()
+    rows = sqlite_db.execute("SELECT id, battles, wins FROM meals ORDER BY id").fetchall()
+    assert rows == [(1, 0, 0), (2, 0, 0)], f"Expected the cleared outcomes to be dropped, got {rows}"
+
+def test_leaderboard_retries_when_flush_lands_mid_read(buffered_db, mocker):
+    """Test that a flush committing during a read does not count its battles twice."""
+    record_battle_result(3, 1)
+    select = kitchen_model._select_leaderboard
+
+    def flush_then_select(*args):
+        if buffered_db.get_stats()['flushes'] == 0:
+            buffered_db.flush()
+        return select(*args)
+
+    mocker.patch("meal_max.models.kitchen_model._select_leaderboard", side_effect=flush_then_select)
+    leaderboard = get_leaderboard("wins")
+
+    assert [(entry['meal'], entry['battles'], entry['wins']) for entry in leaderboard] == [
+        ("Pizza", 3, 2), ("Sushi", 1, 1), ("Taco", 2, 1)
+    ], f"Expected the flushed battle to be counted once, got {leaderboard}"
+
+###############
+# Leaderboard snapshots
+###############
+
+@pytest.fixture
+def leaderboard_db(sqlite_db):
+    """Fixture to provide two meals that have fought one battle."""
+    create_meal(meal="Pizza", cuisine="Italian", price=10.0, difficulty="MED")
+    create_meal(meal="Taco", cuisine="Mexican", price=3.0, difficulty="LOW")
+    record_battle_result(1, 2)
+    return sqlite_db
+
+def test_leaderboard_snapshot_fresh(leaderboard_db, mocker):
+    """Test that a snapshot at the current data version is served without a query."""
+    snapshots = LeaderboardSnapshots(max_staleness_ms=60000)
+    first = snapshots.get("wins")
+    spy = mocker.spy(kitchen_model, "get_leaderboard")
+
+    version, entries = snapshots.get("wins")
+
+    assert (version, entries) == first and version == get_data_version(), "Expected the current snapshot."
+    assert spy.call_count == 0, "Expected no query for a fresh snapshot."
+
+def test_leaderboard_snapshot_stale_while_revalidate(leaderboard_db):
+    """Test that an outdated snapshot is served immediately and rebuilt in the background."""
+    snapshots = LeaderboardSnapshots(max_staleness_ms=60000)
+    old_version, _ = snapshots.get("wins")
+    record_battle_result(2, 1)
+    record_battle_result(2, 1)
+
+    version, entries = snapshots.get("wins")
+    assert version == old_version and entries[0]['meal'] == "Pizza", "Expected the stale snapshot."
+
+    for _ in range(500):
+        if snapshots.get_stats()['refreshes']:
+            break
+        time.sleep(0.01)
+    snapshots.stop()
+
+    version, entries = snapshots.get("wins")
+    assert version == get_data_version() and entries[0]['meal'] == "Taco", "Expected the refreshed snapshot."
+    stats = snapshots.get_stats()
+    assert (stats['stale'], stats['refreshes']) == (1, 1), f"Unexpected stats: {stats}"
+
+def test_leaderboard_snapshot_too_stale(leaderboard_db, mocker):
+    """Test that a snapshot older than max_staleness_ms is rebuilt before returning."""
+    clock = mocker.patch("meal_max.models.kitchen_model.time.monotonic", return_value=100.0)
+    snapshots = LeaderboardSnapshots(max_staleness_ms=500)
+    snapshots.get("wins")
+    record_battle_result(2, 1)
+    record_battle_result(2, 1)
+    clock.return_value = 100.6
+
+    version, entries = snapshots.get("wins")
+
+    assert version == get_data_version() and entries[0]['meal'] == "Taco", "Expected a rebuilt snapshot."
+    assert snapshots.get_stats()['rebuilt'] == 2, "Expected both reads to query."
+
+###############
+# Read coalescing
+###############
+
+def test_get_leaderboard_coalesces_concurrent_calls(mocker):
+    """Test that identical concurrent leaderboard reads share one query."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_query(sort_by, limit, cursor):
+        started.set()
+        release.wait(5)
+        return [{'id': 1}]
+
+    mocker.patch("meal_max.models.kitchen_model._query_leaderboard", side_effect=slow_query)
+    collapsed_before = kitchen_model.get_read_coalescing_stats()['collapsed']
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_leaderboard("win_pct"))) for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while kitchen_model.get_read_coalescing_stats()['collapsed'] - collapsed_before < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    collapsed = kitchen_model.get_read_coalescing_stats()['collapsed'] - collapsed_before
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert collapsed == 3, f"Timed out waiting for the followers to join the leader's read, {collapsed} joined."
+    assert results == [[{'id': 1}]] * 4, f"Expected every caller to get the result, got {results}."
+    assert kitchen_model._query_leaderboard.call_count == 1, "Expected a single query."
@@ -0,0 +1,124 @@
+import io
+import json
+import sqlite3
+
+import pytest
+
+from meal_max.models import kitchen_model, meal_importer
+from meal_max.models.meal_importer import import_meals, iter_meal_records, main
+
+###############
+# Fixtures
+###############
+
+def ndjson(count: int, start: int = 0) -> str:
+    return "".join(
+        json.dumps({"meal": f"Meal {i}", "cuisine": "Italian", "price": 10.0, "difficulty": "MED"}) + "\n"
+        for i in range(start, start + count)
+    )
+
+def meal_names(conn) -> list:
+    return [row[0] for row in conn.execute("SELECT meal FROM meals ORDER BY id")]
+
+###############
+# Parsing
+###############
+
+def test_iter_meal_records_csv():
+    """Test that CSV rows are parsed with a numeric price."""
+    records = list(iter_meal_records(io.StringIO("meal,cuisine,price,difficulty\nPizza,Italian,10.5,MED\n"), "csv"))
+
+    assert records == [{"meal": "Pizza", "cuisine": "Italian", "price": 10.5, "difficulty": "MED"}], f"Unexpected records: {records}"
+
+def test_iter_meal_records_invalid_format():
+    """Test that an unsupported format is rejected."""
+    with pytest.raises(ValueError, match="Invalid import format: xml"):
+        list(iter_meal_records(io.StringIO(""), "xml"))
+
+###############
+# Import
+###############
+
+def test_import_meals_chunks_and_errors(sqlite_db, mocker):
+    """Test that rows are written in fixed-size chunks and rejected rows are reported by absolute index."""
+    spy = mocker.spy(meal_importer, "create_meals")
+    data = ndjson(3) + "{not json\n" + ndjson(1, start=1) + ndjson(2, start=3)
+
+    report = import_meals(io.StringIO(data), "ndjson", chunk_size=3)
+
+    assert report["rows"] == 7 and report["created"] == 5, f"Unexpected report: {report}"
+    assert [error["index"] for error in report["errors"]] == [3, 4], f"Unexpected errors: {report['errors']}"
+    assert "Invalid JSON" in report["errors"][0]["error"], "Expected the malformed line to be reported."
+    assert "already exists" in report["errors"][1]["error"], "Expected the duplicate to be reported."
+    assert spy.call_count == 3, f"Expected one transaction per chunk, got {spy.call_count}."
+    assert report["rows_per_second"] is None or report["rows_per_second"] > 0, "Expected a throughput figure."
+
+def test_import_meals_resumes_from_checkpoint(sqlite_db, mocker):
+    """Test that an import interrupted mid-way resumes after the last committed chunk."""
+    data = ndjson(6)
+
+    original = kitchen_model.create_meals
+    calls = []
+
+    def crash_on_second_chunk(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise sqlite3.OperationalError("disk I/O error")
+        return original(*args, **kwargs)
+
+    mocker.patch("meal_max.models.meal_importer.create_meals", side_effect=crash_on_second_chunk)
+    with pytest.raises(sqlite3.OperationalError):
+        import_meals(io.StringIO(data), "ndjson", chunk_size=2, progress_key="meals", source="meals.ndjson")
+    assert meal_names(sqlite_db) == ["Meal 0", "Meal 1"], "Expected only the first chunk to be committed."
+
+    mocker.patch("meal_max.models.meal_importer.create_meals", side_effect=original)
+    report = import_meals(io.StringIO(data), "ndjson", chunk_size=2, progress_key="meals", source="meals.ndjson")
+
+    assert report["skipped"] == 2, f"Expected the committed chunk to be skipped, got {report['skipped']}."
+    assert report["errors"] == [], f"Expected no duplicates on resume, got {report['errors']}."
+    assert meal_names(sqlite_db) == [f"Meal {i}" for i in range(6)], "Expected every meal exactly once."
+
+def test_import_meals_checkpoint_committed_with_chunk(sqlite_db, mocker):
+    """Test that a crash right after a chunk commits does not replay that chunk on resume."""
+    data = ndjson(6)
+    original = kitchen_model.create_meals
+    calls = []
+
+    def crash_after_second_chunk(*args, **kwargs):
+        calls.append(1)
+        report = original(*args, **kwargs)
+        if len(calls) == 2:
+            raise SystemExit("killed")
+        return report
+
+    mocker.patch("meal_max.models.meal_importer.create_meals", side_effect=crash_after_second_chunk)
+    with pytest.raises(SystemExit):
+        import_meals(io.StringIO(data), "ndjson", chunk_size=2, progress_key="meals", source="meals.ndjson")
+
+    mocker.patch("meal_max.models.meal_importer.create_meals", side_effect=original)
+    report = import_meals(io.StringIO(data), "ndjson", chunk_size=2, progress_key="meals", source="meals.ndjson")
+
+    assert report["skipped"] == 4, f"Expected both committed chunks to be skipped, got {report['skipped']}."
+    assert report["errors"] == [], f"Expected no duplicates on resume, got {report['errors']}."
+    assert meal_names(sqlite_db) == [f"Meal {i}" for i in range(6)], "Expected every meal exactly once."
+
+def test_import_meals_checkpoint_for_other_source(sqlite_db):
+    """Test that a checkpoint left by another file is not applied."""
+    sqlite_db.execute("INSERT INTO import_progress (progress_key, source, rows) VALUES ('meals', 'other.ndjson', 4)")
+    sqlite_db.commit()
+
+    with pytest.raises(ValueError, match="belongs to other.ndjson"):
+        import_meals(io.StringIO(ndjson(1)), "ndjson", progress_key="meals", source="meals.ndjson")
+
+def test_import_cli(sqlite_db, tmp_path, capsys):
+    """Test the command line importer on a CSV file."""
+    path = tmp_path / "meals.csv"
+    path.write_text("meal,cuisine,price,difficulty\nPizza,Italian,10.5,MED\nTaco,Mexican,3,EASY\n")
+
+    exit_code = main([str(path), "--chunk-size", "1"])
+
+    assert exit_code == 1, "Expected a non-zero exit code when rows are rejected."
+    assert meal_names(sqlite_db) == ["Pizza"], "Expected the valid row to be imported."
+    assert "row 1: Invalid difficulty level: EASY" in capsys.readouterr().err, "Expected the rejected row to be printed."
+    progress = sqlite_db.execute("SELECT COUNT(*) FROM import_progress").fetchone()[0]
+    assert progress == 0, "Expected the checkpoint to be removed after a full run."
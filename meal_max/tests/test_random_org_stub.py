@@ -0,0 +1,95 @@
+import random
+import threading
+
+import pytest
+
+from meal_max.utils.random_org_stub import create_server, parse_latency, RandomOrgStub
+from meal_max.utils.random_utils import create_session, fetch_quota, fetch_random_numbers
+
+###############
+# Fixtures
+###############
+
+@pytest.fixture
+def serve_stub(mocker):
+    """Fixture to serve a stub on a free port and point random_utils at it."""
+    servers = []
+
+    def serve(stub):
+        server = create_server(stub, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        mocker.patch("meal_max.utils.random_utils.RANDOM_ORG_BASE_URL", f"http://127.0.0.1:{server.server_port}")
+        mocker.patch("meal_max.utils.random_utils._session", create_session(retries=0))
+        return stub
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+###############
+# Behaviour
+###############
+
+def test_parse_latency():
+    """Test that latency distributions draw non-negative delays and bad specs are rejected."""
+    rng = random.Random(0)
+
+    assert parse_latency("fixed:25", rng)() == 25, "Expected the fixed delay."
+    assert all(10 <= parse_latency("uniform:10:20", rng)() <= 20 for _ in range(100)), "Expected delays inside the range."
+    assert all(parse_latency("normal:1:50", rng)() >= 0 for _ in range(100)), "Expected negative draws to be clipped."
+
+    with pytest.raises(ValueError, match="Invalid latency distribution: pareto"):
+        parse_latency("pareto:1", rng)
+    with pytest.raises(ValueError, match="Invalid latency parameters"):
+        parse_latency("uniform:10", rng)
+
+def test_decimal_fractions_format():
+    """Test that numbers are laid out like random.org's plain text output and charged to the quota."""
+    stub = RandomOrgStub(quota=100, seed=1)
+
+    status, body = stub.decimal_fractions({'num': ['5'], 'dec': ['2'], 'col': ['2'], 'format': ['plain']})
+
+    rows = body.splitlines()
+    assert status == 200 and len(rows) == 3, f"Expected three rows, got {body!r}"
+    assert all(len(value) == 4 and value.startswith("0.") for value in body.split()), f"Unexpected numbers: {body!r}"
+    assert stub.quota == 100 - 5 * 7, f"Expected 7 bits per number to be charged, got {stub.quota}"
+
+###############
+# Through random_utils
+###############
+
+def test_fetch_from_stub(serve_stub):
+    """Test that random_utils fetches numbers and the quota from the stub."""
+    stub = serve_stub(RandomOrgStub(quota=1000, seed=1))
+
+    numbers = fetch_random_numbers(3)
+
+    assert len(numbers) == 3 and all(0 <= number < 1 for number in numbers), f"Unexpected numbers: {numbers}"
+    assert fetch_quota() == 1000 - 3 * 7, "Expected the quota to reflect the fetch."
+    assert stub.get_stats()['requests'] == 2, f"Unexpected stats: {stub.get_stats()}"
+
+def test_stub_injects_errors(serve_stub):
+    """Test that injected errors reach random_utils as failed requests."""
+    serve_stub(RandomOrgStub(error_rate=1.0))
+
+    with pytest.raises(RuntimeError, match="Request to random.org failed"):
+        fetch_random_numbers(1)
+
+def test_stub_injects_timeouts(serve_stub, mocker):
+    """Test that a hanging request trips the client's read timeout and is not retried."""
+    stub = serve_stub(RandomOrgStub(timeout_rate=1.0, hang_ms=1000))
+    mocker.patch("meal_max.utils.random_utils.RANDOM_ORG_READ_TIMEOUT", 0.1)
+    mocker.patch("meal_max.utils.random_utils._session", create_session(retries=2, backoff=0))
+
+    with pytest.raises(RuntimeError, match="timed out"):
+        fetch_random_numbers(1)
+    assert stub.get_stats()['requests'] == 1, "Expected the read timeout not to be retried."
+
+def test_stub_refuses_when_quota_exhausted(serve_stub):
+    """Test that requests are refused once the quota is used up."""
+    serve_stub(RandomOrgStub(quota=-1))
+
+    with pytest.raises(RuntimeError, match="503"):
+        fetch_random_numbers(1)
@@ -0,0 +1,454 @@
+import fcntl
+import threading
+
+import pytest
+
+from meal_max.utils.random_sources import (
+    CircuitBreakerSource,
+    EntropyReservoir,
+    HedgedSource,
+    QuotaAwareSource,
+    RandomSource,
+    RecordingSource,
+    ReplaySource,
+    SeededRandomSource,
+    SystemRandomSource
+)
+
+###############
+# Fixtures
+###############
+
+class ScriptedSource(RandomSource):
+    """A source that fails, or returns 0.5, as told, taking a configurable time."""
+
+    name = "scripted"
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.failing = False
+        self.latency_ms = 0
+        self.calls = 0
+
+    def fetch(self, num):
+        self.calls += 1
+        self.clock.return_value += self.latency_ms / 1000
+        if self.failing:
+            raise RuntimeError("Request to random.org timed out.")
+        return [0.5] * num
+
+@pytest.fixture
+def clock(mocker):
+    """Fixture to control the breaker's clock."""
+    return mocker.patch("meal_max.utils.random_sources.time.monotonic", return_value=1000.0)
+
+@pytest.fixture
+def primary(clock):
+    return ScriptedSource(clock)
+
+@pytest.fixture
+def breaker(primary):
+    return CircuitBreakerSource(primary, SeededRandomSource(1), failure_threshold=2,
+                                latency_budget_ms=100, latency_window=5, probe_interval_ms=1000)
+
+###############
+# Local sources
+###############
+
+def test_system_source_two_decimals():
+    """Test that the CSPRNG source matches random.org's two-decimal fractions in [0, 1)."""
+    numbers = SystemRandomSource().fetch(500)
+
+    assert all(0 <= n < 1 and round(n, 2) == n for n in numbers), "Expected two-decimal fractions in [0, 1)."
+    assert len(set(numbers)) > 1, "Expected varying numbers."
+
+def test_seeded_source_repeatable():
+    """Test that the same seed yields the same sequence."""
+    assert SeededRandomSource(7).fetch(10) == SeededRandomSource(7).fetch(10), "Expected identical sequences."
+
+def test_source_without_fetch_rejected():
+    """Test that a source subclass missing fetch cannot be instantiated."""
+    class IncompleteSource(RandomSource):
+        name = "incomplete"
+
+    with pytest.raises(TypeError, match="abstract"):
+        IncompleteSource()
+
+###############
+# Circuit breaker
+###############
+
+def test_breaker_falls_back_on_failure(breaker, primary):
+    """Test that a failing primary call is answered by the fallback without raising."""
+    primary.failing = True
+
+    numbers = breaker.fetch(3)
+
+    assert numbers == SeededRandomSource(1).fetch(3), "Expected the fallback's numbers."
+    assert breaker.get_stats()['state'] == 'closed', "Expected one failure to keep the breaker closed."
+
+def test_breaker_trips_after_consecutive_failures(breaker, primary):
+    """Test that consecutive failures open the breaker and later calls skip the primary."""
+    primary.failing = True
+    breaker.fetch(1)
+    breaker.fetch(1)
+
+    breaker.fetch(1)
+
+    assert primary.calls == 2, "Expected the open breaker to skip the primary."
+    stats = breaker.get_stats()
+    assert (stats['state'], stats['trips'], stats['fallback_calls']) == ('open', 1, 3), f"Unexpected stats: {stats}"
+
+def test_breaker_trips_on_p95_latency(breaker, primary):
+    """Test that a p95 latency over the budget opens the breaker even though calls succeed."""
+    primary.latency_ms = 150
+    for _ in range(5):
+        assert breaker.fetch(1) == [0.5], "Expected slow calls to still return their numbers."
+
+    stats = breaker.get_stats()
+    assert stats['state'] == 'open' and stats['p95_ms'] == 150, f"Unexpected stats: {stats}"
+
+def test_breaker_ignores_bulk_latency(breaker, primary):
+    """Test that slow bulk refills and short paced answers do not count toward the p95."""
+    primary.latency_ms = 500
+    for _ in range(5):
+        breaker.fetch(10000)
+    primary.fetch = lambda num: []
+    for _ in range(5):
+        breaker.fetch(100)
+
+    stats = breaker.get_stats()
+    assert stats['state'] == 'closed' and stats['p95_ms'] is None, f"Unexpected stats: {stats}"
+
+def test_breaker_probe_recovers(breaker, primary, clock):
+    """Test that a successful probe after the probe interval closes the breaker."""
+    primary.failing = True
+    breaker.fetch(1)
+    breaker.fetch(1)
+    primary.failing = False
+
+    breaker.fetch(1)
+    assert primary.calls == 2, "Expected no probe before the interval."
+
+    clock.return_value += 1
+    assert breaker.fetch(1) == [0.5], "Expected the probe's numbers."
+
+    stats = breaker.get_stats()
+    assert (stats['state'], stats['probes'], stats['recoveries']) == ('closed', 1, 1), f"Unexpected stats: {stats}"
+
+def test_breaker_failed_probe_stays_open(breaker, primary, clock):
+    """Test that a failed probe keeps the breaker open and restarts the probe interval."""
+    primary.failing = True
+    breaker.fetch(1)
+    breaker.fetch(1)
+    clock.return_value += 1
+
+    breaker.fetch(1)
+    breaker.fetch(1)
+
+    assert primary.calls == 3, "Expected a single probe."
+    assert breaker.get_stats()['state'] == 'open', "Expected the breaker to stay open."
+
+###############
+# Hedged requests
+###############
+
+class BlockingSource(RandomSource):
+    """A source whose calls wait on the event scripted for them, then return their call number."""
+
+    name = "blocking"
+
+    def __init__(self, events):
+        self.events = list(events)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, num):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        event = self.events[call - 1] if call <= len(self.events) else None
+        if event is not None:
+            event.wait(5)
+        if event is not None and getattr(event, "fail", False):
+            raise RuntimeError("Request to random.org failed")
+        return [call / 100] * num
+
+def test_hedge_not_fired_for_fast_request():
+    """Test that a request answering within the hedge delay is used alone."""
+    source = BlockingSource([])
+    hedged = HedgedSource(source, min_delay_ms=1000)
+
+    assert hedged.fetch(1) == [0.01], "Expected the first request's numbers."
+    assert hedged.get_stats()['hedges_fired'] == 0, "Expected no hedge."
+
+def test_hedge_skips_bulk_requests():
+    """Test that bulk refills are sent once, however slow they are."""
+    slow = threading.Event()
+    source = BlockingSource([slow])
+    hedged = HedgedSource(source, min_delay_ms=1, initial_delay_ms=1)
+
+    threading.Timer(0.05, slow.set).start()
+
+    assert hedged.fetch(100) == [0.01] * 100, "Expected the only request's numbers."
+    stats = hedged.get_stats()
+    assert source.calls == 1 and stats['unhedged'] == 1, f"Expected no hedge for a bulk request: {stats}"
+
+def test_hedge_wins_over_slow_request():
+    """Test that a slow first request is overtaken by the hedge."""
+    slow = threading.Event()
+    source = BlockingSource([slow])
+    hedged = HedgedSource(source, min_delay_ms=10, initial_delay_ms=10)
+
+    result = hedged.fetch(1)
+    slow.set()
+
+    assert result == [0.02], "Expected the hedge's numbers."
+    stats = hedged.get_stats()
+    assert (stats['hedges_fired'], stats['hedge_wins']) == (1, 1), f"Unexpected stats: {stats}"
+
+def test_hedge_both_fail():
+    """Test that the error is raised when both the request and its hedge fail."""
+    first, second = threading.Event(), threading.Event()
+    first.fail = second.fail = True
+    source = BlockingSource([first, second])
+    hedged = HedgedSource(source, min_delay_ms=10, initial_delay_ms=10)
+
+    threading.Timer(0.05, lambda: (first.set(), second.set())).start()
+    with pytest.raises(RuntimeError, match="failed"):
+        hedged.fetch(1)
+
+def test_hedge_delay_follows_percentile():
+    """Test that the hedge delay is the latency percentile once enough samples exist."""
+    hedged = HedgedSource(BlockingSource([]), latency_percentile=50, min_delay_ms=5,
+                          initial_delay_ms=400, min_samples=3)
+    assert hedged.get_delay_ms() == 400, "Expected the initial delay without samples."
+
+    hedged._window(1).extend([10, 30, 20])
+    hedged._window(100).extend([900, 800, 700])
+
+    assert hedged.get_delay_ms(1) == 20, "Expected the median latency of single-number requests."
+    assert hedged.get_delay_ms(100) == 800, "Expected bulk latencies to be tracked separately."
+
+###############
+# Record and replay
+###############
+
+def test_replay_source_in_order(tmp_path):
+    """Test that replayed numbers come back in recorded order, across fetch sizes."""
+    path = tmp_path / "numbers.txt"
+    path.write_text("0.1\n0.2\n\n0.3\n")
+    replay = ReplaySource(str(path))
+
+    assert replay.fetch(2) + replay.fetch(1) == [0.1, 0.2, 0.3], "Expected the recorded sequence."
+    with pytest.raises(RuntimeError, match="exhausted after 3 numbers"):
+        replay.fetch(1)
+
+def test_replay_source_loop(tmp_path):
+    """Test that a looping replay starts over at the end of the file."""
+    path = tmp_path / "numbers.txt"
+    path.write_text("0.1\n0.2\n")
+
+    assert ReplaySource(str(path), loop=True).fetch(5) == [0.1, 0.2, 0.1, 0.2, 0.1], "Expected the sequence to wrap."
+
+def test_replay_source_invalid_line(tmp_path):
+    """Test that a corrupt replay file is rejected with the offending line."""
+    path = tmp_path / "numbers.txt"
+    path.write_text("0.1\nabc\n")
+
+    with pytest.raises(ValueError, match="line 2"):
+        ReplaySource(str(path))
+
+def test_record_then_replay(tmp_path):
+    """Test that recording a source and replaying the file reproduces its numbers exactly."""
+    path = str(tmp_path / "numbers.txt")
+    recorder = RecordingSource(SeededRandomSource(3), path)
+    served = recorder.fetch(4) + recorder.fetch(6)
+    recorder.close()
+
+    assert ReplaySource(path).fetch(10) == served, "Expected the replay to match what was served."
+    assert recorder.get_stats()['recorded'] == 10, "Expected the recorded count."
+
+###############
+# Entropy reservoir
+###############
+
+@pytest.fixture
+def reservoir_path(tmp_path):
+    return str(tmp_path / "entropy.bin")
+
+def open_reservoir(path, mocker, capacity=10):
+    """Opens a reservoir over a seeded source, without the background top-up thread."""
+    reservoir = EntropyReservoir(SeededRandomSource(5), path, capacity=capacity)
+    mocker.patch.object(reservoir, "start")
+    return reservoir
+
+def test_reservoir_serves_from_disk(reservoir_path, mocker):
+    """Test that a topped-up reservoir serves the upstream numbers in order."""
+    reservoir = open_reservoir(reservoir_path, mocker)
+
+    assert reservoir.top_up() == 10, "Expected the reservoir to be filled."
+    numbers = reservoir.fetch(4)
+    stats = reservoir.get_stats()
+    reservoir.stop()
+
+    assert numbers == SeededRandomSource(5).fetch(4), "Expected the upstream sequence."
+    assert (stats['served_from_disk'], stats['available']) == (4, 6), f"Unexpected stats: {stats}"
+
+def test_reservoir_survives_restart_without_reuse(reservoir_path, mocker):
+    """Test that a reopened reservoir resumes after the numbers already served."""
+    expected = SeededRandomSource(5).fetch(10)
+    first = open_reservoir(reservoir_path, mocker)
+    first.top_up()
+    served = first.fetch(3)
+    first.stop()
+
+    second = open_reservoir(reservoir_path, mocker)
+    assert second.available() == 7, "Expected the served numbers to stay consumed."
+    served += second.fetch(7)
+    second.stop()
+
+    assert served == expected, "Expected every number exactly once, in order."
+
+def test_reservoir_empty_serves_directly(reservoir_path, mocker):
+    """Test that an empty reservoir falls through to the upstream source."""
+    reservoir = open_reservoir(reservoir_path, mocker)
+
+    numbers = reservoir.fetch(2)
+    stats = reservoir.get_stats()
+    reservoir.stop()
+
+    assert numbers == SeededRandomSource(5).fetch(2), "Expected the upstream numbers."
+    assert (stats['served_direct'], stats['available']) == (2, 0), f"Unexpected stats: {stats}"
+
+def test_reservoir_wraps_around(reservoir_path, mocker):
+    """Test that slots are reused once consumed, keeping the order."""
+    expected = SeededRandomSource(5).fetch(16)
+    reservoir = open_reservoir(reservoir_path, mocker, capacity=8)
+    reservoir.top_up()
+    served = reservoir.fetch(6)
+    reservoir.top_up()
+    served += reservoir.fetch(8)
+    reservoir.stop()
+
+    assert served == expected[:14], "Expected the sequence to continue across the wrap."
+
+def test_reservoir_skips_concurrent_top_up(reservoir_path, mocker):
+    """Test that a top-up is skipped, without fetching, while another process is topping up."""
+    reservoir = open_reservoir(reservoir_path, mocker)
+    fetch = mocker.spy(reservoir.source, "fetch")
+
+    with open(reservoir_path + ".lock", "w") as other:
+        fcntl.flock(other, fcntl.LOCK_EX)
+        skipped = reservoir.top_up()
+        fcntl.flock(other, fcntl.LOCK_UN)
+    added = reservoir.top_up()
+    stats = reservoir.get_stats()
+    reservoir.stop()
+
+    assert skipped == 0 and stats['top_ups_skipped'] == 1, f"Expected the top-up to be skipped: {stats}"
+    assert added == 10 and fetch.call_count == 1, "Expected a single upstream fetch once the lock was free."
+
+def test_reservoir_recreates_invalid_file(reservoir_path, mocker):
+    """Test that a file that is not a reservoir is replaced by an empty one."""
+    with open(reservoir_path, "wb") as fh:
+        fh.write(b"garbage" * 10)
+
+    reservoir = open_reservoir(reservoir_path, mocker)
+
+    assert reservoir.available() == 0, "Expected an empty reservoir."
+    reservoir.stop()
+
+###############
+# Quota-aware source
+###############
+
+@pytest.fixture
+def quota():
+    """Fixture to script the remaining random.org quota."""
+    return {'bits': 100000}
+
+@pytest.fixture
+def quota_source(primary, quota):
+    return QuotaAwareSource(primary, SeededRandomSource(1), lambda: quota['bits'], bits_per_number=7,
+                            reserve_bits=10000, max_share=0.5, refresh_interval_s=600,
+                            seconds_to_reset=lambda: 1000)
+
+def test_quota_within_budget(quota_source, primary):
+    """Test that requests the budget covers go to the source and are charged against it."""
+    assert quota_source.fetch(100) == [0.5] * 100, "Expected the source's numbers."
+
+    stats = quota_source.get_stats()
+    assert stats['remaining_bits'] == 100000 - 700, f"Unexpected budget: {stats}"
+    assert (stats['source_numbers'], stats['fallback_numbers']) == (100, 0), f"Unexpected stats: {stats}"
+
+def test_quota_paces_bulk_requests(quota_source, primary, clock):
+    """Test that bulk requests spend at most a share of the budget at once, then are paced over time."""
+    # (100000 - 10000) * 0.5 / 7 = 6428 numbers
+    numbers = quota_source.fetch(10000)
+    assert numbers == [0.5] * 6428, "Expected the paced share from the source, without fallback numbers."
+    assert quota_source.fetch(10000) == [], "Expected nothing more until the bucket refills."
+
+    # 45004 spendable bits over the 1000 s left refill 45 bits a second
+    clock.return_value += 100
+    numbers = quota_source.fetch(10000)
+
+    assert len(numbers) == 643, f"Expected 100 s worth of numbers, got {len(numbers)}."
+    stats = quota_source.get_stats()
+    assert stats['fallback_numbers'] == 0 and stats['paced_numbers'] == 3572 + 10000 + 9357, f"Unexpected stats: {stats}"
+
+def test_quota_charges_hedges(quota_source, primary):
+    """Test that hedged duplicates are charged against the local estimate."""
+    slow = threading.Event()
+    quota_source.source = HedgedSource(BlockingSource([slow]), initial_delay_ms=10, on_hedge=quota_source.charge)
+
+    quota_source.fetch(1)
+    slow.set()
+
+    stats = quota_source.get_stats()
+    assert stats['remaining_bits'] == 100000 - 14, f"Expected the hedge to be charged: {stats}"
+    assert stats['hedged_numbers'] == 1, f"Unexpected stats: {stats}"
+
+def test_quota_paces_reservoir_top_up(quota_source, primary, tmp_path, mocker):
+    """Test that a reservoir top-up stops at the quota's share instead of draining it or filling from the fallback."""
+    reservoir = EntropyReservoir(quota_source, str(tmp_path / "entropy.bin"), capacity=20000)
+    mocker.patch.object(reservoir, "start")
+
+    added = reservoir.top_up()
+    numbers = reservoir.fetch(added)
+    reservoir.stop()
+
+    assert added == 6428 and primary.calls == 1, f"Expected one paced request, got {added} numbers."
+    assert set(numbers) == {0.5}, "Expected no fallback numbers in the reservoir."
+
+def test_quota_switches_before_exhaustion(quota_source, primary, quota):
+    """Test that the fallback takes over once only the reserve is left."""
+    quota['bits'] = 10006
+    quota_source.refresh()
+
+    quota_source.fetch(1)
+
+    assert primary.calls == 0, "Expected the reserve to be left untouched."
+    assert quota_source.get_stats()['fallback_numbers'] == 1, "Expected the fallback to serve."
+
+def test_quota_refreshed_after_interval(quota_source, quota, clock):
+    """Test that the estimate is replaced by the quota endpoint once the interval elapses."""
+    quota_source.fetch(10)
+    quota['bits'] = 50000
+
+    quota_source.fetch(1)
+    assert quota_source.get_stats()['remaining_bits'] == 100000 - 77, "Expected the local estimate."
+
+    clock.return_value += 600
+    quota_source.fetch(1)
+    assert quota_source.get_stats()['remaining_bits'] == 50000 - 7, "Expected the refreshed quota."
+
+def test_quota_unknown_uses_source(primary, clock):
+    """Test that the source is used unrestricted while the quota cannot be read."""
+    def unavailable():
+        raise RuntimeError("Quota request to random.org failed")
+
+    quota_source = QuotaAwareSource(primary, SeededRandomSource(1), unavailable)
+
+    assert quota_source.fetch(3) == [0.5] * 3, "Expected the source's numbers."
+    assert quota_source.get_stats()['refresh_errors'] == 1, "Expected the failed read to be counted."
@@ -1,8 +1,19 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import threading
+
 import pytest
 import requests
 
 from meal_max.utils.logger import configure_logger
-from meal_max.utils.random_utils import get_random
+from meal_max.utils.random_utils import (
+    create_session,
+    fetch_quota,
+    fetch_random_numbers,
+    get_http_stats,
+    get_random,
+    RandomNumberPool,
+    record_random_numbers
+)
 
 RANDOM_NUMBER_DECIMAL = 0.42
 
@@ -11,7 +22,7 @@ def mock_random_org_decimal(mocker):
     """Mock a successful request to random.org for a decimal number."""
     mock_response = mocker.Mock()
     mock_response.text = f"{RANDOM_NUMBER_DECIMAL}"
-    mocker.patch("requests.get", return_value=mock_response)
+    mocker.patch("requests.Session.get", return_value=mock_response)
     return mock_response
 
 def test_get_random_decimal(mock_random_org_decimal):
@@ -22,21 +33,21 @@ def test_get_random_decimal(mock_random_org_decimal):
     assert result == RANDOM_NUMBER_DECIMAL, f"Expected random number {RANDOM_NUMBER_DECIMAL}, but got {result}"
     
     # Ensure that the correct URL was called
-    requests.get.assert_called_once_with(
+    requests.Session.get.assert_called_once_with(
         "https://www.random.org/decimal-fractions/?num=1&dec=2&col=1&format=plain&rnd=new",
-        timeout=5
+        timeout=(5.0, 5.0)
     )
 
 def test_get_random_request_failure(mocker):
     """Simulate a request failure for random.org."""
-    mocker.patch("requests.get", side_effect=requests.exceptions.RequestException("Connection error"))
+    mocker.patch("requests.Session.get", side_effect=requests.exceptions.RequestException("Connection error"))
 
     with pytest.raises(RuntimeError, match="Request to random.org failed: Connection error"):
         get_random()
 
 def test_get_random_timeout(mocker):
     """Simulate a timeout error when requesting random.org."""
-    mocker.patch("requests.get", side_effect=requests.exceptions.Timeout)
+    mocker.patch("requests.Session.get", side_effect=requests.exceptions.Timeout)
 
     with pytest.raises(RuntimeError, match="Request to random.org timed out."):
         get_random()
@@ -47,3 +58,155 @@ def test_get_random_invalid_response(mock_random_org_decimal):
 
     with pytest.raises(ValueError, match="Invalid response from random.org: invalid_response"):
         get_random()
+
+
+@pytest.fixture
+def flaky_server():
+    """Serve random numbers over keep-alive HTTP, failing the first request with a 503."""
+    statuses = [503]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            status = statuses.pop(0) if statuses else 200
+            body = b"0.42\n" if status == 200 else b"busy"
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+def test_session_retries_and_reuses_connection(flaky_server, mocker):
+    """Test that a 503 is retried and later requests reuse the kept-alive connection."""
+    session = create_session(retries=2, backoff=0)
+    mocker.patch("meal_max.utils.random_utils._session", session)
+
+    responses = [session.get(flaky_server, timeout=5) for _ in range(3)]
+
+    assert [response.text for response in responses] == ["0.42\n"] * 3, "Expected the 503 to be retried."
+    stats = get_http_stats()
+    assert stats['requests'] == 4, f"Expected three requests and one retry, got {stats}"
+    assert stats['connections_opened'] == 1 and stats['connections_reused'] == 3, f"Unexpected stats: {stats}"
+
+def test_fetch_quota(mock_random_org_decimal):
+    """Test reading the remaining random.org quota."""
+    mock_random_org_decimal.text = "999993\n"
+
+    assert fetch_quota() == 999993, "Expected the remaining bits."
+    requests.Session.get.assert_called_once_with("https://www.random.org/quota/?format=plain", timeout=(5.0, 5.0))
+
+def test_fetch_random_numbers_bulk(mock_random_org_decimal):
+    """Test fetching many random numbers from random.org in one request."""
+    mock_random_org_decimal.text = "0.42\n0.07\n0.99\n"
+
+    result = fetch_random_numbers(3)
+
+    assert result == [0.42, 0.07, 0.99], f"Expected the three numbers, got {result}"
+    requests.Session.get.assert_called_once_with(
+        "https://www.random.org/decimal-fractions/?num=3&dec=2&col=1&format=plain&rnd=new",
+        timeout=(5.0, 5.0)
+    )
+
+def test_fetch_random_numbers_short_response(mock_random_org_decimal):
+    """Test that a response with fewer numbers than requested is rejected."""
+    mock_random_org_decimal.text = "0.42\n"
+
+    with pytest.raises(ValueError, match="Invalid response from random.org"):
+        fetch_random_numbers(2)
+
+def test_fetch_random_numbers_invalid_num():
+    """Test that random.org's limit on num is enforced before any request."""
+    with pytest.raises(ValueError, match="Invalid number of random numbers: 10001"):
+        fetch_random_numbers(10001)
+
+###############
+# Random number pool
+###############
+
+def test_random_pool_serves_from_memory(mocker):
+    """Test that the pool serves numbers from a single bulk request."""
+    fetch = mocker.Mock(return_value=[0.1, 0.2, 0.3, 0.4])
+    pool = RandomNumberPool(size=4, low_water=1, fetch=fetch)
+
+    result = [pool.get(), pool.get()]
+    pool.stop()
+
+    assert result == [0.1, 0.2], f"Expected numbers in fetch order, got {result}"
+    fetch.assert_called_once_with(4)
+    stats = pool.get_stats()
+    assert (stats['depth'], stats['served'], stats['empty_waits']) == (2, 2, 1), f"Unexpected stats: {stats}"
+    assert stats['last_refill_ms'] is not None, "Expected the refill latency to be recorded."
+
+def test_random_pool_refills_below_low_water(mocker):
+    """Test that dropping below the low-water mark tops the pool up in the background."""
+    refilled = threading.Event()
+    batches = iter([[0.1, 0.2, 0.3, 0.4], [0.5, 0.6, 0.7]])
+
+    def fetch(num):
+        numbers = next(batches)
+        if num == 3:
+            refilled.set()
+        return numbers
+
+    pool = RandomNumberPool(size=4, low_water=2, fetch=fetch)
+    for _ in range(3):
+        pool.get()
+
+    assert refilled.wait(5), "Expected a background refill of the three missing numbers."
+    pool.stop()
+    assert pool.get_stats()['refills'] == 2, "Expected the initial and the background refill."
+
+def test_random_pool_paced_refill_serves_single_number(mocker):
+    """Test that a refill the source paces down to nothing still serves the caller one number."""
+    fetch = mocker.Mock(side_effect=lambda num: [] if num > 1 else [0.3])
+    pool = RandomNumberPool(size=4, fetch=fetch)
+    mocker.patch.object(pool, "start")
+
+    assert pool.get() == 0.3, "Expected a single number fetched directly."
+    assert [call.args[0] for call in fetch.call_args_list] == [4, 1], "Expected the refill, then a single fetch."
+
+def test_random_pool_empty_refill_failure(mocker):
+    """Test that a caller finding the pool empty gets the random.org error."""
+    fetch = mocker.Mock(side_effect=RuntimeError("Request to random.org timed out."))
+    pool = RandomNumberPool(size=4, fetch=fetch)
+
+    with pytest.raises(RuntimeError, match="timed out"):
+        pool.get()
+    pool.stop()
+
+    assert pool.get_stats()['refill_errors'] == 1, "Expected the failed refill to be counted."
+
+def test_record_random_numbers(mocker, tmp_path):
+    """Test recording more numbers than random.org returns per request."""
+    fetch = mocker.Mock(side_effect=lambda num: [0.5] * num)
+    source = mocker.Mock(fetch=fetch)
+    source.name = "mock"
+    path = tmp_path / "numbers.txt"
+
+    written = record_random_numbers(str(path), 10005, source=source)
+
+    assert written == 10005, f"Expected 10005 numbers, got {written}"
+    assert [call.args[0] for call in fetch.call_args_list] == [10000, 5], "Expected requests of at most 10000."
+    assert path.read_text().count("\n") == 10005, "Expected one number per line."
+
+def test_record_random_numbers_stops_when_source_runs_short(mocker, tmp_path):
+    """Test that recording stops instead of spinning once a paced source returns short."""
+    fetch = mocker.Mock(side_effect=[[0.5] * 10000, [0.5] * 300, []])
+    source = mocker.Mock(fetch=fetch)
+    source.name = "mock"
+    path = tmp_path / "numbers.txt"
+
+    written = record_random_numbers(str(path), 100000, source=source)
+
+    assert written == 10300, f"Expected the numbers returned before the source ran short, got {written}"
+    assert fetch.call_count == 2, "Expected no request after the short one."
+    assert path.read_text().count("\n") == 10300, "Expected the numbers to be written."
@@ -0,0 +1,219 @@
+import sqlite3
+import threading
+
+import pytest
+
+from meal_max.utils.sql_utils import (
+    apply_migrations,
+    ConnectionPool,
+    get_pragma_settings,
+    get_schema_version,
+    incremental_vacuum
+)
+
+###############
+# Fixtures
+###############
+
+@pytest.fixture
+def migrations_dir(tmp_path):
+    """Fixture to provide a directory with two ordered migrations."""
+    migrations = tmp_path / "migrations"
+    migrations.mkdir()
+    (migrations / "0001_create_things.sql").write_text(
+        "-- the baseline\nCREATE TABLE things (id INTEGER PRIMARY KEY, name TEXT);\n"
+    )
+    (migrations / "0002_add_things_index.sql").write_text(
+        "CREATE INDEX idx_things_name ON things (name);\n"
+    )
+    return migrations
+
+@pytest.fixture
+def pool(tmp_path):
+    """Fixture to provide a small connection pool backed by a temporary database."""
+    pool = ConnectionPool(str(tmp_path / "test.db"), size=2, timeout=0.1)
+    yield pool
+    pool.close_all()
+
+###############
+# Connection pool
+###############
+
+def test_pool_reuses_connections(pool):
+    """Test that a checked in connection is handed out again instead of opening a new one."""
+    conn = pool.checkout()
+    pool.checkin(conn)
+
+    assert pool.checkout() is conn, "Expected the idle connection to be reused."
+
+    stats = pool.get_stats()
+    assert stats['opens'] == 1, f"Expected one connection to be opened, got {stats['opens']}."
+    assert stats['hits'] == 1, f"Expected one pool hit, got {stats['hits']}."
+
+def test_pool_timeout_when_exhausted(pool):
+    """Test that checkout fails once every connection is checked out and none is returned."""
+    pool.checkout()
+    pool.checkout()
+
+    with pytest.raises(sqlite3.OperationalError, match="Timed out"):
+        pool.checkout()
+
+    stats = pool.get_stats()
+    assert stats['waits'] == 1 and stats['timeouts'] == 1, f"Unexpected stats: {stats}"
+
+def test_pool_waiter_receives_checked_in_connection(pool):
+    """Test that a waiting caller gets the connection another thread checks in."""
+    pool.timeout = 2
+    first = pool.checkout()
+    pool.checkout()
+
+    received = []
+    waiter = threading.Thread(target=lambda: received.append(pool.checkout()))
+    waiter.start()
+    pool.checkin(first)
+    waiter.join()
+
+    assert received == [first], "Expected the waiter to receive the checked in connection."
+
+def test_pool_replaces_unhealthy_connection(pool):
+    """Test that a connection failing validation is discarded and replaced."""
+    conn = pool.checkout()
+    pool.checkin(conn)
+    conn.close()
+
+    replacement = pool.checkout()
+
+    assert replacement is not conn, "Expected a new connection to replace the closed one."
+    assert pool.get_stats()['discards'] == 1, "Expected the closed connection to be discarded."
+
+def test_pool_checkin_rolls_back_open_transaction(pool):
+    """Test that uncommitted work is rolled back when a connection is returned."""
+    conn = pool.checkout()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.execute("INSERT INTO t VALUES (1)")
+    pool.checkin(conn)
+
+    conn = pool.checkout()
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0, "Expected the insert to be rolled back."
+
+def test_pool_invalid_size(tmp_path):
+    """Test that a pool cannot be created without room for a connection."""
+    with pytest.raises(ValueError, match="Invalid pool size: 0"):
+        ConnectionPool(str(tmp_path / "test.db"), size=0)
+
+###############
+# Pragma profile
+###############
+
+def test_pool_applies_pragma_profile(tmp_path):
+    """Test that connections opened by the pool carry the profile's pragmas."""
+    pool = ConnectionPool(str(tmp_path / "test.db"), size=1, pragmas=get_pragma_settings("performance"))
+    conn = pool.checkout()
+
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal", "Expected WAL journal mode."
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1, "Expected synchronous=NORMAL."
+    assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2, "Expected temp_store=MEMORY."
+
+def test_pragma_settings_env_override(mocker):
+    """Test that a single pragma can be overridden from the environment."""
+    mocker.patch.dict('os.environ', {'DB_PRAGMA_MMAP_SIZE': '0'})
+
+    settings = get_pragma_settings("performance")
+
+    assert settings['mmap_size'] == '0', f"Expected the override to win, got {settings['mmap_size']}."
+    assert settings['journal_mode'] == 'WAL', "Expected the rest of the profile to be kept."
+
+def test_pragma_settings_invalid_profile():
+    """Test that an unknown profile is rejected."""
+    with pytest.raises(ValueError, match="Invalid pragma profile: turbo"):
+        get_pragma_settings("turbo")
+
+def test_pragma_settings_invalid_value(mocker):
+    """Test that override values cannot smuggle extra SQL into the PRAGMA statement."""
+    mocker.patch.dict('os.environ', {'DB_PRAGMA_CACHE_SIZE': '1; DROP TABLE meals'})
+
+    with pytest.raises(ValueError, match="Invalid value for pragma cache_size"):
+        get_pragma_settings("default")
+
+###############
+# Schema migrations
+###############
+
+def test_apply_migrations_in_order(tmp_path, migrations_dir):
+    """Test that pending migrations are applied in version order and recorded."""
+    conn = sqlite3.connect(str(tmp_path / "test.db"))
+
+    applied = apply_migrations(conn, migrations_path=str(migrations_dir))
+
+    assert applied == [1, 2], f"Expected both migrations to be applied, got {applied}."
+    assert get_schema_version(conn) == 2, "Expected the schema version to be recorded."
+    indexes = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+    assert "idx_things_name" in indexes, "Expected the second migration to have run."
+
+def test_apply_migrations_is_idempotent(tmp_path, migrations_dir):
+    """Test that running the migrations again keeps existing data and applies nothing."""
+    conn = sqlite3.connect(str(tmp_path / "test.db"))
+    apply_migrations(conn, migrations_path=str(migrations_dir))
+    conn.execute("INSERT INTO things (name) VALUES ('kept')")
+    conn.commit()
+
+    assert apply_migrations(conn, migrations_path=str(migrations_dir)) == [], "Expected no migration to be reapplied."
+    assert conn.execute("SELECT name FROM things").fetchall() == [("kept",)], "Expected existing rows to survive."
+
+def test_apply_migrations_target(tmp_path, migrations_dir):
+    """Test that migrating to a target version stops there."""
+    conn = sqlite3.connect(str(tmp_path / "test.db"))
+
+    assert apply_migrations(conn, migrations_path=str(migrations_dir), target=1) == [1], "Expected only the first migration."
+    assert apply_migrations(conn, migrations_path=str(migrations_dir)) == [2], "Expected the rest to follow later."
+
+def test_apply_migrations_rolls_back_failed_batch(tmp_path, migrations_dir):
+    """Test that a failing migration leaves the whole batch unapplied."""
+    (migrations_dir / "0003_broken.sql").write_text("CREATE TABLE nope (;\n")
+    conn = sqlite3.connect(str(tmp_path / "test.db"))
+
+    with pytest.raises(sqlite3.Error):
+        apply_migrations(conn, migrations_path=str(migrations_dir))
+
+    assert get_schema_version(conn) == 0, "Expected no migration to be recorded."
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    assert "things" not in tables, "Expected earlier migrations in the batch to be rolled back."
+
+def test_apply_migrations_sets_creation_pragmas(tmp_path, migrations_dir):
+    """Test that a fresh database gets the creation-time pragmas before any table exists."""
+    conn = sqlite3.connect(str(tmp_path / "test.db"))
+
+    apply_migrations(conn, migrations_path=str(migrations_dir))
+
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2, "Expected incremental auto_vacuum."
+
+def test_incremental_vacuum_reclaims_free_pages(tmp_path, migrations_dir):
+    """Test that pages freed by deletes are returned to the file system."""
+    conn = sqlite3.connect(str(tmp_path / "test.db"))
+    apply_migrations(conn, migrations_path=str(migrations_dir))
+    conn.executemany("INSERT INTO things (name) VALUES (?)", [("x" * 500,) for _ in range(200)])
+    conn.commit()
+    conn.execute("DELETE FROM things")
+    conn.commit()
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    freed = incremental_vacuum(conn)
+
+    assert free_pages > 0 and freed == free_pages, f"Expected all {free_pages} free pages freed, got {freed}."
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0, "Expected an empty freelist."
+
+def test_incremental_vacuum_skips_other_modes(tmp_path):
+    """Test that a database without INCREMENTAL auto_vacuum is left alone."""
+    conn = sqlite3.connect(str(tmp_path / "test.db"))
+    conn.execute("CREATE TABLE things (name TEXT)")
+
+    assert incremental_vacuum(conn) == 0, "Expected nothing to be freed."
+
+def test_apply_migrations_duplicate_version(tmp_path, migrations_dir):
+    """Test that two scripts with the same version are rejected."""
+    (migrations_dir / "0002_other.sql").write_text("SELECT 1;\n")
+    conn = sqlite3.connect(str(tmp_path / "test.db"))
+
+    with pytest.raises(ValueError, match="Duplicate migration version 2"):
+        apply_migrations(conn, migrations_path=str(migrations_dir))
@@ -2,13 +2,19 @@
 
 # Check if the database file already exists
 if [ -f "$DB_PATH" ]; then
-    echo "Recreating database at $DB_PATH."
-    # Drop and recreate the tables
-    sqlite3 "$DB_PATH" < /app/sql/create_meal_table.sql
-    echo "Database recreated successfully."
+    echo "Migrating existing database at $DB_PATH."
 else
     echo "Creating database at $DB_PATH."
-    # Create the database for the first time
-    sqlite3 "$DB_PATH" < /app/sql/create_meal_table.sql
-    echo "Database created successfully."
-fi
\ No newline at end of file
+fi
+
+# Apply any pending schema migrations in place; existing data is kept
+cd /app && python -m meal_max.meal_max.utils.sql_utils migrate || exit 1
+echo "Database is up to date."
+
+# WAL is persistent, so set it once at provisioning for the profiles that use it
+case "$DB_PRAGMA_PROFILE" in
+    performance|durable)
+        echo "Enabling WAL journal mode for the $DB_PRAGMA_PROFILE profile."
+        sqlite3 "$DB_PATH" "PRAGMA journal_mode = WAL;"
+        ;;
+esac
@@ -0,0 +1,7 @@
+-- Partial indexes that serve both leaderboard sort modes with an index walk.
+-- SQLite only uses a partial index when its WHERE clause matches the query's
+-- terms as written, so keep these in sync with kitchen_model.get_leaderboard.
+CREATE INDEX IF NOT EXISTS idx_meals_leaderboard_wins
+    ON meals (wins) WHERE deleted = false AND battles > 0;
+CREATE INDEX IF NOT EXISTS idx_meals_leaderboard_win_pct
+    ON meals ((wins * 1.0 / battles)) WHERE deleted = false AND battles > 0;
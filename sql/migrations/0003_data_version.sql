@@ -0,0 +1,23 @@
+-- A counter bumped by every change to the meals table, whichever process or tool
+-- makes it, so caches and ETags derived from it notice writes they did not make.
+-- Read by kitchen_model.get_data_version; database_id tells a recreated database
+-- apart from the one it replaced, whose counter may have reached the same value.
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    database_id TEXT NOT NULL DEFAULT (lower(hex(randomblob(6))))
+);
+INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS meals_insert_data_version AFTER INSERT ON meals
+BEGIN
+    UPDATE data_version SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS meals_update_data_version AFTER UPDATE ON meals
+BEGIN
+    UPDATE data_version SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS meals_delete_data_version AFTER DELETE ON meals
+BEGIN
+    UPDATE data_version SET version = version + 1 WHERE id = 1;
+END;
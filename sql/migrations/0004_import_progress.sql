@@ -0,0 +1,8 @@
+-- Checkpoints of meal_importer runs, keyed by the name the import was started with.
+-- Each is written in the same transaction as the chunk of meals it covers, so a
+-- resumed import never replays a chunk that was already committed.
+CREATE TABLE IF NOT EXISTS import_progress (
+    progress_key TEXT PRIMARY KEY,
+    source TEXT,
+    rows INTEGER NOT NULL
+);